@@ -26,6 +26,13 @@ class DataArgument:
     dataset_name_or_path: str = field(default=None, metadata={"help": "Name or path for dataset"})
     task_name: str = field(default=None, metadata={"help": "Additional name to select a more specific task."})
     intokens: bool = field(default=False, metadata={"help": "Whether to use InTokens data stream"})
+    intokens_packing_strategy: str = field(
+        default="greedy",
+        metadata={
+            "help": "How to pack the examples for InTokens data stream. `greedy` packs the examples in order, "
+            "`best_fit` packs every buffer of examples by best-fit-decreasing, which leaves less padding."
+        },
+    )
     src_length: int = field(default=1024, metadata={"help": "The maximum length of source(context) tokens."})
     max_length: int = field(
         default=2048,
@@ -0,0 +1,270 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Replay a request trace against the predictor at a given request rate and concurrency, and report the time to first
+token (TTFT), the inter-token latency (ITL), the end-to-end latency, the throughput and the peak memory.
+
+Every line of the trace file is a JSON object, which has either the prompt text `src`, or the prompt length
+`input_length` to build a random prompt. The optional `max_length` (or `output_length`) sets the max number of
+tokens to generate for the request.
+"""
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import paddle
+from paddle.distributed import fleet
+from predictor import ModelArgument, PredictorArgument, create_predictor
+from scheduler import GenerationRequest, RequestScheduler, create_scheduler
+
+from paddlenlp.trainer import PdArgumentParser
+from paddlenlp.utils.log import logger
+
+
+@dataclass
+class BenchmarkArgument:
+    trace_file: str = field(default=None, metadata={"help": "The JSONL request trace to replay."})
+    num_requests: int = field(
+        default=None, metadata={"help": "The number of requests sampled from the trace, default to the whole trace."}
+    )
+    request_rates: str = field(
+        default="inf",
+        metadata={
+            "help": "Comma separated request rates (requests/s) to benchmark, the requests arrive as a Poisson "
+            "process. `inf` sends all the requests at once."
+        },
+    )
+    max_concurrency: int = field(default=None, metadata={"help": "The max number of requests in flight."})
+    num_warmup_requests: int = field(default=2, metadata={"help": "The number of requests to warm up."})
+    seed: int = field(default=42, metadata={"help": "The random seed of the arrival times and the prompts."})
+    max_queue_size: int = field(default=4096, metadata={"help": "The max number of waiting requests."})
+    max_wait_time: float = field(
+        default=0.01, metadata={"help": "The max seconds to wait for more requests to fill an idle batch."}
+    )
+    result_file: str = field(
+        default="benchmark_result.jsonl",
+        metadata={"help": "The file which every benchmark result is appended to, one JSON object per line."},
+    )
+
+
+@dataclass
+class TraceRequest:
+    prompt: str
+    max_length: int | None = None
+
+
+def load_trace(trace_file: str, tokenizer, num_requests: int | None = None, seed: int = 42) -> list[TraceRequest]:
+    """load the requests of the trace, the prompts which are given by length are built with random tokens"""
+    rng = np.random.RandomState(seed)
+    requests = []
+    with open(trace_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            example = json.loads(line)
+            max_length = example.get("max_length", example.get("output_length", None))
+            if "src" in example:
+                prompt = example["src"]
+            else:
+                # skip the special tokens at the front of the vocab
+                token_ids = rng.randint(100, tokenizer.vocab_size, size=int(example["input_length"]))
+                prompt = tokenizer.decode(token_ids.tolist(), skip_special_tokens=True)
+            requests.append(TraceRequest(prompt, max_length))
+
+    if num_requests is not None and num_requests != len(requests):
+        indices = rng.choice(len(requests), size=num_requests, replace=num_requests > len(requests))
+        requests = [requests[index] for index in indices]
+    return requests
+
+
+def percentiles(values: list[float], prefix: str) -> dict[str, float]:
+    """the mean and the percentiles of `values` in milliseconds"""
+    if len(values) == 0:
+        return {}
+    values = np.array(values) * 1000
+    metrics = {f"mean_{prefix}_ms": float(values.mean())}
+    for q in [50, 90, 99]:
+        metrics[f"p{q}_{prefix}_ms"] = float(np.percentile(values, q))
+    return metrics
+
+
+def summarize(
+    requests: list[GenerationRequest], num_input_tokens: list[int], duration: float, tokenizer
+) -> dict[str, float]:
+    """compute the latency and throughput metrics of the finished requests"""
+    ttfts, itls, latencies, tpots = [], [], [], []
+    num_output_tokens, num_completed = 0, 0
+    for request in requests:
+        if request.error is not None:
+            continue
+        num_completed += 1
+        token_times = request.token_times
+        if len(token_times) == 0 and request.output_text:
+            # the predictor returns the whole text at the end, count the tokens of the text
+            num_tokens = len(tokenizer(request.output_text, return_attention_mask=False)["input_ids"])
+            token_times = [request.finish_time] * num_tokens
+        num_output_tokens += len(token_times)
+        latencies.append(request.finish_time - request.arrival_time)
+        if len(token_times) == 0:
+            continue
+        ttfts.append(token_times[0] - request.arrival_time)
+        # the tokens delivered together are counted as zero latency, which follows how the client sees them
+        itls.extend(np.diff(token_times).tolist())
+        if len(token_times) > 1:
+            tpots.append((token_times[-1] - token_times[0]) / (len(token_times) - 1))
+
+    metrics = {
+        "num_requests": len(requests),
+        "num_completed": num_completed,
+        "duration_s": duration,
+        "request_throughput": num_completed / duration,
+        "output_token_throughput": num_output_tokens / duration,
+        "total_token_throughput": (num_output_tokens + sum(num_input_tokens)) / duration,
+        "mean_input_tokens": float(np.mean(num_input_tokens)) if num_input_tokens else 0.0,
+        "mean_output_tokens": num_output_tokens / max(num_completed, 1),
+    }
+    metrics.update(percentiles(ttfts, "ttft"))
+    metrics.update(percentiles(itls, "itl"))
+    metrics.update(percentiles(tpots, "tpot"))
+    metrics.update(percentiles(latencies, "e2e_latency"))
+    return metrics
+
+
+def memory_usage() -> dict[str, float]:
+    if not paddle.is_compiled_with_cuda():
+        return {}
+    return {
+        "max_memory_allocated_mb": paddle.device.cuda.max_memory_allocated() / 1024**2,
+        "max_memory_reserved_mb": paddle.device.cuda.max_memory_reserved() / 1024**2,
+    }
+
+
+class BenchmarkRunner:
+    """submit the trace requests to the scheduler on time, which runs in the scheduler loop of rank 0"""
+
+    def __init__(self, scheduler: RequestScheduler, tokenizer, args: BenchmarkArgument):
+        self.scheduler = scheduler
+        self.tokenizer = tokenizer
+        self.args = args
+
+    def _submit(self, request: TraceRequest, semaphore: threading.Semaphore | None) -> GenerationRequest:
+        generation_kwargs = {} if request.max_length is None else {"max_length": request.max_length}
+        generation_request = self.scheduler.submit(request.prompt, **generation_kwargs)
+        if semaphore is not None:
+            threading.Thread(target=self._release_on_finish, args=(generation_request, semaphore), daemon=True).start()
+        return generation_request
+
+    @staticmethod
+    def _release_on_finish(request: GenerationRequest, semaphore: threading.Semaphore):
+        try:
+            request.result()
+        except Exception:
+            pass
+        semaphore.release()
+
+    def run_once(self, requests: list[TraceRequest], request_rate: float) -> dict[str, float]:
+        rng = np.random.RandomState(self.args.seed)
+        semaphore = threading.Semaphore(self.args.max_concurrency) if self.args.max_concurrency else None
+
+        start = time.time()
+        next_arrival = start
+        submitted = []
+        for request in requests:
+            if not math.isinf(request_rate):
+                next_arrival += rng.exponential(1.0 / request_rate)
+                time.sleep(max(0.0, next_arrival - time.time()))
+            if semaphore is not None:
+                semaphore.acquire()
+            submitted.append(self._submit(request, semaphore))
+
+        for request in submitted:
+            try:
+                request.result()
+            except Exception as err:
+                logger.warning(f"Request {request.request_id} failed: {err}")
+        duration = time.time() - start
+
+        num_input_tokens = [
+            len(self.tokenizer(request.prompt, return_attention_mask=False)["input_ids"]) for request in requests
+        ]
+        return summarize(submitted, num_input_tokens, duration, self.tokenizer)
+
+    def run(self, predictor_args: PredictorArgument):
+        try:
+            requests = load_trace(self.args.trace_file, self.tokenizer, self.args.num_requests, self.args.seed)
+            for request in requests[: self.args.num_warmup_requests]:
+                self._submit(request, None).result()
+
+            for request_rate in [float(rate) for rate in self.args.request_rates.split(",")]:
+                metrics = {
+                    "request_rate": request_rate,
+                    "max_concurrency": self.args.max_concurrency,
+                    "batch_size": predictor_args.batch_size,
+                    "dtype": predictor_args.dtype,
+                    "quant_type": predictor_args.quant_type,
+                    "mode": predictor_args.mode,
+                    "inference_model": predictor_args.inference_model,
+                    "src_length": predictor_args.src_length,
+                    "max_length": predictor_args.max_length,
+                }
+                metrics.update(self.run_once(requests, request_rate))
+                metrics.update(memory_usage())
+                logger.info(f"Benchmark result: {json.dumps(metrics, indent=2)}")
+                with open(self.args.result_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**metrics, "args": asdict(self.args)}) + "\n")
+        finally:
+            self.scheduler.shutdown()
+
+
+def main():
+    parser = PdArgumentParser((PredictorArgument, ModelArgument, BenchmarkArgument))
+    predictor_args, model_args, benchmark_args = parser.parse_args_into_dataclasses()
+    if benchmark_args.trace_file is None:
+        raise ValueError("`trace_file` is required to run the benchmark.")
+
+    paddle.set_device(predictor_args.device)
+    paddle.set_default_dtype(predictor_args.dtype)
+
+    tensor_parallel_degree = paddle.distributed.get_world_size()
+    if predictor_args.init_fleet_worker or tensor_parallel_degree > 1:
+        strategy = fleet.DistributedStrategy()
+        strategy.hybrid_configs = {
+            "dp_degree": 1,
+            "mp_degree": tensor_parallel_degree,
+            "pp_degree": 1,
+            "sharding_degree": 1,
+        }
+        fleet.init(is_collective=True, strategy=strategy)
+
+    predictor = create_predictor(predictor_args, model_args)
+    scheduler = create_scheduler(
+        predictor, max_queue_size=benchmark_args.max_queue_size, max_wait_time=benchmark_args.max_wait_time
+    )
+
+    if predictor.tensor_parallel_rank == 0:
+        runner = BenchmarkRunner(scheduler, predictor.tokenizer, benchmark_args)
+        thread = threading.Thread(target=runner.run, args=(predictor_args,), daemon=True)
+        thread.start()
+
+    # all ranks run the scheduler loop, rank 0 broadcasts the scheduling decisions to the others
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -233,12 +233,14 @@ def main():
             train_ds,
             tokenizer=tokenizer,
             max_length=data_args.max_length,
+            packing_strategy=data_args.intokens_packing_strategy,
         )
         if eval_intokens:
             dev_ds = intoken_dataset(
                 dev_ds,
                 tokenizer=tokenizer,
                 max_length=data_args.max_length,
+                packing_strategy=data_args.intokens_packing_strategy,
             )
 
     if model_args.prefix_tuning:
@@ -15,11 +15,11 @@ from __future__ import annotations
 
 import json
 import re
-import time
+import threading
 from dataclasses import dataclass, field
-from multiprocessing.shared_memory import SharedMemory
 
 from predictor import BasePredictor, ModelArgument, PredictorArgument, create_predictor
+from scheduler import create_scheduler
 
 from paddlenlp.trainer import PdArgumentParser
 from paddlenlp.utils.log import logger
@@ -30,65 +30,10 @@ class ServerArgument:
     port: int = field(default=8011, metadata={"help": "The port of ui service"})
     flask_port: int = field(default=8010, metadata={"help": "The port of flask service"})
     title: str = field(default="LLM", metadata={"help": "The title of gradio"})
-
-
-def read_shared_memory(memory: SharedMemory):
-    """read content from shared memory
-
-    Args:
-        memory (SharedMemory): the instance of shared Memory
-    """
-    length = int(memory.buf[0]) * 256 + int(memory.buf[1])
-    if length == 0:
-        return ""
-
-    sentence = bytes(memory.buf[2 : length + 2]).decode()
-    return sentence
-
-
-def write_shared_memory(memory: SharedMemory, sentence: str):
-    """write content into shared memory
-
-        [0:2]: store the length of sentence
-        [2:]:  store the content of sentence
-
-    Args:
-        memory (SharedMemory): the instance of shared Memory
-        sentence (str): the content which must be string
-    """
-    buffer = bytearray(memory.buf.nbytes)
-    data = sentence.encode("utf-8")
-
-    buffer[0:2] = bytearray([len(data) // 256, len(data) % 256])
-    buffer[2 : len(data) + 2] = data
-    memory.buf[:] = buffer
-
-
-SLEEP_SECOND = 0.5
-SHARED_MEMORY_NAME = "shared_memory"
-
-
-def create_shared_memory(name: int, rank: int):
-    """create shared memory between multi-process
-
-    Args:
-        name (int): the name of memory block
-        rank (int): the rank of current process
-    """
-    file = f"{SHARED_MEMORY_NAME}-{name}"
-    shared_memory = None
-    if rank != 0:
-        while True:
-            try:
-                shared_memory = SharedMemory(file, size=1024 * 100)
-                print("success create shared_memory")
-                break
-            except FileNotFoundError:
-                time.sleep(0.01)
-                print("sleep for create shared memory")
-    else:
-        shared_memory = SharedMemory(file, create=True, size=1024 * 100)
-    return shared_memory
+    max_queue_size: int = field(default=1024, metadata={"help": "The max number of waiting requests"})
+    max_wait_time: float = field(
+        default=0.01, metadata={"help": "The max seconds to wait for more requests to fill an idle batch"}
+    )
 
 
 def enforce_stop_tokens(text, stop) -> str:
@@ -102,36 +47,26 @@ class PredictorServer:
 
         self.predictor = predictor
         self.args = args
-
-        self.input_shared_memory = create_shared_memory("input", self.predictor.tensor_parallel_rank)
-        self.output_shared_memory = create_shared_memory("output", self.predictor.tensor_parallel_rank)
-
-        if self.predictor.tensor_parallel_rank == 0:
-            write_shared_memory(self.input_shared_memory, "")
-            write_shared_memory(self.output_shared_memory, "")
+        self.scheduler = create_scheduler(
+            predictor, max_queue_size=args.max_queue_size, max_wait_time=args.max_wait_time
+        )
 
     def predict(self, input_texts: str | list[str]):
         return self.predictor.predict(input_texts)
 
-    def start_predict(self, data):
-        print("start to predict under data", data)
-
-        data = json.dumps(data, ensure_ascii=False)
-        write_shared_memory(self.input_shared_memory, data)
-
-        while True:
-            result = read_shared_memory(self.output_shared_memory)
-            if result:
-                write_shared_memory(self.output_shared_memory, "")
-                return result
+    def submit(self, data):
+        context = data.pop("context", "")
+        data.pop("extra_info", None)
 
-            else:
-                print("not found result, so to sleep ...")
-
-            time.sleep(0.5)
+        generation_args = {
+            key: data[key]
+            for key in ["max_length", "top_k", "top_p", "temperature", "repetition_penalty"]
+            if key in data
+        }
+        return self.scheduler.submit(context, **generation_args)
 
     def start_flask_server(self):
-        from flask import Flask, jsonify, request
+        from flask import Flask, Response, jsonify, request
 
         app = Flask(__name__)
 
@@ -139,8 +74,34 @@ class PredictorServer:
         def _server():
             data = request.get_json()
             logger.info(f"Request: {json.dumps(data, indent=2, ensure_ascii=False)}")
+            stream = data.pop("stream", False)
+            try:
+                generation_request = self.submit(data)
+            except Exception as err:
+                logger.error(f"Server error: {err}")
+                output = {"error_code": 1000, "error_msg": f"Server error: {err}", "result": None}
+                return jsonify(output)
+
+            if stream:
+
+                def _stream():
+                    try:
+                        for chunk in generation_request.stream():
+                            output = {
+                                "error_code": 0,
+                                "error_msg": "Success",
+                                "result": {"response": {"role": "bot", "utterance": chunk}},
+                            }
+                            yield json.dumps(output, ensure_ascii=False) + "\n"
+                    except Exception as err:
+                        logger.error(f"Server error: {err}")
+                        output = {"error_code": 1000, "error_msg": f"Server error: {err}", "result": None}
+                        yield json.dumps(output, ensure_ascii=False) + "\n"
+
+                return Response(_stream(), mimetype="application/x-ndjson")
+
             try:
-                pred_seq = self.start_predict(data)
+                pred_seq = generation_request.result() or "invalid response"
                 output = {
                     "error_code": 0,
                     "error_msg": "Success",
@@ -153,7 +114,7 @@ class PredictorServer:
             logger.info(f"Response: {json.dumps(output, indent=2, ensure_ascii=False)}")
             return jsonify(output)
 
-        app.run(host="0.0.0.0", port=self.args.flask_port)
+        app.run(host="0.0.0.0", port=self.args.flask_port, threaded=True)
 
     def start_ui_service(self, args):
         # do not support start ui service in one command
@@ -166,37 +127,6 @@ class PredictorServer:
         p.start()
 
 
-def main(args, server: PredictorServer):
-    from time import sleep
-
-    while True:
-        sleep(0.5)
-        content = read_shared_memory(server.input_shared_memory)
-
-        if content:
-            content = json.loads(content)
-
-            context = content.pop("context", "")
-            content.pop("extra_info", None)
-
-            generation_args = content
-            server.predictor.config.max_length = generation_args["max_length"]
-            server.predictor.config.top_p = generation_args["top_p"]
-            server.predictor.config.temperature = generation_args["temperature"]
-            server.predictor.config.top_k = generation_args["top_k"]
-            server.predictor.config.repetition_penalty = generation_args["repetition_penalty"]
-
-            for key, value in generation_args.items():
-                setattr(server.args, key, value)
-
-            result = server.predict(context)
-            result = result[0]
-            if not result:
-                result = "invalid response"
-            write_shared_memory(server.output_shared_memory, result)
-            write_shared_memory(server.input_shared_memory, "")
-
-
 if __name__ == "__main__":
 
     parser = PdArgumentParser((PredictorArgument, ModelArgument, ServerArgument))
@@ -208,12 +138,9 @@ if __name__ == "__main__":
     if server.predictor.tensor_parallel_rank == 0:
         server.start_ui_service(server_args)
 
-        from multiprocessing import Process
-
-        p = Process(
-            target=server.start_flask_server,
-        )
-        p.daemon = True
-        p.start()
+        # the flask server shares the request queue with the scheduler, so it runs in a thread of the same process
+        t = threading.Thread(target=server.start_flask_server, daemon=True)
+        t.start()
 
-    main(server_args, server)
+    # all ranks run the scheduler loop, rank 0 broadcasts the scheduling decisions to the others
+    server.scheduler.run()
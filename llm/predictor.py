@@ -24,6 +24,7 @@ import numpy as np
 import paddle
 import paddle.distributed.fleet.base.topology as tp
 from paddle.distributed import fleet
+from prefix_cache import PrefixCache
 from utils import (
     dybatch_preprocess,
     get_alibi_slopes,
@@ -32,6 +33,7 @@ from utils import (
     load_real_time_tokens,
 )
 
+from paddlenlp.generation import BaseStreamer, TokenIteratorStreamer
 from paddlenlp.peft import LoRAConfig, LoRAModel, PrefixConfig, PrefixModelForCausalLM
 from paddlenlp.taskflow.utils import static_mode_guard
 from paddlenlp.trainer import PdArgumentParser
@@ -63,6 +65,17 @@ class PredictorArgument:
     prefix_path: str = field(
         default=None, metadata={"help": "The directory of Prefix Tuning parameters. Default to None"}
     )
+    enable_prefix_cache: bool = field(
+        default=False,
+        metadata={
+            "help": "whether cache the key/value of the prompt prefixes shared by the requests to skip their prefill, "
+            "only dygraph inference model of llama supports it."
+        },
+    )
+    prefix_cache_block_size: int = field(
+        default=64, metadata={"help": "the number of tokens in one block of the prefix cache"}
+    )
+    prefix_cache_memory: int = field(default=2048, metadata={"help": "the memory budget (MB) of the prefix cache"})
     decode_strategy: str = field(
         default="sampling",
         metadata={
@@ -320,6 +333,9 @@ class InferencePredictorMixin:
         self.arange_tensor_encoder = paddle.zeros(
             shape=(config.batch_size, 1, config.total_max_length), dtype=self.dtype
         )
+        # the in-memory channel of the generated tokens, only dygraph inference model supports it.
+        # the exported static model saves the tokens into `real_time_save.*` files.
+        self.token_streamer: TokenIteratorStreamer = None
 
         if config.export_precache:
             if config.prefix_path:
@@ -345,9 +361,37 @@ class InferencePredictorMixin:
                 )
                 self.pre_caches = [item.squeeze_(0) for item in paddle.split(prefix_cache, self.num_layers, axis=0)]
 
+        self.prefix_cache: PrefixCache = None
+        # the `(row, token_ids)` of the prompts to be cached after the current batch is prefilled
+        self._uncached_prompts: list[tuple[int, list[int]]] = []
+        if config.enable_prefix_cache:
+            if config.export_precache:
+                raise ValueError("`enable_prefix_cache` can not be used together with `export_precache`.")
+            if config.mode != "dynamic" or "llama" not in self.architectures:
+                raise ValueError("`enable_prefix_cache` only supports the dygraph inference model of llama.")
+            # the key/value of one block in all layers: [num_layers, 2, num_heads, block_size, head_dim]
+            block_bytes = (
+                self.num_layers
+                * 2
+                * self.num_attention_heads
+                * config.prefix_cache_block_size
+                * self.head_dim
+                * self.cache_kvs[0].element_size()
+            )
+            self.prefix_cache = PrefixCache(
+                block_size=config.prefix_cache_block_size,
+                max_num_blocks=config.prefix_cache_memory * 1024 * 1024 // block_bytes,
+            )
+
     def _postprocess(self, predictions):
+        if self.prefix_cache is not None:
+            self._update_prefix_cache()
+
         if paddle.distributed.get_rank() == 0:
-            tokens: np.ndarray = load_real_time_tokens()
+            if self.token_streamer is not None:
+                tokens: np.ndarray = self.token_streamer.tokens()
+            else:
+                tokens: np.ndarray = load_real_time_tokens()
             decoded_predictions = self.tokenizer.batch_decode(
                 tokens.tolist(), skip_special_tokens=True, clean_up_tokenization_spaces=False
             )
@@ -355,6 +399,35 @@ class InferencePredictorMixin:
         else:
             return None
 
+    def _init_row_masks(self, row: int, length: int, pre_caches_length: int = 0):
+        """init the encoder attention mask and the generation mask of the `row`-th sequence in batch"""
+        self.attention_mask[row, 0, :length, :length] = paddle.tril(
+            paddle.ones(shape=(length, length), dtype=self.config.dtype)
+        )
+
+        # the prefix tuning caches without `prefix_path` are placeholders, which should not be attended to
+        mask_prefix = self.config.prefix_path is None and self.prefix_cache is None
+        if pre_caches_length > 0:
+            if mask_prefix:
+                prefix_attention_mask = paddle.zeros([1, length, pre_caches_length], dtype=self.attention_mask.dtype)
+            else:
+                prefix_attention_mask = paddle.ones([1, length, pre_caches_length], dtype=self.attention_mask.dtype)
+            post_attention_mask = paddle.tril(
+                paddle.ones(shape=(length, length), dtype=self.attention_mask.dtype)
+            ).unsqueeze_(axis=0)
+            self.attention_mask[row, 0, :length, : length + pre_caches_length] = paddle.concat(
+                [prefix_attention_mask, post_attention_mask], axis=2
+            )
+
+        if mask_prefix:
+            self.tgt_generation_mask[row, 0, 0, pre_caches_length : length + pre_caches_length] = paddle.ones(
+                shape=[1, length], dtype="float16"
+            )
+        else:
+            self.tgt_generation_mask[row, 0, 0, : length + pre_caches_length] = paddle.ones(
+                shape=[1, length + pre_caches_length], dtype=self.config.dtype
+            )
+
     def _preprocess(self, source):
         self.attention_mask[:] = 0
         self.tgt_generation_mask[:] = 0
@@ -456,42 +529,18 @@ class InferencePredictorMixin:
                 benchmark=self.config.benchmark,
             )
 
+            if self.prefix_cache is not None:
+                pre_caches_length = self._apply_prefix_cache(inputs)
+
             for i in range(inputs["input_ids"].shape[0]):
                 length = inputs["seq_len_encoder"][i][0]
-                self.attention_mask[i, 0, :length, :length] = paddle.tril(
-                    paddle.ones(shape=(length, length), dtype=self.config.dtype)
-                )
-
-                if pre_caches_length > 0:
-                    if self.config.prefix_path is None:
-                        prefix_attention_mask = paddle.zeros(
-                            [1, length, pre_caches_length], dtype=self.attention_mask.dtype
-                        )
-                    else:
-                        prefix_attention_mask = paddle.ones(
-                            [1, length, pre_caches_length], dtype=self.attention_mask.dtype
-                        )
-                    post_attention_mask = paddle.tril(
-                        paddle.ones(shape=(length, length), dtype=self.attention_mask.dtype)
-                    ).unsqueeze_(axis=0)
-                    self.attention_mask[i, 0, :length, : length + pre_caches_length] = paddle.concat(
-                        [prefix_attention_mask, post_attention_mask], axis=2
-                    )
-
-                if self.config.prefix_path is None:
-                    self.tgt_generation_mask[i, 0, 0, pre_caches_length : length + pre_caches_length] = paddle.ones(
-                        shape=[1, length], dtype="float16"
-                    )
-                else:
-                    self.tgt_generation_mask[i, 0, 0, : length + pre_caches_length] = paddle.ones(
-                        shape=[1, length + pre_caches_length], dtype=self.config.dtype
-                    )
+                self._init_row_masks(i, length, pre_caches_length)
 
         inputs["pre_ids"] = self.pre_ids
         inputs["attention_mask"] = self.attention_mask
         inputs["tgt_generation_mask"] = self.tgt_generation_mask
 
-        if pre_caches_length > 0:
+        if pre_caches_length > 0 and self.prefix_cache is None:
             if self.config.mode == "dynamic":
                 inputs["pre_caches"] = self.pre_caches
             else:
@@ -500,6 +549,42 @@ class InferencePredictorMixin:
 
         return inputs
 
+    def _apply_prefix_cache(self, inputs) -> int:
+        """
+        skip the prefill of the cached prompt prefix: the cached key/value is passed as `pre_caches` and only the rest
+        of the prompts runs the encoder. The fused model takes one prefix length for the whole batch, so the shortest
+        cached prefix of the rows is used. Returns the length of the prefix.
+        """
+        input_ids, seq_lens = inputs["input_ids"], inputs["seq_len_encoder"][:, 0]
+        prompts = [input_ids[i, : seq_lens[i]].tolist() for i in range(len(seq_lens))]
+        self._uncached_prompts = list(enumerate(prompts))
+
+        # keep at least one token of every prompt for the encoder, which generates the first token
+        cached_blocks = [self.prefix_cache.match(prompt[:-1]) for prompt in prompts]
+        num_blocks = min(len(blocks) for blocks in cached_blocks)
+        if num_blocks == 0:
+            return 0
+
+        # [num_layers, 2, batch_size, num_heads, pre_caches_length, head_dim]
+        pre_caches = paddle.stack([paddle.concat(blocks[:num_blocks], axis=3) for blocks in cached_blocks], axis=2)
+        inputs["pre_caches"] = [item.squeeze_(0) for item in paddle.split(pre_caches, self.num_layers, axis=0)]
+
+        # the position ids, `seq_len_decoder`, `tgt_ids` and `tgt_pos` of the whole prompts are kept
+        pre_caches_length = num_blocks * self.prefix_cache.block_size
+        inputs["input_ids"] = input_ids[:, pre_caches_length:]
+        inputs["seq_len_encoder"] = inputs["seq_len_encoder"] - pre_caches_length
+        return pre_caches_length
+
+    def _update_prefix_cache(self):
+        """cache the key/value of the prompts in the current batch, which stay in `cache_kvs` after generation"""
+        for row, prompt in self._uncached_prompts:
+
+            def get_value(start, end, row=row):
+                return paddle.stack([cache_kv[:, row, :, start:end] for cache_kv in self.cache_kvs])
+
+            self.prefix_cache.insert(prompt, get_value)
+        self._uncached_prompts = []
+
 
 class StaticInferencePredictor(InferencePredictorMixin, BasePredictor):
     def __init__(
@@ -577,6 +662,9 @@ class StaticInferencePredictor(InferencePredictorMixin, BasePredictor):
 
         self.predictor.run()
 
+        # (next_tokens, step_idx, stop_flags, seq_len_decoder, tgt_pos)
+        return [self.predictor.get_output_handle(name).copy_to_cpu() for name in self.predictor.get_output_names()]
+
 
 class DygraphInferencePredictor(InferencePredictorMixin, BasePredictor):
     def __init__(
@@ -591,7 +679,7 @@ class DygraphInferencePredictor(InferencePredictorMixin, BasePredictor):
         self.model = model
 
     @paddle.no_grad()
-    def _infer(self, inputs: dict[str, paddle.Tensor]):
+    def _infer(self, inputs: dict[str, paddle.Tensor], streamer: BaseStreamer = None):
         for key in inputs.keys():
             if paddle.is_tensor(inputs[key]):
                 continue
@@ -603,10 +691,14 @@ class DygraphInferencePredictor(InferencePredictorMixin, BasePredictor):
                 inputs[key] = paddle.to_tensor(inputs[key])
 
         inputs["cache_kvs"] = self.cache_kvs
-        self.model.generate(
+        if streamer is None:
+            streamer = self.token_streamer = TokenIteratorStreamer()
+        outputs = self.model.generate(
             **inputs,
+            streamer=streamer,
         )
-        return None
+        # (next_tokens, step_idx, stop_flags, seq_len_decoder, tgt_pos)
+        return [output.numpy() for output in outputs]
 
 
 def create_predictor(
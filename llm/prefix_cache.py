@@ -0,0 +1,132 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+from typing import Any, Callable, Sequence
+
+
+class _BlockNode:
+    """A node of the radix tree, which holds the cached value of one block of tokens."""
+
+    __slots__ = ("key", "parent", "children", "value", "last_access")
+
+    def __init__(self, key: tuple, parent: _BlockNode | None, value: Any = None):
+        self.key = key
+        self.parent = parent
+        self.children: dict[tuple, _BlockNode] = {}
+        self.value = value
+        self.last_access = 0
+
+
+class PrefixCache:
+    """
+    The prompt prefix cache shared by the requests, which is a radix tree over fixed-size blocks of token ids.
+
+    Every node is keyed by the token ids of its block and holds the value (the key/value cache of the inference model)
+    of the block, so the path from the root stands for the token-id prefix. Only full blocks are cached. When the
+    number of cached blocks reaches `max_num_blocks`, the least recently used leaf blocks are evicted, which keeps
+    every cached block reachable from the root.
+
+    Args:
+        block_size (int): The number of tokens in one block.
+        max_num_blocks (int): The max number of cached blocks, which is derived from the memory budget.
+    """
+
+    def __init__(self, block_size: int, max_num_blocks: int):
+        if block_size <= 0:
+            raise ValueError(f"`block_size` should be a positive integer, but received {block_size}")
+        self.block_size = block_size
+        self.max_num_blocks = max_num_blocks
+        self.root = _BlockNode(key=(), parent=None)
+        self.num_blocks = 0
+        self.num_queried_tokens = 0
+        self.num_hit_tokens = 0
+        self._clock = 0
+
+    def __len__(self):
+        return self.num_blocks
+
+    @property
+    def hit_rate(self) -> float:
+        return self.num_hit_tokens / self.num_queried_tokens if self.num_queried_tokens > 0 else 0.0
+
+    def _touch(self, node: _BlockNode):
+        self._clock += 1
+        node.last_access = self._clock
+
+    def _iter_blocks(self, token_ids: Sequence[int]):
+        for start in range(0, len(token_ids) - self.block_size + 1, self.block_size):
+            yield start, tuple(token_ids[start : start + self.block_size])
+
+    def match(self, token_ids: Sequence[int]) -> list:
+        """return the cached values of the longest cached prefix of `token_ids`, one value for every block"""
+        node, values = self.root, []
+        for _, key in self._iter_blocks(token_ids):
+            node = node.children.get(key, None)
+            if node is None:
+                break
+            self._touch(node)
+            values.append(node.value)
+
+        self.num_queried_tokens += len(token_ids)
+        self.num_hit_tokens += len(values) * self.block_size
+        return values
+
+    def insert(self, token_ids: Sequence[int], get_value: Callable[[int, int], Any]) -> int:
+        """
+        cache the full blocks of `token_ids` which are not cached yet.
+
+        Args:
+            token_ids (Sequence[int]): The token ids of the prefix.
+            get_value (Callable[[int, int], Any]): Returns the value of the tokens in `[start, end)`, which is only
+                called for the new blocks.
+
+        Returns:
+            int: The number of new blocks.
+        """
+        node, path, num_new_blocks = self.root, set(), 0
+        for start, key in self._iter_blocks(token_ids):
+            child = node.children.get(key, None)
+            if child is None:
+                if self.num_blocks >= self.max_num_blocks and not self._evict(protected=path):
+                    break
+                child = _BlockNode(key=key, parent=node, value=get_value(start, start + self.block_size))
+                node.children[key] = child
+                self.num_blocks += 1
+                num_new_blocks += 1
+            self._touch(child)
+            path.add(child)
+            node = child
+        return num_new_blocks
+
+    def _evict(self, protected: set) -> bool:
+        """evict the least recently used leaf block which is not in `protected`"""
+        victim, stack = None, list(self.root.children.values())
+        while stack:
+            node = stack.pop()
+            if node.children:
+                stack.extend(node.children.values())
+            elif node not in protected and (victim is None or node.last_access < victim.last_access):
+                victim = node
+        if victim is None:
+            return False
+
+        del victim.parent.children[victim.key]
+        victim.parent = victim.value = None
+        self.num_blocks -= 1
+        return True
+
+    def clear(self):
+        self.root.children.clear()
+        self.num_blocks = 0
@@ -0,0 +1,477 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import queue
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import numpy as np
+import paddle
+
+from paddlenlp.generation import BaseStreamer
+from paddlenlp.utils.log import logger
+
+# the sentinel which tells the scheduler loop (of every rank) to exit
+_SHUTDOWN = "__shutdown__"
+
+
+@dataclass
+class GenerationRequest:
+    """A generation request submitted to the scheduler, which receives the generated text incrementally."""
+
+    prompt: str
+    max_length: int = 1024
+    top_k: int = 0
+    top_p: float = 0.7
+    temperature: float = 0.95
+    repetition_penalty: float = 1.0
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    arrival_time: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        self.output_ids: list[int] = []
+        self.output_text: str = ""
+        self.finished: bool = False
+        self.error: Exception | None = None
+        # the time when every generated token is delivered, which is used to measure the latency
+        self.token_times: list[float] = []
+        self.finish_time: float | None = None
+        self._chunks = queue.Queue()
+
+    @property
+    def generation_params(self):
+        return (self.max_length, self.top_k, self.top_p, self.temperature, self.repetition_penalty)
+
+    def put(self, text: str, finished: bool = False, num_tokens: int = 0):
+        """push a new piece of generated text, which is decoded from `num_tokens` new tokens, to the consumer"""
+        now = time.time()
+        self.token_times.extend([now] * num_tokens)
+        self.output_text += text
+        if text:
+            self._chunks.put(text)
+        if finished:
+            self.finished = True
+            self.finish_time = now
+            self._chunks.put(None)
+
+    def fail(self, error: Exception):
+        self.error = error
+        self.finished = True
+        self.finish_time = time.time()
+        self._chunks.put(None)
+
+    def stream(self, timeout: float | None = None):
+        """yield the generated text piece by piece until the request is finished"""
+        while True:
+            chunk = self._chunks.get(timeout=timeout)
+            if chunk is None:
+                break
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+    def result(self, timeout: float | None = None) -> str:
+        """block until the request is finished and return the whole generated text"""
+        for _ in self.stream(timeout=timeout):
+            pass
+        return self.output_text
+
+
+class IncrementalDetokenizer:
+    """Decode the generated token ids of one sequence into text chunks, holding back incomplete characters."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.text = ""
+
+    def step(self, token_ids: list[int]) -> str:
+        text = self.tokenizer.decode(token_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+        # the last token may be part of a multi-byte character, wait for the following tokens
+        if text.endswith("�"):
+            return ""
+        delta = text[len(self.text) :]
+        self.text = text
+        return delta
+
+
+class RequestScheduler:
+    """
+    The base scheduler: requests are admitted into a queue by the web server thread(s), and are consumed by the
+    scheduler loop which runs the predictor. When tensor parallel is enabled, rank 0 makes every scheduling decision
+    and broadcasts it to the other ranks, so that all ranks run the same batch.
+
+    Args:
+        predictor (BasePredictor): the predictor created by `create_predictor`.
+        max_queue_size (int, optional): the max number of waiting requests, `submit` raises `queue.Full` beyond it.
+        max_wait_time (float, optional): the max seconds to wait for more requests to fill an idle batch.
+    """
+
+    def __init__(self, predictor, max_queue_size: int = 1024, max_wait_time: float = 0.01):
+        self.predictor = predictor
+        self.tokenizer = predictor.tokenizer
+        self.batch_size = predictor.config.batch_size
+        self.max_wait_time = max_wait_time
+        self.waiting = queue.Queue(maxsize=max_queue_size)
+        self.is_master = predictor.tensor_parallel_rank == 0
+
+    def submit(self, prompt: str, **generation_kwargs) -> GenerationRequest:
+        """admit a new request, which is only valid in rank 0"""
+        if not self.is_master:
+            raise ValueError("requests can only be submitted to the scheduler of rank 0")
+        request = GenerationRequest(prompt=prompt, **generation_kwargs)
+        self.waiting.put_nowait(request)
+        return request
+
+    def shutdown(self):
+        self.waiting.put(_SHUTDOWN)
+
+    def _broadcast(self, obj):
+        """broadcast the scheduling decision of rank 0 to the other tensor parallel ranks"""
+        if self.predictor.tensor_parallel_degree > 1:
+            object_list = [obj]
+            paddle.distributed.broadcast_object_list(object_list, src=0)
+            obj = object_list[0]
+        return obj
+
+    def _get_waiting(self, max_num: int, block: bool):
+        """fetch at most `max_num` waiting requests, blocks for the first one when `block` is True"""
+        requests = []
+        deadline = None
+        while len(requests) < max_num:
+            try:
+                if block and not requests:
+                    request = self.waiting.get()
+                    deadline = time.time() + self.max_wait_time
+                elif deadline is not None and deadline > time.time():
+                    request = self.waiting.get(timeout=deadline - time.time())
+                else:
+                    request = self.waiting.get_nowait()
+            except queue.Empty:
+                break
+            requests.append(request)
+            if request == _SHUTDOWN:
+                break
+        return requests
+
+    def run(self):
+        raise NotImplementedError
+
+
+class StaticBatchScheduler(RequestScheduler):
+    """
+    Request-level batching for the predictors which run the whole generation in one call (`DygraphPredictor`,
+    `StaticGraphPredictor`): requests which share the same generation parameters are coalesced into one batch, and
+    a new batch starts after the previous one is finished.
+    """
+
+    def __init__(self, predictor, max_queue_size: int = 1024, max_wait_time: float = 0.01):
+        super().__init__(predictor, max_queue_size=max_queue_size, max_wait_time=max_wait_time)
+        # requests which are fetched but can not join the current batch
+        self._pending: list[GenerationRequest] = []
+
+    def _next_batch(self):
+        # drain the waiting queue so that the requests with the same parameters can be grouped together
+        max_num = max(self.batch_size, self.waiting.qsize())
+        self._pending.extend(self._get_waiting(max_num, block=len(self._pending) == 0))
+        if _SHUTDOWN in self._pending:
+            return None
+
+        params = self._pending[0].generation_params
+        batch = [request for request in self._pending if request.generation_params == params][: self.batch_size]
+        self._pending = [request for request in self._pending if request not in batch]
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch() if self.is_master else None
+            plan = self._broadcast(
+                None if batch is None else ([request.prompt for request in batch], batch[0].generation_params)
+            )
+            if plan is None:
+                break
+
+            prompts, (max_length, top_k, top_p, temperature, repetition_penalty) = plan
+            config = self.predictor.config
+            config.max_length = max_length
+            config.top_k = top_k
+            config.top_p = top_p
+            config.temperature = temperature
+            config.repetition_penalty = repetition_penalty
+            try:
+                outputs = self.predictor.predict(prompts)
+            except Exception as err:
+                logger.error(f"Failed to run the predictor: {err}")
+                for request in batch or []:
+                    request.fail(err)
+                continue
+
+            if not self.is_master:
+                continue
+            for request, output in zip(batch, outputs):
+                request.put(output, finished=True)
+
+
+class _Slot:
+    """the runtime state of one row in the preallocated `cache_kvs`"""
+
+    def __init__(self, request: GenerationRequest | None, detokenizer: IncrementalDetokenizer | None):
+        self.request = request
+        self.detokenizer = detokenizer
+        self.output_ids: list[int] = []
+        # whether the eos token is met or the sequence is stopped
+        self.finished = False
+
+
+class _CallbackStreamer(BaseStreamer):
+    """pass the tokens of every step to `callback` as a NumPy array of shape `[batch_size, 1]`"""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+
+    def put(self, value):
+        if self.callback is not None:
+            self.callback(value.numpy().reshape([-1, 1]))
+
+    def end(self):
+        pass
+
+
+class ContinuousBatchScheduler(RequestScheduler):
+    """
+    Iteration-level (continuous) batching for the inference model predictors (`InferencePredictorMixin`).
+
+    Every row of the preallocated `cache_kvs` is a slot. The fused `generate` is called with `stop_nums` set to
+    the number of idle slots plus one, so it returns as soon as any running sequence finishes. The finished slots are
+    then refilled with waiting requests: new rows run the encoder in the first step of the next call (with their own
+    `seq_len_encoder`), while the running rows are marked with `seq_len_encoder == 0` and continue decoding with the
+    `step_idx`/`seq_len_decoder`/`tgt_pos` returned by the previous call. Sampling parameters are per-row inputs of
+    the inference model, so requests with different parameters share one batch.
+    """
+
+    def __init__(self, predictor, max_queue_size: int = 1024, max_wait_time: float = 0.01):
+        super().__init__(predictor, max_queue_size=max_queue_size, max_wait_time=max_wait_time)
+        architectures = predictor.architectures
+        if "chatglm" in architectures or "bloom" in architectures or "gpt" in architectures:
+            raise ValueError(f"ContinuousBatchScheduler does not support `{architectures}` yet.")
+
+        self.config = predictor.config
+        self.pre_caches_length = 0 if not self.config.export_precache else predictor.pre_caches[0].shape[-2]
+        self.max_dec_length = self.config.max_length - self.pre_caches_length
+        self.eos_token_ids = {self.tokenizer.eos_token_id}
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+
+        bs = self.batch_size
+        self.slots: list[_Slot | None] = [None] * bs
+        # the indices of the free slots, a stack which hands out the lowest index first
+        self._free_slots: list[int] = list(reversed(range(bs)))
+        # [rank 0] the admitted requests which are not bound to slots yet
+        self._admitted: dict[str, GenerationRequest] = {}
+        self.position_ids = paddle.zeros(shape=[bs, self.config.total_max_length], dtype="int64")
+        self.state = {
+            "eos_token_id": np.full([bs, 1], self.tokenizer.eos_token_id, dtype="int64"),
+            "top_p": np.zeros([bs, 1], dtype="float32"),
+            "temperature": np.ones([bs, 1], dtype="float32"),
+            "seq_len_encoder": np.zeros([bs, 1], dtype="int32"),
+            "seq_len_decoder": np.zeros([bs, 1], dtype="int32"),
+            "step_idx": np.zeros([bs, 1], dtype="int64"),
+            "tgt_ids": np.full([bs, 1], self.pad_token_id, dtype="int64"),
+            "tgt_pos": np.zeros([bs, 1], dtype="int64"),
+            "max_length": np.ones([bs, 1], dtype="int64"),
+            "min_length": np.ones([bs, 1], dtype="int64"),
+            "penalty_score": np.ones([bs, 1], dtype="float32"),
+            "frequency_score": np.zeros([bs, 1], dtype="float32"),
+            "presence_score": np.zeros([bs, 1], dtype="float32"),
+            "stop_flags": np.ones([bs, 1], dtype="bool"),
+        }
+
+    @property
+    def num_running(self):
+        return self.batch_size - len(self._free_slots)
+
+    def _tokenize(self, prompt: str) -> list[int]:
+        tokens = self.tokenizer(
+            prompt,
+            max_length=self.config.src_length,
+            truncation=True,
+            truncation_side="left",
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return tokens["input_ids"]
+
+    def _next_admissions(self):
+        """[rank 0] pick the waiting requests for the free slots: `[(request_id, input_ids, params)]`"""
+        requests = self._get_waiting(len(self._free_slots), block=self.num_running == 0)
+        if _SHUTDOWN in requests:
+            for request in requests:
+                if request != _SHUTDOWN:
+                    request.fail(RuntimeError("the scheduler is shutdown"))
+            return None
+
+        admissions = []
+        for request in requests:
+            self._admitted[request.request_id] = request
+            input_ids = self._tokenize(request.prompt)
+            admissions.append((request.request_id, input_ids, request.generation_params))
+        return admissions
+
+    def _admit(self, admissions):
+        """fill the free slots with new sequences, return the input_ids of the encoder step"""
+        state = self.state
+        state["seq_len_encoder"][:] = 0
+        # the slots are taken in the same order on every rank, so the admissions only carry the requests
+        admissions = [(self._free_slots.pop(), *admission) for admission in admissions]
+        # at least one row should run the encoder, occupy a free slot with a one-token dummy sequence if no new
+        # request is admitted. It stops right after its first step and the slot stays free. When the batch is full
+        # no request can be admitted, and all the rows just continue decoding.
+        if not admissions and self._free_slots:
+            admissions = [(self._free_slots[-1], None, [self.pad_token_id], (1, 0, 0.0, 1.0, 1.0))]
+
+        max_src_length = max((len(input_ids) for _, _, input_ids, _ in admissions), default=1)
+        input_ids = np.full([self.batch_size, max_src_length], self.pad_token_id, dtype="int64")
+        for slot_index, request_id, src_ids, params in admissions:
+            max_length, _, top_p, temperature, repetition_penalty = params
+            length = len(src_ids)
+            input_ids[slot_index, :length] = src_ids
+
+            state["seq_len_encoder"][slot_index] = length
+            state["seq_len_decoder"][slot_index] = length + self.pre_caches_length
+            state["step_idx"][slot_index] = 0
+            state["tgt_ids"][slot_index] = src_ids[-1]
+            state["tgt_pos"][slot_index] = length - 1
+            state["max_length"][slot_index] = max(1, min(max_length, self.max_dec_length))
+            state["top_p"][slot_index] = top_p
+            state["temperature"][slot_index] = temperature
+            state["penalty_score"][slot_index] = repetition_penalty
+            state["stop_flags"][slot_index] = False
+
+            self.position_ids[slot_index] = 0
+            self.position_ids[slot_index, self.pre_caches_length : self.pre_caches_length + length] = paddle.arange(
+                length
+            )
+            self.predictor.pre_ids[slot_index] = -1
+            self.predictor.attention_mask[slot_index] = 0
+            self.predictor.tgt_generation_mask[slot_index] = 0
+            self.predictor._init_row_masks(slot_index, length, self.pre_caches_length)
+
+            if request_id is not None:
+                request = self._admitted.pop(request_id) if self.is_master else None
+                detokenizer = IncrementalDetokenizer(self.tokenizer) if self.is_master else None
+                self.slots[slot_index] = _Slot(request, detokenizer)
+        return input_ids
+
+    def _build_inputs(self, input_ids):
+        inputs = {key: value.copy() for key, value in self.state.items()}
+        inputs["input_ids"] = input_ids
+        inputs["position_ids"] = self.position_ids
+        inputs["pre_ids"] = self.predictor.pre_ids
+        inputs["attention_mask"] = self.predictor.attention_mask
+        inputs["tgt_generation_mask"] = self.predictor.tgt_generation_mask
+        # return from `generate` as soon as one more running sequence is finished
+        num_stopped = int(inputs["stop_flags"].sum()) + int((inputs["max_length"][~inputs["stop_flags"]] <= 1).sum())
+        inputs["stop_nums"] = np.array([min(num_stopped + 1, self.batch_size)], dtype="int64")
+
+        if self.pre_caches_length > 0:
+            if self.config.mode == "dynamic":
+                inputs["pre_caches"] = self.predictor.pre_caches
+            else:
+                for i in range(len(self.predictor.pre_caches)):
+                    inputs["pre_caches_{}".format(i)] = self.predictor.pre_caches[i].numpy()
+        return inputs
+
+    def _deliver(self, tokens: np.ndarray):
+        """[rank 0] deliver the generated tokens of shape `[batch_size, num_steps]` to the running requests"""
+        for slot_index, slot in enumerate(self.slots):
+            if slot is None or slot.finished:
+                continue
+            num_tokens = len(slot.output_ids)
+            for token in tokens[slot_index].tolist():
+                # -1 means the row runs no decoding in this step
+                if token < 0:
+                    continue
+                if token in self.eos_token_ids:
+                    slot.finished = True
+                    break
+                slot.output_ids.append(int(token))
+            slot.request.put(
+                slot.detokenizer.step(slot.output_ids),
+                finished=slot.finished,
+                num_tokens=len(slot.output_ids) - num_tokens,
+            )
+
+    def _update(self, outputs):
+        """update the slot states with the outputs of `generate`, and release the finished slots"""
+        next_tokens, step_idx, stop_flags, seq_len_decoder, tgt_pos = outputs
+        self.state["tgt_ids"][:] = np.asarray(next_tokens).reshape([-1, 1])
+        self.state["step_idx"][:] = np.asarray(step_idx).reshape([-1, 1])
+        self.state["stop_flags"][:] = np.asarray(stop_flags).reshape([-1, 1]).astype("bool")
+        self.state["seq_len_decoder"][:] = np.asarray(seq_len_decoder).reshape([-1, 1])
+        self.state["tgt_pos"][:] = np.asarray(tgt_pos).reshape([-1, 1])
+
+        for slot_index, slot in enumerate(self.slots):
+            if slot is None or not self.state["stop_flags"][slot_index, 0]:
+                continue
+            # the sequence is stopped by `max_length` rather than eos
+            if self.is_master and not slot.finished:
+                slot.finished = True
+                slot.request.put("", finished=True)
+            self.slots[slot_index] = None
+            self._free_slots.append(slot_index)
+
+    def _fail_all(self, err: Exception):
+        for slot_index, slot in enumerate(self.slots):
+            if slot is not None and slot.request is not None:
+                slot.request.fail(err)
+            self.slots[slot_index] = None
+        self._free_slots = list(reversed(range(self.batch_size)))
+        self.state["stop_flags"][:] = True
+
+    def run(self):
+        from utils import load_real_time_tokens
+
+        while True:
+            admissions = self._next_admissions() if self.is_master else None
+            admissions = self._broadcast(admissions)
+            if admissions is None:
+                break
+
+            try:
+                inputs = self._build_inputs(self._admit(admissions))
+                if self.config.mode == "dynamic":
+                    # the tokens of every step are delivered to the requests right after they are generated
+                    streamer = _CallbackStreamer(self._deliver if self.is_master else None)
+                    outputs = self.predictor._infer(inputs, streamer=streamer)
+                else:
+                    outputs = self.predictor._infer(inputs)
+                    if self.is_master:
+                        self._deliver(load_real_time_tokens())
+            except Exception as err:
+                logger.error(f"Failed to run the inference model: {err}")
+                self._fail_all(err)
+                continue
+            self._update(outputs)
+
+
+def create_scheduler(predictor, max_queue_size: int = 1024, max_wait_time: float = 0.01) -> RequestScheduler:
+    """create the continuous batching scheduler for inference model predictors if supported"""
+    from predictor import InferencePredictorMixin
+
+    if isinstance(predictor, InferencePredictorMixin):
+        try:
+            return ContinuousBatchScheduler(predictor, max_queue_size=max_queue_size, max_wait_time=max_wait_time)
+        except ValueError as err:
+            logger.warning(f"{err} Fall back to the request-level batching.")
+    return StaticBatchScheduler(predictor, max_queue_size=max_queue_size, max_wait_time=max_wait_time)
@@ -326,29 +326,16 @@ def deserialize_from_file(fp):
     x_type = fp.read(1)
     x_type_out = struct.unpack("c", x_type)[0]
     # data
-    data_list = []
     if x_type_out == b"0":
-        data = fp.read(4)
-        data_out = struct.unpack("f", data)[0]
-        while data:
-            data_out = struct.unpack("f", data)[0]
-            data_list.append(data_out)
-            data = fp.read(4)
+        dtype = np.float32
     elif x_type_out == b"1":
-        data = fp.read(8)
-        while data:
-            data_out = struct.unpack("l", data)[0]
-            data_list.append(data_out)
-            data = fp.read(8)
+        dtype = np.int64
     elif x_type_out == b"2":
-        data = fp.read(4)
-        while data:
-            data_out = struct.unpack("i", data)[0]
-            data_list.append(data_out)
-            data = fp.read(4)
+        dtype = np.int32
     else:
         print("type error")
-    data_arr = np.array(data_list)
+        return np.array([])
+    data_arr = np.frombuffer(fp.read(), dtype=dtype)
     return data_arr
 
 
@@ -569,18 +556,20 @@ def dybatch_preprocess(
     return inputs
 
 
-def load_real_time_tokens():
+def load_real_time_tokens(file_prefix="./real_time_save.temp_ids", rank=0):
+    """load the tokens saved by the `save_with_output` op of the static inference model, and remove the files"""
     tokens = []
-    files = glob.glob(os.path.join("./real_time_save.*"))
-    for j in range(1, len(files) + 1):
-        filename = "./real_time_save.temp_ids_rank_0_step_{}".format(j)
+    step = 1
+    while True:
+        filename = "{}_rank_{}_step_{}".format(file_prefix, rank, step)
         if not os.path.exists(filename):
             break
-        fp = open(filename, "rb+")
-        fp.read(1)
-        data_list = deserialize_from_file(fp)
-        fp.close()
-        tokens.append(np.array(data_list).reshape(-1, 1))
-    os.system("rm -f ./real_time_save.temp_ids_rank_*")
+        with open(filename, "rb") as fp:
+            fp.read(1)
+            data_list = deserialize_from_file(fp)
+        tokens.append(data_list.reshape(-1, 1))
+        step += 1
+    for filename in glob.glob("{}_rank_*".format(file_prefix)):
+        os.remove(filename)
     tokens = np.concatenate(tokens, axis=1)
     return tokens
@@ -25,6 +25,7 @@ from tqdm import tqdm
 
 import paddlenlp.transformers as tfs
 from paddlenlp.data import indexed_dataset
+from paddlenlp.data.indexed_dataset_builder import ParallelMMapIndexedDatasetBuilder
 from paddlenlp.utils.log import logger
 
 try:
@@ -78,7 +79,7 @@ def get_args():
     )
     group.add_argument("--split_sentences", action="store_true", help="Split documents into sentences.")
 
-    group.add_argument("--data_impl", type=str, default="mmap", choices=["lazy", "mmap"])
+    group.add_argument("--data_impl", type=str, default="mmap", choices=["lazy", "mmap", "compressed"])
 
     group = parser.add_argument_group(title="chinese words")
     group.add_argument(
@@ -319,6 +320,20 @@ def main():
     else:
         save_dtype = np.int32
 
+    if args.data_impl == "mmap":
+        # the files are processed concurrently, and the workers write the tokens into the output file directly
+        builder = ParallelMMapIndexedDatasetBuilder(
+            args.output_prefix,
+            save_dtype,
+            convert.encode,
+            initializer=convert.initializer,
+            num_workers=args.workers,
+            log_interval=args.log_interval,
+        )
+        builder.build(file_paths, max_doc_num=args.max_doc_num)
+        print_datetime("end")
+        return
+
     pool = multiprocessing.Pool(args.workers, initializer=convert.initializer)
 
     output_ids_files = args.output_prefix + ".bin"
@@ -54,6 +54,10 @@ def main(args):
                 builder = indexed_dataset.MMapIndexedDatasetBuilder(
                     args.output_prefix + ".bin", dtype=dataset._index.dtype
                 )
+            elif isinstance(dataset, indexed_dataset.CompressedIndexedDataset):
+                builder = indexed_dataset.CompressedIndexedDatasetBuilder(
+                    args.output_prefix + ".bin", dtype=dataset.dtype
+                )
             else:
                 builder = indexed_dataset.IndexedDatasetBuilder(args.output_prefix + ".bin", dtype=dataset.dtype)
 
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from .batch_fetch_dataloader import *
 from .blendable_dataset import *
 from .causal_dataset import *
 from .collate import *
@@ -0,0 +1,78 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from functools import partial
+
+import paddle
+
+__all__ = ["BatchFetchDataLoader"]
+
+
+class _BatchFetchDataset(paddle.io.Dataset):
+    """the dataset whose item is a whole batch, which is fetched by `dataset.__getitems__(indices)`"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, indices):
+        return self.dataset.__getitems__(list(indices))
+
+
+class _BatchFetchSampler(paddle.io.BatchSampler):
+    """yield every batch of indices of `batch_sampler` as a batch of one item, which is the whole batch"""
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+
+    def __iter__(self):
+        for indices in self.batch_sampler:
+            yield [indices]
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+
+def _collate_batch(batches, collate_fn):
+    # there is only one item in `batches`, which is the list of the samples of the batch
+    return collate_fn(batches[0])
+
+
+class BatchFetchDataLoader(paddle.io.DataLoader):
+    """
+    A `paddle.io.DataLoader` which fetches every batch of the dataset with one `dataset.__getitems__(indices)` call
+    (e.g. `GPTDataset` and `BlendableDataset`) instead of loading the samples one by one. The `dataset` and the
+    `batch_sampler` are kept as the attributes of the data loader, so the sampler is set and resumed as usual.
+
+    It works the same as `paddle.io.DataLoader` if the dataset has no `__getitems__`, or `batch_sampler` or
+    `collate_fn` is not given.
+    """
+
+    def __init__(self, dataset, batch_sampler=None, collate_fn=None, **kwargs):
+        super().__init__(dataset, batch_sampler=batch_sampler, collate_fn=collate_fn, **kwargs)
+        self._batch_fetch_loader = None
+        if batch_sampler is not None and collate_fn is not None and hasattr(dataset, "__getitems__"):
+            self._batch_fetch_loader = paddle.io.DataLoader(
+                _BatchFetchDataset(dataset),
+                batch_sampler=_BatchFetchSampler(batch_sampler),
+                collate_fn=partial(_collate_batch, collate_fn=collate_fn),
+                **kwargs,
+            )
+
+    def __iter__(self):
+        if self._batch_fetch_loader is None:
+            return super().__iter__()
+        return iter(self._batch_fetch_loader)
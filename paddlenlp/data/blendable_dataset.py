@@ -13,12 +13,20 @@
 # limitations under the License.
 
 import hashlib
+import math
 import os
 import time
 
 import numpy as np
 import paddle
 
+from paddlenlp.data.index_cache import (
+    index_cache_lock,
+    is_index_cache_complete,
+    save_npy_atomic,
+    write_text_atomic,
+)
+
 local_rank = int(os.getenv("PADDLE_RANK_IN_NODE", 0))
 
 
@@ -27,6 +35,29 @@ def print_rank_0(*args, **kwargs):
         print(*args, **kwargs)
 
 
+def _build_blending_indices(dataset_index, dataset_sample_index, weights, num_datasets, size):
+    """
+    NumPy version of `build_blending_indices` of `tool_helpers`, used when the C++ helper is not installed.
+
+    The k-th sample of the dataset i is due at the position k / weights[i], and the samples of all the datasets are
+    blended in the order of their due positions, so that the datasets are sampled by their weights at every position
+    of the blended dataset. The ties are broken by the order of the datasets.
+    """
+    due_positions, dataset_ids, sample_ids = [], [], []
+    for i in range(num_datasets):
+        if weights[i] <= 0:
+            continue
+        num_samples = min(int(math.ceil(weights[i] * size)) + 1, size)
+        sample_ids.append(np.arange(num_samples, dtype=np.int64))
+        due_positions.append(sample_ids[-1] / weights[i])
+        dataset_ids.append(np.full(num_samples, i, dtype=dataset_index.dtype))
+    due_positions = np.concatenate(due_positions)
+    dataset_ids = np.concatenate(dataset_ids)
+    order = np.lexsort((dataset_ids, due_positions))[:size]
+    dataset_index[:] = dataset_ids[order]
+    dataset_sample_index[:] = np.concatenate(sample_ids)[order]
+
+
 class BlendableDataset(paddle.io.Dataset):
     def __init__(self, datasets, weights, size, *, data_cache_path=None):
 
@@ -49,17 +80,20 @@ class BlendableDataset(paddle.io.Dataset):
             dataset_index = np.zeros(self.size, dtype=np.uint8)
             dataset_sample_index = np.zeros(self.size, dtype=np.int64)
 
-            from tool_helpers import helpers
-
-            helpers.build_blending_indices(
-                dataset_index,
-                dataset_sample_index,
-                weights,
-                num_datasets,
-                self.size,
-                local_rank == 0,
-                #    paddle.distributed.get_rank() == 0,
-            )
+            try:
+                from tool_helpers import helpers
+            except ImportError:
+                _build_blending_indices(dataset_index, dataset_sample_index, weights, num_datasets, self.size)
+            else:
+                helpers.build_blending_indices(
+                    dataset_index,
+                    dataset_sample_index,
+                    weights,
+                    num_datasets,
+                    self.size,
+                    local_rank == 0,
+                    #    paddle.distributed.get_rank() == 0,
+                )
             print_rank_0(
                 "> elapsed time for building blendable dataset indices: "
                 "{:.2f} (sec)".format(time.time() - start_time)
@@ -79,22 +113,25 @@ class BlendableDataset(paddle.io.Dataset):
             desc_path = os.path.join(data_cache_path, desc_hash + ".dsc")
             index_path = os.path.join(data_cache_path, desc_hash + "_index.npy")
             sample_index_path = os.path.join(data_cache_path, desc_hash + "_sample_index.npy")
-            cache_hit = os.path.isfile(index_path) and os.path.isfile(sample_index_path)
+            cache_hit = is_index_cache_complete(desc_path, index_path, sample_index_path)
             # cache_success = True
-            # if paddle.distributed.get_rank() == 0 and not cache_hit:
-            if local_rank == 0 and not cache_hit:
-                print(
-                    " > WARNING: could not find index map files for blendable"
-                    " dataset, building indices on rank 0 ...",
-                    flush=True,
-                )
-                dataset_index, dataset_sample_index = _build_indices()
+            # The rank which holds the lock builds the indices, the other ranks wait for the lock and then find them
+            # complete.
+            if not cache_hit:
                 try:
                     os.makedirs(os.path.dirname(index_path), exist_ok=True)
-                    with open(desc_path, "wt") as fd:
-                        fd.write(desc)
-                        np.save(index_path, dataset_index, allow_pickle=True)
-                        np.save(sample_index_path, dataset_sample_index, allow_pickle=True)
+                    with index_cache_lock(desc_path):
+                        if not is_index_cache_complete(desc_path, index_path, sample_index_path):
+                            print(
+                                " > WARNING: could not find index map files for blendable dataset,"
+                                f" building indices on rank {paddle.distributed.get_rank()} ...",
+                                flush=True,
+                            )
+                            dataset_index, dataset_sample_index = _build_indices()
+                            save_npy_atomic(index_path, dataset_index)
+                            save_npy_atomic(sample_index_path, dataset_sample_index)
+                            # The description is written last, it marks the indices complete.
+                            write_text_atomic(desc_path, desc)
                 except OSError:
                     print(f"There was an error trying to create the data cache directory ({data_cache_path})")
                     print("or a file in it. This is set with the --data-cache-path argument. Please")
@@ -114,10 +151,6 @@ class BlendableDataset(paddle.io.Dataset):
             #     print_rank_0("Data index creation unsuccessful, exiting.")
             #     exit()
 
-            if paddle.distributed.get_world_size() > 1:
-                if paddle.in_dynamic_mode():
-                    paddle.distributed.barrier()
-
             # paddle.distributed.barrier()
             # Load on all ranks.
             print_rank_0(f"> loading blendable dataset index: {index_path}")
@@ -149,3 +182,24 @@ class BlendableDataset(paddle.io.Dataset):
             "dataset_idx": dataset_idx,
             **self.datasets[dataset_idx][sample_idx],
         }
+
+    def __getitems__(self, indices):
+        """
+        Fetch a batch of samples. The samples are grouped by the dataset, and every dataset fetches its samples with
+        `__getitems__` if it supports the batch fetch.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        dataset_index = self.dataset_index[indices]
+        dataset_sample_index = self.dataset_sample_index[indices]
+        samples = [None] * len(indices)
+        for dataset_idx in np.unique(dataset_index).tolist():
+            rows = np.nonzero(dataset_index == dataset_idx)[0].tolist()
+            dataset = self.datasets[dataset_idx]
+            sample_indices = dataset_sample_index[rows].tolist()
+            if hasattr(dataset, "__getitems__"):
+                dataset_samples = dataset.__getitems__(sample_indices)
+            else:
+                dataset_samples = [dataset[sample_idx] for sample_idx in sample_indices]
+            for row, sample in zip(rows, dataset_samples):
+                samples[row] = {"dataset_idx": dataset_index[row], **sample}
+        return samples
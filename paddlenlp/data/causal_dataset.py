@@ -5,11 +5,18 @@ import hashlib
 import math
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import paddle
 
 from paddlenlp.data.blendable_dataset import BlendableDataset
+from paddlenlp.data.index_cache import (
+    index_cache_lock,
+    is_index_cache_complete,
+    save_npy_atomic,
+    write_text_atomic,
+)
 from paddlenlp.data.indexed_dataset import make_dataset as make_indexed_dataset
 
 local_rank = int(os.getenv("PADDLE_RANK_IN_NODE", 0))
@@ -354,6 +361,61 @@ class GPTDataset(paddle.io.Dataset):
         else:
             return {"text": np.array(sample, dtype=np.int64)}
 
+    def __getitems__(self, indices):
+        """
+        Fetch a batch of samples, the same as `[self[idx] for idx in indices]`. The sample-idx entries of the whole
+        batch are gathered at once, and the tokens of every sample are written into the rows of one preallocated int64
+        array.
+        """
+        if len(indices) == 0:
+            return []
+        # Get the shuffled index.
+        idx = self.shuffle_idx[np.asarray(indices, dtype=np.int64)]
+        # Start and end documents and offsets.
+        starts, ends = self.sample_idx[idx], self.sample_idx[idx + 1]
+        doc_index_f, offset_f = starts[:, 0].tolist(), starts[:, 1].tolist()
+        doc_index_l, offset_l = ends[:, 0].tolist(), ends[:, 1].tolist()
+
+        # The spans (row, position in doc-idx, offset, length) of the samples, the length is -1 for the rest of the
+        # document.
+        rows, positions, offsets, lengths = [], [], [], []
+        for row in range(len(idx)):
+            if doc_index_f[row] == doc_index_l[row]:
+                # If we are within the same document, just extract the chunk.
+                rows.append(row)
+                positions.append(doc_index_f[row])
+                offsets.append(offset_f[row])
+                lengths.append(offset_l[row] - offset_f[row] + 1)
+            else:
+                # Otherwise, get the rest of the initial document, all the in between documents and the relevant
+                # portion of last document.
+                num_docs = doc_index_l[row] - doc_index_f[row] + 1
+                rows.extend([row] * num_docs)
+                positions.extend(range(doc_index_f[row], doc_index_l[row] + 1))
+                offsets.extend([offset_f[row]] + [0] * (num_docs - 1))
+                lengths.extend([-1] * (num_docs - 1) + [offset_l[row] + 1])
+
+        doc_ids = self.doc_idx[np.array(positions, dtype=np.int64)]
+        lengths = np.array(lengths, dtype=np.int64)
+        rest = lengths < 0
+        lengths[rest] = self.indexed_dataset.sizes[doc_ids[rest]] - np.array(offsets, dtype=np.int64)[rest]
+        sample_lengths = np.bincount(rows, weights=lengths, minlength=len(idx)).astype(np.int64)
+
+        samples = np.empty((len(idx), sample_lengths.max()), dtype=np.int64)
+        cursor = np.zeros(len(idx), dtype=np.int64)
+        for row, doc_id, offset, length in zip(rows, doc_ids.tolist(), offsets, lengths.tolist()):
+            start = cursor[row]
+            samples[row, start : start + length] = self.indexed_dataset.get(doc_id, offset=offset, length=length)
+            cursor[row] = start + length
+        # The samples are always of the same length unless the sample-idx is built by hand.
+        samples = [samples[row, : sample_lengths[row]] for row in range(len(idx))]
+
+        if self.return_doc_ids:  # for retro preprocessing
+            doc_ids = np.split(doc_ids.astype(np.int64), np.cumsum(np.bincount(rows, minlength=len(idx)))[:-1])
+            return [{"text": sample, "doc_ids": ids} for sample, ids in zip(samples, doc_ids)]
+        else:
+            return [{"text": sample} for sample in samples]
+
 
 def _build_index_mappings(
     name, data_prefix, documents, sizes, splits_string, num_samples, seq_length, seed, *, data_cache_path
@@ -408,118 +470,27 @@ def _build_index_mappings(
             break
     data_cache_dir = os.path.dirname(idx_path["desc"])
     # data_cache_success = True
-    # Build the indexed mapping if not exist.
-    if data_cache_path is not None:
-        check_rank_flag = build_indices and local_rank == 0
-    else:
-        check_rank_flag = build_indices and paddle.distributed.get_rank() == 0
-    # if build_indices and paddle.distributed.get_rank() == 0:
-    if check_rank_flag:
-        print_rank_0(" > WARNING: could not find index map files, building " "the indices on rank 0 ...")
-
-        # For the last epoch, decide whether include the entire epoch
-        # in the global shuffle or not.
-
-        # If we need only one epoch, then separating last epoch  does
-        # not mean anything.
-        if num_epochs == 1:
-            separate_last_epoch = False
-            print(" > only one epoch required, setting " "separate_last_epoch to False", flush=True)
-
-        else:
-            # Get the number of samples for the last epoch
-            num_samples_from_epochs_minus_one = ((num_epochs - 1) * tokens_per_epoch - 1) // seq_length
-            last_epoch_num_samples = num_samples - num_samples_from_epochs_minus_one
-            assert last_epoch_num_samples >= 0, "last epoch number of samples should be non-negative."
-            num_samples_per_epoch = (tokens_per_epoch - 1) // seq_length
-            assert last_epoch_num_samples <= (
-                num_samples_per_epoch + 1
-            ), "last epoch number of samples exceeded max value."
-            # If we have less than 80% of the samples for the last epoch,
-            # seperate out the epoch and treat it differently.
-            # Note: the 80% number is just based on common sense and can
-            # be adjusted if needed.
-            separate_last_epoch = last_epoch_num_samples < int(0.80 * num_samples_per_epoch)
-            if separate_last_epoch:
-                string = (
-                    " > last epoch number of samples ({}) is smaller "
-                    "than 80% of number of samples per epoch ({}), "
-                    "setting separate_last_epoch to True"
-                )
-            else:
-                string = (
-                    " > last epoch number of samples ({}) is larger "
-                    "than 80% of number of samples per epoch ({}), "
-                    "setting separate_last_epoch to False"
-                )
-            print(string.format(last_epoch_num_samples, num_samples_per_epoch), flush=True)
-
+    # Build the indexed mapping if not exist. The rank which holds the lock builds the index mappings, the other
+    # ranks wait for the lock and then find them complete, on the shared filesystem too.
+    build_lock = None
+    if build_indices:
         try:
             os.makedirs(data_cache_dir, exist_ok=True)
-
-            # description
-            with open(idx_path["desc"], "wt") as fd:
-                fd.write(desc)
-
-            # doc-idx.
-            start_time = time.time()
-            doc_idx = _build_doc_idx(documents, num_epochs, np_rng, separate_last_epoch)
-            np.save(idx_path["doc"], doc_idx, allow_pickle=True)
-            print_rank_0(
-                " > elasped time to build and save doc-idx mapping "
-                "(seconds): {:4f}".format(time.time() - start_time)
-            )
-            # sample-idx.
-            start_time = time.time()
-            # Use C++ implementation for speed.
-            # First compile and then import.
-            # from megatron.data import helpers
-            from tool_helpers import helpers
-
-            assert doc_idx.dtype == np.int32
-            assert sizes.dtype == np.int32
-            sample_idx = helpers.build_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch)
-            np.save(idx_path["sample"], sample_idx, allow_pickle=True)
-            print_rank_0(
-                " > elasped time to build and save sample-idx mapping "
-                "(seconds): {:4f}".format(time.time() - start_time)
-            )
-            # shuffle-idx.
-            start_time = time.time()
-            # -1 is due to data structure used to retieve the index:
-            #    sample i --> [sample_idx[i], sample_idx[i+1])
-            if separate_last_epoch:
-                num_samples_ = num_samples_from_epochs_minus_one
-            else:
-                num_samples_ = sample_idx.shape[0] - 1
-            shuffle_idx = _build_shuffle_idx(num_samples_, sample_idx.shape[0] - 1, np_rng)
-            np.save(idx_path["shuffle"], shuffle_idx, allow_pickle=True)
-            print_rank_0(
-                " > elasped time to build and save shuffle-idx mapping"
-                " (seconds): {:4f}".format(time.time() - start_time)
-            )
+            build_lock = index_cache_lock(idx_path["desc"])
+            build_lock.acquire()
         except OSError:
-            print(f"There was an error trying to create the data cache directory ({data_cache_dir})")
-            print('or a file in it. This defaults to a directory "index-cache" within the directory')
-            print("the data files are in and can be set with the --data-cache-path argument. Please")
-            print("ensure you have write access to this directory or specify one that you do have")
-            print("write access to.")
-            # data_cache_success = False
-    else:
-        while True:
-            if (
-                (not os.path.isfile(idx_path["doc"]))
-                or (not os.path.isfile(idx_path["sample"]))
-                or (not os.path.isfile(idx_path["shuffle"]))
-            ):
-                time.sleep(3)
-            else:
-                try:
-                    np.load(idx_path["shuffle"], allow_pickle=True, mmap_mode="r")
-                    break
-                except Exception:
-                    print("%s file is still writing or damaged, please wait for a moment." % idx_path["shuffle"])
-                    time.sleep(3)
+            build_lock = None
+        paths = (idx_path["doc"], idx_path["sample"], idx_path["shuffle"])
+        build_indices = not is_index_cache_complete(idx_path["desc"], *paths)
+    try:
+        if build_indices:
+            _build_index_files(
+                idx_path, desc, documents, sizes, num_samples, seq_length, num_epochs, tokens_per_epoch, np_rng
+            )
+    finally:
+        if build_lock is not None:
+            build_lock.release()
+
     # try:
     #     hcg = paddle.distributed.fleet.get_hybrid_communicate_group()
     # except:
@@ -538,6 +509,97 @@ def _build_index_mappings(
     return idx_path["doc"], idx_path["sample"], idx_path["shuffle"], desc, desc_hash, num_epochs
 
 
+def _build_index_files(
+    idx_path, desc, documents, sizes, num_samples, seq_length, num_epochs, tokens_per_epoch, np_rng
+):
+    """Build and save doc-idx, sample-idx and shuffle-idx, then the description which marks them complete."""
+    print(
+        " > WARNING: could not find index map files, building "
+        f"the indices on rank {paddle.distributed.get_rank()} ...",
+        flush=True,
+    )
+    # For the last epoch, decide whether include the entire epoch
+    # in the global shuffle or not.
+
+    # If we need only one epoch, then separating last epoch  does
+    # not mean anything.
+    if num_epochs == 1:
+        separate_last_epoch = False
+        print(" > only one epoch required, setting " "separate_last_epoch to False", flush=True)
+
+    else:
+        # Get the number of samples for the last epoch
+        num_samples_from_epochs_minus_one = ((num_epochs - 1) * tokens_per_epoch - 1) // seq_length
+        last_epoch_num_samples = num_samples - num_samples_from_epochs_minus_one
+        assert last_epoch_num_samples >= 0, "last epoch number of samples should be non-negative."
+        num_samples_per_epoch = (tokens_per_epoch - 1) // seq_length
+        assert last_epoch_num_samples <= (
+            num_samples_per_epoch + 1
+        ), "last epoch number of samples exceeded max value."
+        # If we have less than 80% of the samples for the last epoch,
+        # seperate out the epoch and treat it differently.
+        # Note: the 80% number is just based on common sense and can
+        # be adjusted if needed.
+        separate_last_epoch = last_epoch_num_samples < int(0.80 * num_samples_per_epoch)
+        if separate_last_epoch:
+            string = (
+                " > last epoch number of samples ({}) is smaller "
+                "than 80% of number of samples per epoch ({}), "
+                "setting separate_last_epoch to True"
+            )
+        else:
+            string = (
+                " > last epoch number of samples ({}) is larger "
+                "than 80% of number of samples per epoch ({}), "
+                "setting separate_last_epoch to False"
+            )
+        print(string.format(last_epoch_num_samples, num_samples_per_epoch), flush=True)
+
+    try:
+        # doc-idx.
+        start_time = time.time()
+        doc_idx = _build_doc_idx(documents, num_epochs, np_rng, separate_last_epoch)
+        save_npy_atomic(idx_path["doc"], doc_idx)
+        print_rank_0(
+            " > elasped time to build and save doc-idx mapping "
+            "(seconds): {:4f}".format(time.time() - start_time)
+        )
+        # sample-idx.
+        start_time = time.time()
+        assert doc_idx.dtype == np.int32
+        assert sizes.dtype == np.int32
+        sample_idx = _build_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch)
+        save_npy_atomic(idx_path["sample"], sample_idx)
+        print_rank_0(
+            " > elasped time to build and save sample-idx mapping "
+            "(seconds): {:4f}".format(time.time() - start_time)
+        )
+        # shuffle-idx.
+        start_time = time.time()
+        # -1 is due to data structure used to retieve the index:
+        #    sample i --> [sample_idx[i], sample_idx[i+1])
+        if separate_last_epoch:
+            num_samples_ = num_samples_from_epochs_minus_one
+        else:
+            num_samples_ = sample_idx.shape[0] - 1
+        shuffle_idx = _build_shuffle_idx(num_samples_, sample_idx.shape[0] - 1, np_rng)
+        save_npy_atomic(idx_path["shuffle"], shuffle_idx)
+        print_rank_0(
+            " > elasped time to build and save shuffle-idx mapping"
+            " (seconds): {:4f}".format(time.time() - start_time)
+        )
+        # The description is written last, it marks the index mappings complete.
+        write_text_atomic(idx_path["desc"], desc)
+    except OSError:
+        data_cache_dir = os.path.dirname(idx_path["desc"])
+        print(f"There was an error trying to create the data cache directory ({data_cache_dir})")
+        print('or a file in it. This defaults to a directory "index-cache" within the directory')
+        print("the data files are in and can be set with the --data-cache-path argument. Please")
+        print("ensure you have write access to this directory or specify one that you do have")
+        print("write access to.")
+        # data_cache_success = False
+
+
 def _num_tokens(documents, sizes):
     """Total number of tokens in the dataset."""
     return np.sum(sizes[documents])
@@ -574,50 +636,38 @@ def _build_doc_idx(documents, num_epochs, np_rng, separate_last_epoch):
     return np.concatenate((doc_idx_first, doc_idx_last))
 
 
-def _build_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch):
+def _build_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch, num_threads=None):
     """Sample index mapping is a 2D array with sizes
     [number-of-samples + 1, 2] where [..., 0] contains
     the index into `doc_idx` and [..., 1] is the
-    starting offset in that document."""
+    starting offset in that document.
+
+    Sample i starts at the token i * seq_length of the documents of `doc_idx`
+    concatenated, so every row is located with a binary search over the
+    cumulative document sizes. The rows are filled in chunks by a pool of
+    threads, `np.searchsorted` releases the GIL."""
 
     # Total number of samples. For -1 see comments in `_num_epochs`.
     num_samples = (num_epochs * tokens_per_epoch - 1) // seq_length
     sample_idx = np.zeros([num_samples + 1, 2], dtype=np.int32)
 
-    # Index into sample_idx.
-    sample_index = 0
-    # Index into doc_idx.
-    doc_idx_index = 0
-    # Begining offset for each document.
-    doc_offset = 0
-    # Start with first document and no offset.
-    sample_idx[sample_index][0] = doc_idx_index
-    sample_idx[sample_index][1] = doc_offset
-    sample_index += 1
-    while sample_index <= num_samples:
-        # Start with a fresh sequence.
-        remaining_seq_length = seq_length + 1
-        while remaining_seq_length != 0:
-            # Get the document length.
-            doc_id = doc_idx[doc_idx_index]
-            doc_length = sizes[doc_id] - doc_offset
-            # And add it to the current sequence.
-            remaining_seq_length -= doc_length
-            # If we have more than a full sequence, adjust offset and set
-            # remaining length to zero so we return from the while loop.
-            # Note that -1 here is for the same reason we have -1 in
-            # `_num_epochs` calculations.
-            if remaining_seq_length <= 0:
-                doc_offset += remaining_seq_length + doc_length - 1
-                remaining_seq_length = 0
-            else:
-                # Otherwise, start from the begining of the next document.
-                doc_idx_index += 1
-                doc_offset = 0
-        # Record the sequence.
-        sample_idx[sample_index][0] = doc_idx_index
-        sample_idx[sample_index][1] = doc_offset
-        sample_index += 1
+    # The end position of each document of `doc_idx` in the concatenated tokens.
+    doc_sizes = sizes[doc_idx].astype(np.int64)
+    doc_ends = np.cumsum(doc_sizes)
+
+    def _fill(start, stop):
+        positions = np.arange(start, stop, dtype=np.int64) * seq_length
+        # The token at the end of a document belongs to it, the empty documents are skipped.
+        doc_idx_index = np.searchsorted(doc_ends, positions, side="right")
+        sample_idx[start:stop, 0] = doc_idx_index
+        sample_idx[start:stop, 1] = positions - (doc_ends[doc_idx_index] - doc_sizes[doc_idx_index])
+
+    # Start with first document and no offset, the first row stays zero.
+    num_threads = num_threads or os.cpu_count() or 1
+    chunk_size = max(num_samples // num_threads + 1, 1 << 20)
+    with ThreadPoolExecutor(num_threads) as executor:
+        starts = range(1, num_samples + 1, chunk_size)
+        list(executor.map(lambda start: _fill(start, min(start + chunk_size, num_samples + 1)), starts))
 
     return sample_idx
 
@@ -16,6 +16,7 @@ import numpy as np
 import paddle
 from paddle.distributed import fleet
 
+from paddlenlp.data.batch_fetch_dataloader import BatchFetchDataLoader
 from paddlenlp.utils.batch_sampler import DistributedBatchSampler
 from paddlenlp.utils.log import logger
 
@@ -83,23 +84,24 @@ class DistDataLoader(paddle.io.DataLoader):
         self._data_keys, self._data_keys_size = None, None
 
         if self._need_data:
-            self._dataloader = paddle.io.DataLoader(
+            # the datasets with `__getitems__` are fetched by batch
+            self._dataloader = BatchFetchDataLoader(
                 dataset,
-                feed_list,
-                places,
-                return_list,
-                batch_sampler,
-                batch_size,
-                shuffle,
-                drop_last,
-                collate_fn,
-                num_workers,
-                use_buffer_reader,
-                prefetch_factor,
-                use_shared_memory,
-                timeout,
-                worker_init_fn,
-                persistent_workers,
+                feed_list=feed_list,
+                places=places,
+                return_list=return_list,
+                batch_sampler=batch_sampler,
+                batch_size=batch_size,
+                shuffle=shuffle,
+                drop_last=drop_last,
+                collate_fn=collate_fn,
+                num_workers=num_workers,
+                use_buffer_reader=use_buffer_reader,
+                prefetch_factor=prefetch_factor,
+                use_shared_memory=use_shared_memory,
+                timeout=timeout,
+                worker_init_fn=worker_init_fn,
+                persistent_workers=persistent_workers,
             )
 
             self._lazy_dataloader_iter = None
@@ -0,0 +1,58 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Helpers to build the cached index mappings of the pretraining datasets once across the ranks."""
+
+import os
+
+import numpy as np
+from filelock import FileLock
+
+__all__ = ["index_cache_lock", "is_index_cache_complete", "save_npy_atomic", "write_text_atomic"]
+
+
+def index_cache_lock(desc_path):
+    """
+    The file lock of the index mappings described by `desc_path`. The rank which holds the lock builds the missing
+    index mappings, the other ranks wait for the lock instead of polling the files.
+    """
+    return FileLock(desc_path + ".lock")
+
+
+def is_index_cache_complete(desc_path, *paths):
+    """The description file is written after all the index mappings, so it marks the index mappings complete."""
+    return all(os.path.isfile(path) for path in (*paths, desc_path))
+
+
+def _replace_atomic(path, write_fn, mode):
+    # the temporary file is in the same directory, so the rename is atomic on the shared filesystem too
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, mode) as f:
+            write_fn(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_npy_atomic(path, array):
+    """`np.save` the array to a temporary file and rename it, so a partially written file is never loaded."""
+    _replace_atomic(path, lambda f: np.save(f, array, allow_pickle=True), "wb")
+
+
+def write_text_atomic(path, text):
+    _replace_atomic(path, lambda f: f.write(text), "wt")
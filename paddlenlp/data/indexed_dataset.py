@@ -29,12 +29,16 @@ import os
 import shutil
 import struct
 import time
+import zlib
+from collections import OrderedDict
 from functools import lru_cache
 from itertools import accumulate
 
 import numpy as np
 import paddle
 
+from ..utils.import_utils import is_package_available
+
 
 def print_rank_0(*args, **kwargs):
     if paddle.distributed.get_rank() == 0:
@@ -49,7 +53,7 @@ def __best_fitting_dtype(vocab_size=None):
 
 
 def get_available_dataset_impl():
-    return ["lazy", "mmap"]
+    return ["lazy", "mmap", "compressed"]
 
 
 def make_dataset(path, impl, skip_warmup=False):
@@ -64,6 +68,8 @@ def make_dataset(path, impl, skip_warmup=False):
         return IndexedDataset(path)
     elif impl == "mmap" and MMapIndexedDataset.exists(path):
         return MMapIndexedDataset(path, skip_warmup)
+    elif impl == "compressed" and CompressedIndexedDataset.exists(path):
+        return CompressedIndexedDataset(path, skip_warmup)
     print(f"Unknown dataset implementation: {impl}")
     return None
 
@@ -71,6 +77,8 @@ def make_dataset(path, impl, skip_warmup=False):
 def dataset_exists(path, impl):
     if impl == "mmap":
         return MMapIndexedDataset.exists(path)
+    elif impl == "compressed":
+        return CompressedIndexedDataset.exists(path)
     else:
         return IndexedDataset.exists(path)
 
@@ -355,8 +363,10 @@ class MMapIndexedDataset(paddle.io.Dataset):
 
                     return pointers
 
-                def write(self, sizes, doc_idx):
-                    pointers = self._get_pointers(sizes)
+                def write(self, sizes, doc_idx, pointers=None):
+                    # the pointers are given when the items are not stored in order in the data file
+                    if pointers is None:
+                        pointers = self._get_pointers(sizes)
 
                     self._file.write(struct.pack("<Q", len(sizes)))
                     self._file.write(struct.pack("<Q", len(doc_idx)))
@@ -431,6 +441,10 @@ class MMapIndexedDataset(paddle.io.Dataset):
         def doc_idx(self):
             return self._doc_idx
 
+        @property
+        def pointers(self):
+            return self._pointers
+
         @lru_cache(maxsize=8)
         def __getitem__(self, i):
             return self._pointers[i], self._sizes[i]
@@ -491,6 +505,10 @@ class MMapIndexedDataset(paddle.io.Dataset):
             sizes = self._index._sizes[idx]
             offsets = list(accumulate(sizes))
             total_size = sum(sizes)
+            contiguous_size = (total_size - sizes[-1]) * self._index._dtype_size if stop > start else 0
+            if stop > start and self._index._pointers[stop - 1] - ptr != contiguous_size:
+                # the items are not contiguous in the data file, e.g. the file written by multiple workers
+                return [self[i] for i in range(start, stop)]
             np_array = np.frombuffer(self._bin_buffer, dtype=self._index.dtype, count=total_size, offset=ptr)
             sents = np.split(np_array, offsets[:-1])
             return sents
@@ -536,6 +554,8 @@ class MMapIndexedDataset(paddle.io.Dataset):
 def make_builder(out_file, impl, save_dtype):
     if impl == "mmap":
         return MMapIndexedDatasetBuilder(out_file, dtype=save_dtype)
+    elif impl == "compressed":
+        return CompressedIndexedDatasetBuilder(out_file, dtype=save_dtype)
     else:
         return IndexedDatasetBuilder(out_file, dtype=save_dtype)
 
@@ -545,17 +565,26 @@ class MMapIndexedDatasetBuilder(object):
         self._data_file = open(out_file, "wb")
         self._dtype = dtype
         self._sizes = []
+        # the items of the merged files are not necessarily stored in order, so the pointers are kept explicitly
+        self._pointers = []
+        self._data_size = 0
         self._doc_idx = [0]
 
+    def _write(self, np_array, sizes):
+        itemsize = np.dtype(self._dtype).itemsize
+        for size in sizes:
+            self._pointers.append(self._data_size)
+            self._data_size += size * itemsize
+        self._data_file.write(np_array.tobytes(order="C"))
+        self._sizes.extend(sizes)
+
     def add_item(self, tensor):
         tensor = np.array(tensor, dtype=self._dtype)
-        self._data_file.write(tensor.tobytes(order="C"))
-        self._sizes.append(tensor.size)
+        self._write(tensor, [tensor.size])
 
     def add_doc(self, tensor, sizes):
         np_array = np.array(tensor, dtype=self._dtype)
-        self._data_file.write(np_array.tobytes(order="C"))
-        self._sizes.extend(sizes)
+        self._write(np_array, sizes)
         self._doc_idx.append(len(self._sizes))
 
     def end_document(self):
@@ -569,23 +598,302 @@ class MMapIndexedDatasetBuilder(object):
         offset = len(self._sizes)
         self._sizes.extend(index.sizes)
         self._doc_idx.extend((offset + index.doc_idx)[1:])
+        # the data of the other file may be out of index order or contain unindexed tokens, keep its pointers
+        self._pointers.extend(index.pointers + self._data_size)
 
         # Concatenate data
         with open(data_file_path(another_file), "rb") as f:
             shutil.copyfileobj(f, self._data_file)
+        self._data_size += os.path.getsize(data_file_path(another_file))
 
     def finalize(self, index_file):
         self._data_file.close()
 
         with MMapIndexedDataset.Index.writer(index_file, self._dtype) as index:
-            index.write(self._sizes, self._doc_idx)
+            index.write(self._sizes, self._doc_idx, pointers=self._pointers)
+        print("Total sentences num: %d" % len(self._sizes))
+        print("Total documents num: %d" % (len(self._doc_idx) - 1))
+        print("Total tokens num: %d" % sum(self._sizes))
+        print("Average tokens per sentence: %.2f" % (sum(self._sizes) / len(self._sizes)))
+        print("Average tokens per document: %.2f" % (sum(self._sizes) / (len(self._doc_idx) - 1)))
+
+
+compression_codecs = {
+    1: "zlib",
+    2: "zstd",
+}
+
+
+def default_compression_codec():
+    return "zstd" if is_package_available("zstandard") else "zlib"
+
+
+def compress_block(data, codec):
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress_block(data, codec):
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class CompressedIndexedDataset(paddle.io.Dataset):
+    """
+    Loader of the indexed dataset whose tokens are stored in independently compressed blocks.
+
+    The tokens of all the items are concatenated and split into blocks of `block_size` tokens, and every block is
+    compressed with zstd (or zlib when zstandard is not installed). `get` only decompresses the blocks which hold the
+    requested tokens, and the recently decoded blocks are kept in a LRU cache, which is built per worker process.
+
+    Args:
+        path (str): The prefix of the `.bin` and `.idx` files.
+        skip_warmup (bool, optional): Whether to skip reading the files into the page cache.
+        cache_size (int, optional): The max number of decoded blocks in the cache.
+    """
+
+    _HDR_MAGIC = b"CMPIDX\x00\x00"
+
+    def __init__(self, path, skip_warmup=False, cache_size=16):
+        super().__init__()
+        self._cache_size = cache_size
+        self._do_init(path, skip_warmup)
+
+    def __getstate__(self):
+        return self._path, self._cache_size
+
+    def __setstate__(self, state):
+        self._path, self._cache_size = state
+        self._do_init(self._path, skip_warmup=True)
+
+    def _do_init(self, path, skip_warmup):
+        self._path = path
+        if not self.exists(path):
+            raise ValueError("Missing file, %s" % (path))
+
+        with open(index_file_path(path), "rb") as stream:
+            magic = stream.read(8)
+            assert magic == self._HDR_MAGIC, (
+                "Index file doesn't match expected format. " "Make sure that --dataset-impl is configured properly."
+            )
+            version = struct.unpack("<Q", stream.read(8))
+            assert (1,) == version
+            dtype_code, codec_code = struct.unpack("<BB", stream.read(2))
+            self._dtype = dtypes[dtype_code]
+            self._codec = compression_codecs[codec_code]
+            self._block_size, self._len, self._doc_count, self._num_blocks = struct.unpack("<QQQQ", stream.read(32))
+            offset = stream.tell()
+
+        if not skip_warmup:
+            print_rank_0("    warming up index and data files...")
+            _warmup_mmap_file(index_file_path(path))
+            _warmup_mmap_file(data_file_path(path))
+
+        self._index_buffer_mmap = np.memmap(index_file_path(path), mode="r", order="C")
+        buffer = memoryview(self._index_buffer_mmap)
+        self._sizes = np.frombuffer(buffer, dtype=np.int32, count=self._len, offset=offset)
+        offset += self._sizes.nbytes
+        # the offset of the first token of every item in the concatenated tokens
+        self._pointers = np.frombuffer(buffer, dtype=np.int64, count=self._len, offset=offset)
+        offset += self._pointers.nbytes
+        self._doc_idx = np.frombuffer(buffer, dtype=np.int64, count=self._doc_count, offset=offset)
+        offset += self._doc_idx.nbytes
+        self._block_offsets = np.frombuffer(buffer, dtype=np.int64, count=self._num_blocks + 1, offset=offset)
+
+        self._bin_buffer_mmap = np.memmap(data_file_path(path), mode="r", order="C")
+        self._bin_buffer = memoryview(self._bin_buffer_mmap)
+        self._cache = OrderedDict()
+
+    def __del__(self):
+        if hasattr(self, "_bin_buffer_mmap"):
+            self._bin_buffer_mmap._mmap.close()
+            self._index_buffer_mmap._mmap.close()
+
+    def __len__(self):
+        return self._len
+
+    def _get_block(self, block_id):
+        block = self._cache.get(block_id, None)
+        if block is not None:
+            self._cache.move_to_end(block_id)
+            return block
+
+        start, end = self._block_offsets[block_id], self._block_offsets[block_id + 1]
+        block = np.frombuffer(decompress_block(self._bin_buffer[start:end], self._codec), dtype=self._dtype)
+        self._cache[block_id] = block
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return block
+
+    def _read(self, start, length):
+        """read `length` tokens from the `start` of the concatenated tokens"""
+        if length <= 0:
+            return np.empty(0, dtype=self._dtype)
+        first_block, last_block = start // self._block_size, (start + length - 1) // self._block_size
+        if first_block == last_block:
+            data = self._get_block(first_block)
+        else:
+            data = np.concatenate([self._get_block(i) for i in range(first_block, last_block + 1)])
+        begin = start - first_block * self._block_size
+        return data[begin : begin + length]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self._read(self._pointers[idx], self._sizes[idx])
+        elif isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                raise ValueError("Slices into indexed_dataset must be contiguous")
+            sizes = self._sizes[idx]
+            offsets = list(accumulate(sizes))
+            np_array = self._read(self._pointers[start], sum(sizes)) if stop > start else np.empty(0, self._dtype)
+            sents = np.split(np_array, offsets[:-1])
+            return sents
+        else:
+            raise TypeError("Unexpected type received for idx: {}".format(type(idx)))
+
+    def get(self, idx, offset=0, length=None):
+        """Retrieves a single item from the dataset with the option to only
+        return a portion of the item.
+
+        get(idx) is the same as [idx] but get() does not support slicing.
+        """
+        size = self._sizes[idx]
+        if length is None:
+            length = size - offset
+        return self._read(self._pointers[idx] + offset, length)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+    @property
+    def doc_idx(self):
+        return self._doc_idx
+
+    def get_doc_idx(self):
+        return self._doc_idx
+
+    def set_doc_idx(self, doc_idx_):
+        self._doc_idx = doc_idx_
+
+    @property
+    def supports_prefetch(self):
+        return False
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(index_file_path(path)) and os.path.exists(data_file_path(path))
+
+
+class CompressedIndexedDatasetBuilder(object):
+    def __init__(self, out_file, dtype, block_size=65536, codec=None):
+        self._data_file = open(out_file, "wb")
+        self._dtype = dtype
+        self._block_size = block_size
+        self._codec = codec if codec is not None else default_compression_codec()
+        self._sizes = []
+        self._doc_idx = [0]
+        self._block_offsets = [0]
+        # the tokens which are not written yet, which are less than one block after every `_append`
+        self._buffer = []
+        self._buffer_size = 0
+
+    def _write_block(self, block):
+        data = compress_block(block.tobytes(order="C"), self._codec)
+        self._data_file.write(data)
+        self._block_offsets.append(self._block_offsets[-1] + len(data))
+
+    def _flush(self, final=False):
+        data = np.concatenate(self._buffer) if len(self._buffer) > 1 else self._buffer[0]
+        num_blocks = data.size // self._block_size
+        for i in range(num_blocks):
+            self._write_block(data[i * self._block_size : (i + 1) * self._block_size])
+        rest = data[num_blocks * self._block_size :]
+        if final and rest.size > 0:
+            self._write_block(rest)
+            rest = rest[:0]
+        self._buffer = [rest] if rest.size > 0 else []
+        self._buffer_size = rest.size
+
+    def _append(self, np_array):
+        self._buffer.append(np_array.reshape(-1))
+        self._buffer_size += np_array.size
+        if self._buffer_size >= self._block_size:
+            self._flush()
+
+    def add_item(self, tensor):
+        np_array = np.array(tensor, dtype=self._dtype)
+        self._append(np_array)
+        self._sizes.append(np_array.size)
+
+    def add_doc(self, tensor, sizes):
+        np_array = np.array(tensor, dtype=self._dtype)
+        self._append(np_array)
+        self._sizes.extend(sizes)
+        self._doc_idx.append(len(self._sizes))
+
+    def end_document(self):
+        self._doc_idx.append(len(self._sizes))
+
+    def merge_file_(self, another_file):
+        # the blocks are decompressed and appended, since they are not aligned with the blocks of this file
+        dataset = CompressedIndexedDataset(another_file, skip_warmup=True)
+        assert dataset.dtype == self._dtype
+
+        offset = len(self._sizes)
+        self._sizes.extend(dataset.sizes)
+        self._doc_idx.extend((offset + dataset.doc_idx)[1:])
+        for block_id in range(len(dataset._block_offsets) - 1):
+            self._append(dataset._get_block(block_id))
+        del dataset
+
+    def finalize(self, index_file):
+        if self._buffer_size > 0:
+            self._flush(final=True)
+        self._data_file.close()
+
+        sizes = np.array(self._sizes, dtype=np.int32)
+        pointers = np.zeros(len(sizes), dtype=np.int64)
+        if len(sizes) > 1:
+            np.cumsum(sizes[:-1], out=pointers[1:])
+        with open(index_file, "wb") as index:
+            index.write(CompressedIndexedDataset._HDR_MAGIC)
+            index.write(struct.pack("<Q", 1))
+            index.write(struct.pack("<BB", code(self._dtype), code_of_codec(self._codec)))
+            index.write(
+                struct.pack("<QQQQ", self._block_size, len(sizes), len(self._doc_idx), len(self._block_offsets) - 1)
+            )
+            index.write(sizes.tobytes(order="C"))
+            index.write(pointers.tobytes(order="C"))
+            index.write(np.array(self._doc_idx, dtype=np.int64).tobytes(order="C"))
+            index.write(np.array(self._block_offsets, dtype=np.int64).tobytes(order="C"))
+
         print("Total sentences num: %d" % len(self._sizes))
         print("Total documents num: %d" % (len(self._doc_idx) - 1))
         print("Total tokens num: %d" % sum(self._sizes))
+        print("Total compressed bytes: %d" % self._block_offsets[-1])
         print("Average tokens per sentence: %.2f" % (sum(self._sizes) / len(self._sizes)))
         print("Average tokens per document: %.2f" % (sum(self._sizes) / (len(self._doc_idx) - 1)))
 
 
+def code_of_codec(codec):
+    for k in compression_codecs.keys():
+        if compression_codecs[k] == codec:
+            return k
+    raise ValueError(codec)
+
+
 def get_indexed_dataset_(data_prefix, data_impl, skip_warmup):
 
     print_rank_0(" > building dataset index ...")
@@ -0,0 +1,224 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from .indexed_dataset import MMapIndexedDataset, data_file_path, index_file_path
+
+__all__ = ["ParallelMMapIndexedDatasetBuilder"]
+
+# the state of the worker process, which is set by `_init_worker`
+_worker = {}
+
+
+def _init_worker(data_file, offset_counter, dtype, encode_fn, initializer, write_buffer_tokens):
+    _worker.update(
+        fd=os.open(data_file, os.O_WRONLY),
+        offset_counter=offset_counter,
+        dtype=dtype,
+        encode_fn=encode_fn,
+        write_buffer_tokens=write_buffer_tokens,
+    )
+    if initializer is not None:
+        initializer()
+
+
+def _split_file(path, chunk_bytes):
+    """split the file into the byte ranges processed by the workers, a compressed file is processed as a whole"""
+    if path.endswith(".zst"):
+        return [(path, 0, None)]
+    if not path.endswith(".jsonl"):
+        print("Unexpected data format, skiped %s" % path)
+        return []
+    file_size = os.path.getsize(path)
+    return [(path, start, min(start + chunk_bytes, file_size)) for start in range(0, file_size, chunk_bytes)]
+
+
+def _read_lines(path, start, end):
+    """read the lines which start in `[start, end)`, or all the lines of the file if `end` is None"""
+    if end is None:
+        import zstandard
+
+        with open(path, "rb") as f:
+            yield from io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f))
+        return
+
+    with open(path, "rb") as f:
+        if start > 0:
+            # the line which crosses `start` belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
+
+
+def _write_sentences(sentences):
+    """write the sentences with one `pwrite` at the reserved offset of the data file, and return their pointers"""
+    dtype = _worker["dtype"]
+    sizes = np.array([len(sentence) for sentence in sentences], dtype=np.int64)
+    data = np.fromiter(itertools.chain.from_iterable(sentences), dtype=dtype, count=int(sizes.sum())).tobytes()
+
+    offset_counter = _worker["offset_counter"]
+    with offset_counter.get_lock():
+        offset = offset_counter.value
+        offset_counter.value += len(data)
+
+    view = memoryview(data)
+    written = 0
+    while written < len(data):
+        written += os.pwrite(_worker["fd"], view[written:], offset + written)
+
+    pointers = np.empty(len(sentences), dtype=np.int64)
+    pointers[0] = offset
+    np.cumsum(sizes[:-1] * np.dtype(dtype).itemsize, out=pointers[1:])
+    pointers[1:] += offset
+    return pointers
+
+
+def _process_range(task):
+    path, start, end = task
+    encode_fn, write_buffer_tokens = _worker["encode_fn"], _worker["write_buffer_tokens"]
+    sizes, pointers, doc_lens = [], [], []
+    buffer, buffer_tokens = [], 0
+    num_docs, num_bytes = 0, 0
+    for line in _read_lines(path, start, end):
+        doc, bytes_processed = encode_fn(line)
+        num_docs += 1
+        num_bytes += bytes_processed
+        doc = [sentence for sentence in doc if len(sentence) > 0]
+        # the empty documents are counted, but not indexed
+        doc_lens.append(len(doc))
+        if len(doc) == 0:
+            continue
+
+        buffer.extend(doc)
+        buffer_tokens += sum(len(sentence) for sentence in doc)
+        sizes.extend(len(sentence) for sentence in doc)
+        # the documents are written as a whole, so the sentences of a document are contiguous in the data file
+        if buffer_tokens >= write_buffer_tokens:
+            pointers.append(_write_sentences(buffer))
+            buffer, buffer_tokens = [], 0
+    if len(buffer) > 0:
+        pointers.append(_write_sentences(buffer))
+
+    pointers = np.concatenate(pointers) if len(pointers) > 0 else np.empty(0, dtype=np.int64)
+    return np.array(sizes, dtype=np.int32), pointers, np.array(doc_lens, dtype=np.int64), num_docs, num_bytes
+
+
+class ParallelMMapIndexedDatasetBuilder(object):
+    """
+    Build the mmap indexed dataset of the json lines files with a pool of worker processes.
+
+    The files are split into byte ranges (the `.zst` files are processed as a whole), and the ranges of all the files
+    are processed concurrently. Every worker tokenizes its range and writes the tokens with batched `pwrite` calls
+    into its own reserved regions of the data file, so the tokens are written once and never copied by the parent or
+    by a merge step. The parent only collects the sizes and pointers of the sentences and writes the index, in which
+    the documents keep the order of the input files.
+
+    Args:
+        output_prefix (str): The prefix of the `.bin` and `.idx` files.
+        dtype (numpy.dtype): The dtype of the token ids.
+        encode_fn (Callable): Called in the workers as `encode_fn(line)`, which returns the token ids of the sentences
+            of the document and the number of bytes of the text.
+        initializer (Callable, optional): Called once in every worker before processing, e.g. to load the tokenizer.
+        num_workers (int, optional): The number of worker processes.
+        chunk_bytes (int, optional): The number of bytes of the input file processed by one task.
+        write_buffer_tokens (int, optional): The number of tokens buffered by a worker before writing them.
+        log_interval (int, optional): The interval of documents to log the progress.
+    """
+
+    def __init__(
+        self,
+        output_prefix,
+        dtype,
+        encode_fn,
+        initializer=None,
+        num_workers=1,
+        chunk_bytes=64 * 1024 * 1024,
+        write_buffer_tokens=1024 * 1024,
+        log_interval=100,
+    ):
+        self.output_prefix = output_prefix
+        self.dtype = dtype
+        self.encode_fn = encode_fn
+        self.initializer = initializer
+        self.num_workers = num_workers
+        self.chunk_bytes = chunk_bytes
+        self.write_buffer_tokens = write_buffer_tokens
+        self.log_interval = log_interval
+
+    def build(self, file_paths, max_doc_num=sys.maxsize):
+        data_file = data_file_path(self.output_prefix)
+        # create or truncate the data file, the workers write into it at the reserved offsets
+        open(data_file, "wb").close()
+        offset_counter = multiprocessing.Value("q", 0)
+
+        tasks = [task for path in sorted(file_paths) for task in _split_file(path, self.chunk_bytes)]
+        initargs = (data_file, offset_counter, self.dtype, self.encode_fn, self.initializer, self.write_buffer_tokens)
+
+        all_sizes, all_pointers, all_doc_lens = [], [], []
+        step, total_bytes_processed, next_log = 0, 0, self.log_interval
+        start_time = time.time()
+        with multiprocessing.Pool(self.num_workers, initializer=_init_worker, initargs=initargs) as pool:
+            for sizes, pointers, doc_lens, num_docs, num_bytes in pool.imap(_process_range, tasks):
+                if num_docs > max_doc_num - step:
+                    # drop the documents beyond `max_doc_num`, their tokens are written but not indexed
+                    num_docs = max_doc_num - step
+                    doc_lens = doc_lens[:num_docs]
+                    num_sentences = int(doc_lens.sum())
+                    sizes, pointers = sizes[:num_sentences], pointers[:num_sentences]
+                all_sizes.append(sizes)
+                all_pointers.append(pointers)
+                all_doc_lens.append(doc_lens[doc_lens > 0])
+
+                step += num_docs
+                total_bytes_processed += num_bytes
+                if step >= next_log:
+                    next_log = (step // self.log_interval + 1) * self.log_interval
+                    elapsed = time.time() - start_time
+                    mbs = total_bytes_processed / elapsed / 1024 / 1024
+                    print(
+                        f"Processed {step} documents", f"({step/elapsed:.2f} docs/s, {mbs:.4f} MB/s).", file=sys.stderr
+                    )
+                if step >= max_doc_num:
+                    break
+
+        sizes = np.concatenate(all_sizes) if all_sizes else np.empty(0, dtype=np.int32)
+        pointers = np.concatenate(all_pointers) if all_pointers else np.empty(0, dtype=np.int64)
+        doc_idx = np.zeros(sum(len(doc_lens) for doc_lens in all_doc_lens) + 1, dtype=np.int64)
+        if len(doc_idx) > 1:
+            np.cumsum(np.concatenate(all_doc_lens), out=doc_idx[1:])
+
+        with MMapIndexedDataset.Index.writer(index_file_path(self.output_prefix), self.dtype) as index:
+            index.write(sizes, doc_idx, pointers=pointers)
+
+        num_tokens = int(sizes.sum())
+        print("Total sentences num: %d" % len(sizes))
+        print("Total documents num: %d" % (len(doc_idx) - 1))
+        print("Total tokens num: %d" % num_tokens)
+        if len(sizes) > 0:
+            print("Average tokens per sentence: %.2f" % (num_tokens / len(sizes)))
+            print("Average tokens per document: %.2f" % (num_tokens / (len(doc_idx) - 1)))
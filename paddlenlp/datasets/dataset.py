@@ -13,14 +13,19 @@
 # limitations under the License.
 
 import atexit
+import glob
 import inspect
 import os
+import shutil
 import time
 import warnings
 from collections import namedtuple
 from itertools import islice
 
 import datasets
+import numpy as np
+from datasets.arrow_writer import ArrowWriter
+from datasets.fingerprint import Hasher
 from multiprocess import Pool, RLock
 
 import paddlenlp
@@ -226,6 +231,34 @@ def load_dataset(path_or_read_func, name=None, data_files=None, splits=None, laz
         return datasets
 
 
+def _map_shard_to_cache(shard, fn, batched, path):
+    """Transform the examples of the shard and write them into the arrow file `path`."""
+    examples = shard._map(fn, lazy=False, batched=batched).new_data
+    if len(examples) == 0:
+        return 0
+    writer = ArrowWriter(path=path)
+    for example in examples:
+        writer.write(example)
+    num_examples, _ = writer.finalize()
+    return num_examples
+
+
+def _filter_shard_indices(shard, fn, offset):
+    """Return the indices of the examples of the shard kept by `fn`, `offset` is the index of the first example."""
+    return [offset + idx for idx in range(len(shard.new_data)) if fn(shard.new_data[idx])]
+
+
+def _commit_cache(tmp_path, cache_path):
+    """Rename the finished cache into place, the cache committed first by another process is kept."""
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 class MapDataset(Dataset):
     """
     Wraps a map-style dataset-like object as an instance of `MapDataset`, and equips it
@@ -249,12 +282,25 @@ class MapDataset(Dataset):
         self.info = kwargs
         self.label_list = self.info.pop("label_list", None)
         self.vocab_info = self.info.pop("vocab_info", None)
+        # the fingerprint of `new_data`, computed on demand by the cached `map` and `filter`
+        self._fingerprint = None
 
     def _transform(self, data):
         for fn in self._transform_pipline:
             data = fn(data)
         return data
 
+    def _new_fingerprint(self, *args):
+        """Hash the fingerprint of `new_data` with the transform, which names the cache of the transformed data."""
+        if self._fingerprint is None:
+            self._fingerprint = getattr(self.new_data, "_fingerprint", None) or Hasher.hash(self.new_data)
+        return Hasher.hash([self._fingerprint, *args])
+
+    def _contiguous_shards(self, num_shards):
+        shards = [self._shard(num_shards=num_shards, index=index, contiguous=True) for index in range(num_shards)]
+        offsets = np.cumsum([0] + [len(shard) for shard in shards[:-1]]).tolist()
+        return shards, offsets
+
     def __getitem__(self, idx):
         """
         Basic function of `MapDataset` to get sample from dataset with a given
@@ -268,7 +314,7 @@ class MapDataset(Dataset):
         """
         return len(self.new_data)
 
-    def filter(self, fn, num_workers=0):
+    def filter(self, fn, num_workers=0, cache_dir=None):
         """
         Filters samples by the filter function and uses the filtered data to
         update this dataset.
@@ -278,8 +324,14 @@ class MapDataset(Dataset):
                 returns a boolean. Samples that return False would be discarded.
             num_workers(int, optional): Number of processes for multiprocessing. If
                 set to 0, it doesn't use multiprocessing. Defaults to `0`.
+            cache_dir(str, optional): If set, the indices of the kept samples are
+                cached in the directory, named by the fingerprint of the data and
+                `fn`, and reused by the same filter later. Defaults to `None`.
         """
         assert num_workers >= 0, "num_workers should be a non-negative value"
+        if cache_dir is not None:
+            return self._filter_with_cache(fn, num_workers, cache_dir)
+        self._fingerprint = None
         if num_workers > 1:
             shards = [
                 self._shard(num_shards=num_workers, index=index, contiguous=True) for index in range(num_workers)
@@ -303,8 +355,32 @@ class MapDataset(Dataset):
         self.new_data = [self.new_data[idx] for idx in range(len(self.new_data)) if fn(self.new_data[idx])]
         return self
 
+    def _filter_with_cache(self, fn, num_workers, cache_dir):
+        fingerprint = self._new_fingerprint("filter", fn)
+        cache_path = os.path.join(cache_dir, f"filter-{fingerprint}.npy")
+        if not os.path.isfile(cache_path):
+            if num_workers > 1:
+                shards, offsets = self._contiguous_shards(num_workers)
+                with Pool(num_workers, initargs=(RLock(),)) as pool:
+                    args = [(shard, fn, offset) for shard, offset in zip(shards, offsets)]
+                    indices = pool.starmap(_filter_shard_indices, args)
+                indices = sum(indices, [])
+            else:
+                indices = _filter_shard_indices(self, fn, 0)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.array(indices, dtype=np.int64))
+            _commit_cache(tmp_path, cache_path)
+
+        indices = np.load(cache_path).tolist()
+        self.new_data = [self.new_data[idx] for idx in indices]
+        self._fingerprint = fingerprint
+        return self
+
     def shard(self, num_shards=None, index=None, contiguous=False):
         self.new_data = self._shard(num_shards=num_shards, index=index, contiguous=contiguous).data
+        self._fingerprint = None
         return self
 
     def _shard(self, num_shards=None, index=None, contiguous=False):
@@ -341,7 +417,7 @@ class MapDataset(Dataset):
 
         return MapDataset(new_data)
 
-    def map(self, fn, lazy=True, batched=False, num_workers=0):
+    def map(self, fn, lazy=True, batched=False, num_workers=0, cache_dir=None):
         """
         Performs specific function on the dataset to transform and update every sample.
 
@@ -358,9 +434,19 @@ class MapDataset(Dataset):
             num_workers(int, optional): Number of processes for multiprocessing. If
                 set to 0, it doesn't use multiprocessing. Note that if set to positive
                 value, `lazy` option would be ignored. Defaults to 0.
+            cache_dir(str, optional): If set, the transformed samples are written into
+                memory-mapped Arrow files in the directory, named by the fingerprint of
+                the data and `fn`, and the same map loads them later instead of running
+                `fn` again. The workers write their own files directly. The samples should
+                be dicts, and their arrays are loaded back as lists. Note that if set,
+                `lazy` option would be ignored. Defaults to `None`.
         """
 
         assert num_workers >= 0, "num_workers should be a non-negative value"
+        if cache_dir is not None:
+            return self._map_with_cache(fn, batched, num_workers, cache_dir)
+        if num_workers > 1 or batched or not lazy:
+            self._fingerprint = None
         if num_workers > 1:
             shards = [
                 self._shard(num_shards=num_workers, index=index, contiguous=True) for index in range(num_workers)
@@ -389,6 +475,31 @@ class MapDataset(Dataset):
             self.new_data = [fn(self.new_data[idx]) for idx in range(len(self.new_data))]
         return self
 
+    def _map_with_cache(self, fn, batched, num_workers, cache_dir):
+        fingerprint = self._new_fingerprint("map", fn, batched)
+        cache_path = os.path.join(cache_dir, f"map-{fingerprint}")
+        if not os.path.isdir(cache_path):
+            tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+            os.makedirs(tmp_path, exist_ok=True)
+            num_shards = max(num_workers, 1)
+            shards, _ = self._contiguous_shards(num_shards)
+            args = [
+                (shard, fn, batched, os.path.join(tmp_path, f"shard-{index:05d}.arrow"))
+                for index, shard in enumerate(shards)
+            ]
+            if num_workers > 1:
+                with Pool(num_workers, initargs=(RLock(),)) as pool:
+                    pool.starmap(_map_shard_to_cache, args)
+            else:
+                _map_shard_to_cache(*args[0])
+            _commit_cache(tmp_path, cache_path)
+
+        paths = sorted(glob.glob(os.path.join(cache_path, "shard-*.arrow")))
+        shards = [datasets.Dataset.from_file(path) for path in paths]
+        self.new_data = datasets.concatenate_datasets(shards) if shards else []
+        self._fingerprint = fingerprint
+        return self
+
 
 class IterDataset(IterableDataset):
     """
@@ -12,9 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
+
 import numpy as np
 from paddle.io import Dataset, IterableDataset
-from scipy.linalg import block_diag
 
 
 class InTokens:
@@ -22,6 +23,15 @@ class InTokens:
     required_output_keys = ["input_ids", "labels", "attention_mask"]
     # Only supported the following keys for InTokens. Keys outside of the set will be ignored.
     supported_input_keys = ["input_ids", "labels", "attention_mask", "position_ids"]
+    # "greedy" packs the records in arrival order, "best_fit" packs the records of every buffer by best-fit-decreasing.
+    supported_packing_strategies = ["greedy", "best_fit"]
+
+    def _check_packing_strategy(self):
+        if self.packing_strategy not in self.supported_packing_strategies:
+            raise ValueError(
+                f"packing_strategy should be one of {self.supported_packing_strategies}, "
+                f"but got `{self.packing_strategy}`"
+            )
 
     @classmethod
     def _pad_batch_records(cls, batch_records):
@@ -41,93 +51,139 @@ class InTokens:
         for record in batch_records:
             batched_features["input_ids"].extend(record["input_ids"])
             batched_features["labels"].extend(record["labels"])
-            seq_length = len(record["input_ids"])
-            # If attention_mask is not given, assume it's causal mask
-            attention_mask = record.get("attention_mask", np.tril(np.ones([seq_length, seq_length], dtype=bool)))
-            batched_features["attention_mask"].append(attention_mask)
             # NOTE: position_ids is optional and not required by every model
             # We append instead of extend here to accomodate 2D position ids
             if "position_ids" in record:
                 batched_features["position_ids"].append(record["position_ids"])
-        block_attention_mask = block_diag(*batched_features["attention_mask"])
         # convert to 3-D [batch_size(1), seq_length, seq_length]
-        batched_features["attention_mask"] = np.expand_dims(block_attention_mask, axis=0)
+        batched_features["attention_mask"] = np.expand_dims(cls._block_attention_mask(batch_records), axis=0)
         if "position_ids" in batched_features:
             # Accomodate both 1D and 2D position ids
             batched_features["position_ids"] = np.concatenate(batched_features["position_ids"], axis=-1).tolist()
         return batched_features
 
+    @staticmethod
+    def _block_attention_mask(batch_records):
+        """Fill the attention mask of every record into the diagonal block of one preallocated mask."""
+        masks = [record.get("attention_mask") for record in batch_records]
+        dtype = np.result_type(*[np.asarray(mask).dtype for mask in masks if mask is not None], bool)
+        total_length = sum(len(record["input_ids"]) for record in batch_records)
+        block_attention_mask = np.zeros([total_length, total_length], dtype=dtype)
+        start = 0
+        for record, mask in zip(batch_records, masks):
+            seq_length = len(record["input_ids"])
+            block = block_attention_mask[start : start + seq_length, start : start + seq_length]
+            if mask is None:
+                # If attention_mask is not given, assume it's causal mask
+                block[np.tril_indices(seq_length)] = 1
+            else:
+                block[...] = mask
+            start += seq_length
+        return block_attention_mask
+
+    def _pack(self, items, length_fn):
+        """
+        Yield the groups of the items packed into `max_length` tokens, the items keep their order in a group, along
+        with the number of the items that are completely packed once the group is yielded. "best_fit" packs a buffer
+        out of order, so its items are only completely packed with the last group of the buffer.
+        """
+        if self.packing_strategy == "greedy":
+            group, cur_len_so_far = [], 0
+            for item in items:
+                length = length_fn(item)
+                if group and cur_len_so_far + length > self.max_length:
+                    # exceed max length
+                    yield group, len(group)
+                    group, cur_len_so_far = [], 0
+                group.append(item)
+                cur_len_so_far += length
+            # remaining data
+            if group:
+                yield group, len(group)
+        else:
+            buffer = []
+            for item in items:
+                buffer.append((item, length_fn(item)))
+                if len(buffer) == self.packing_buffer_size:
+                    yield from self._pack_buffer(buffer)
+                    buffer = []
+            if buffer:
+                yield from self._pack_buffer(buffer)
+
+    def _pack_buffer(self, buffer):
+        groups = self._best_fit_decreasing(buffer)
+        for i, group in enumerate(groups):
+            yield group, len(buffer) if i == len(groups) - 1 else 0
+
+    def _best_fit_decreasing(self, buffer):
+        """Put every item, longest first, into the group with the least space left that still fits it."""
+        groups, spaces = [], []  # `spaces` is sorted (space left, group index) of the groups
+        order = sorted(range(len(buffer)), key=lambda position: -buffer[position][1])
+        for position in order:
+            length = buffer[position][1]
+            index = bisect.bisect_left(spaces, (length, -1))
+            if index < len(spaces):
+                space, group_index = spaces.pop(index)
+            else:
+                space, group_index = self.max_length, len(groups)
+                groups.append([])
+            groups[group_index].append(position)
+            if space - length > 0:
+                bisect.insort(spaces, (space - length, group_index))
+        return [[buffer[position][0] for position in sorted(group)] for group in groups]
+
 
 class InTokensMapDataset(InTokens, Dataset):
-    def __init__(self, data, tokenizer, max_length):
+    """
+    The packed dataset of `data`, which only keeps the indices of the records of every packed sample and pads the
+    records on `__getitem__`. Every record of `data` is read once, so a lazily mapped `data` is not transformed
+    again on `__getitem__`.
+
+    Args:
+        data (Dataset): The dataset of the records with `input_ids` and `labels`.
+        tokenizer (PretrainedTokenizer): The tokenizer.
+        max_length (int): The maximum number of tokens of a packed sample.
+        packing_strategy (str, optional): "greedy" packs the records in order, and "best_fit" packs every
+            `packing_buffer_size` records by best-fit-decreasing, which leaves less padding. Defaults to "greedy".
+        packing_buffer_size (int, optional): The number of records packed together by "best_fit".
+    """
+
+    def __init__(self, data, tokenizer, max_length, packing_strategy="greedy", packing_buffer_size=10000):
+        self.data = [data[i] for i in range(len(data))]
         self.tokenizer = tokenizer
         self.max_length = max_length
-        self.new_data = self._create_intokens_data(data)
+        self.packing_strategy = packing_strategy
+        self.packing_buffer_size = packing_buffer_size
+        self._check_packing_strategy()
+        self.new_data = self._create_intokens_data(self.data)
 
     def _create_intokens_data(self, data):
-        batch_records, max_len = [], 0
-        cur_len_so_far = 0
-
-        total_data = []
-        for i in range(len(data)):
-            record = data[i]
-            max_len = max(max_len, len(record["input_ids"]))
-            to_append = (cur_len_so_far + len(record["input_ids"])) <= self.max_length
-            if to_append:
-                batch_records.append(record)
-                cur_len_so_far += len(record["input_ids"])
-            else:
-                # exceed max length
-                padded_list = self._pad_batch_records(batch_records)
-                total_data.append(padded_list)
-                # reset
-                batch_records, max_len = [], 0
-                cur_len_so_far = 0
-                # append current data
-                batch_records.append(record)
-                cur_len_so_far += len(record["input_ids"])
-
-        # remaining data
-        if batch_records:
-            padded_list = self._pad_batch_records(batch_records)
-            total_data.append(padded_list)
-        return total_data
+        return [group for group, _ in self._pack(range(len(data)), lambda i: len(data[i]["input_ids"]))]
 
     def __getitem__(self, idx):
-        return self.new_data[idx]
+        return self._pad_batch_records([self.data[i] for i in self.new_data[idx]])
 
     def __len__(self):
         return len(self.new_data)
 
 
 class InTokensIterableDataset(InTokens, IterableDataset):
-    def __init__(self, data, tokenizer, max_length):
+    """
+    The packed stream of `data`, see `InTokensMapDataset` for the arguments. `intokens_global_step` counts the records
+    to skip to resume the stream. With "best_fit", it only advances once all the packed samples of a buffer are
+    yielded, so the packed samples of a partially yielded buffer are yielded again on resuming.
+    """
+
+    def __init__(self, data, tokenizer, max_length, packing_strategy="greedy", packing_buffer_size=10000):
         self.data = data
         self.tokenizer = tokenizer
         self.max_length = max_length
+        self.packing_strategy = packing_strategy
+        self.packing_buffer_size = packing_buffer_size
+        self._check_packing_strategy()
         self.intokens_global_step = 0
 
     def __iter__(self):
-        batch_records, max_len = [], 0
-        cur_len_so_far = 0
-        for record in self.data:
-            max_len = max(max_len, len(record["input_ids"]))
-            to_append = (cur_len_so_far + len(record["input_ids"])) <= self.max_length
-            if to_append:
-                batch_records.append(record)
-                self.intokens_global_step += 1
-                cur_len_so_far += len(record["input_ids"])
-            else:
-                # exceed max length
-                padded_list = self._pad_batch_records(batch_records)
-                yield padded_list
-                # reset
-                batch_records, max_len = [], 0
-                cur_len_so_far = 0
-                # append current data
-                batch_records.append(record)
-                self.intokens_global_step += 1
-                cur_len_so_far += len(record["input_ids"])
-        if batch_records:
-            padded_list = self._pad_batch_records(batch_records)
-            yield padded_list
+        for batch_records, num_packed in self._pack(self.data, lambda record: len(record["input_ids"])):
+            self.intokens_global_step += num_packed
+            yield self._pad_batch_records(batch_records)
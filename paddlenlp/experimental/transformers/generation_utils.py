@@ -26,7 +26,12 @@ from paddlenlp_ops import (
     set_value_by_flags_and_idx,
 )
 
-from paddlenlp.generation import GenerationMixin, LogitsProcessor, LogitsProcessorList
+from paddlenlp.generation import (
+    BaseStreamer,
+    GenerationMixin,
+    LogitsProcessor,
+    LogitsProcessorList,
+)
 
 try:
     from paddle import top_p_sampling
@@ -160,8 +165,16 @@ class GenerationInferenceModel(GenerationMixin):
         inputs_embeds=None,
         logits_processors=None,
         pre_caches=None,
+        streamer: BaseStreamer = None,
         **model_kwargs,
     ):
+        """
+        Args:
+            streamer (`~streamer.BaseStreamer`, *optional*):
+                Streamer object that receives the token ids of the whole batch at every step through
+                `streamer.put(next_tokens)`. If not set, the token ids are saved to the `real_time_save.*` files by
+                the `save_with_output` op, which is what the exported static model does.
+        """
 
         model_kwargs["position_ids"] = position_ids
         model_kwargs["attention_mask"] = attention_mask
@@ -190,6 +203,7 @@ class GenerationInferenceModel(GenerationMixin):
             cache_kvs=cache_kvs,
             temperature=temperature,
             inputs_embeds=inputs_embeds,
+            streamer=streamer,
             **model_kwargs,
         )
         return ret
@@ -294,6 +308,7 @@ class GenerationInferenceModel(GenerationMixin):
         top_p=None,
         temperature=None,
         inputs_embeds=None,
+        streamer=None,
         **model_kwargs,
     ):
         step_idx_ori = paddle.full(shape=[1], dtype="int64", fill_value=1)
@@ -367,13 +382,16 @@ class GenerationInferenceModel(GenerationMixin):
             else:
                 model_kwargs["all_input_ids"] = paddle.concat([model_kwargs["all_input_ids"], next_tokens], axis=1)
 
-            save_with_output(
-                next_tokens,
-                batch_idx,
-                step_idx_ori,
-                "real_time_save.temp_ids",
-                self.config.tensor_parallel_rank,
-            )
+            if streamer is not None:
+                streamer.put(next_tokens)
+            else:
+                save_with_output(
+                    next_tokens,
+                    batch_idx,
+                    step_idx_ori,
+                    "real_time_save.temp_ids",
+                    self.config.tensor_parallel_rank,
+                )
 
             return next_tokens, model_kwargs
 
@@ -406,6 +424,9 @@ class GenerationInferenceModel(GenerationMixin):
             )
             step_idx_ori += 1
 
+        if streamer is not None:
+            streamer.end()
+
         return (
             next_tokens,
             model_kwargs["step_idx"],
@@ -284,7 +284,8 @@ class LlamaInferenceModel(LlamaPretrainedModel):
 
         position_offset = 0
         if not is_decoder and pre_caches is not None:
-            position_offset = 128
+            # the length of the prefix caches is unknown in the exported static model, which is fixed to 128 there
+            position_offset = pre_caches[0].shape[-2] if paddle.in_dynamic_mode() else 128
         new_rope = fused_get_rotary_embedding(
             input_ids, position_ids, self.head_dim_shape_tensor, position_offset, True
         )
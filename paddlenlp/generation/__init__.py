@@ -23,6 +23,8 @@ from .logits_process import (
     TopKProcess,
     TopPProcess,
 )
+from .speculative import DraftModelProposer, PromptLookupProposer
+from .static_cache import StaticDecodingBuffers, StaticKVCacheLayer
 from .stopping_criteria import (
     MaxLengthCriteria,
     MaxTimeCriteria,
@@ -30,5 +32,10 @@ from .stopping_criteria import (
     StoppingCriteriaList,
     validate_stopping_criteria,
 )
-from .streamers import BaseStreamer, TextIteratorStreamer, TextStreamer
+from .streamers import (
+    BaseStreamer,
+    TextIteratorStreamer,
+    TextStreamer,
+    TokenIteratorStreamer,
+)
 from .utils import BeamSearchScorer, GenerationMixin, get_unfinished_flag
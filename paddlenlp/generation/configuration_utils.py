@@ -74,9 +74,9 @@ class GenerationConfig:
             min_length (int, optional): The minimum length of the sequence to
                 be generated. Default to 0.
             decode_strategy (str, optional): The decoding strategy in generation.
-                Currently, there are three decoding strategies supported:
-                "greedy_search", "sampling" and "beam_search". Default to
-                "greedy_search".
+                Currently, there are four decoding strategies supported:
+                "greedy_search", "sampling", "beam_search" and "speculative".
+                Default to "greedy_search".
             temperature (float, optional): The value used to module the next
                 token probabilities in the "sampling" strategy. Default to 1.0,
                 which means no effect.
@@ -124,6 +124,25 @@ class GenerationConfig:
                 If not, this is the diversity_rate for DIVERSE BEAM SEARCH.
             use_cache: (bool, optional): Whether to use the model cache to
                 speed up decoding. Default to True.
+            use_static_cache: (bool, optional): Whether to allocate the output
+                ids, the attention mask and (for the models which support it)
+                the key/value cache once with `max_length` and write them in
+                place at every step of "greedy_search" and "sampling", instead
+                of concatenating them. Default to False.
+            drop_finished_sequences: (bool, optional): Whether to drop the
+                finished sequences (the finished batches for "beam_search")
+                from the model forward in "greedy_search", "sampling" and
+                "beam_search", which saves the compute spent on them when the
+                lengths of outputs in a batch are very different. Default to False.
+            do_sample (bool, optional): Whether to sample the tokens in the
+                "speculative" strategy, otherwise the tokens are selected
+                greedily. Default to False.
+            num_speculative_tokens (int, optional): The number of draft tokens
+                proposed at every step of the "speculative" strategy. Default to 5.
+            prompt_lookup_ngram_size (int, optional): The max size of the n-gram
+                looked up in the sequence to propose the draft tokens, which is
+                used by the "speculative" strategy when no `draft_model` is
+                given. Default to 3.
             use_fast: (bool, optional): Whether to use fast entry of model
                 for FastGeneration. Default to False.
             use_fp16_decoding: (bool, optional): Whether to use fp16 for decoding.
@@ -164,6 +183,13 @@ class GenerationConfig:
         self.num_beams = kwargs.pop("num_beams", 1)
         self.num_beam_groups = kwargs.pop("num_beam_groups", 1)
         self.use_cache = kwargs.pop("use_cache", True)
+        self.use_static_cache = kwargs.pop("use_static_cache", False)
+        self.drop_finished_sequences = kwargs.pop("drop_finished_sequences", False)
+
+        # Parameters of the speculative decoding
+        self.do_sample = kwargs.pop("do_sample", False)
+        self.num_speculative_tokens = kwargs.pop("num_speculative_tokens", 5)
+        self.prompt_lookup_ngram_size = kwargs.pop("prompt_lookup_ngram_size", 3)
 
         # Parameters that define the output variables of `generate`
         self.num_return_sequences = kwargs.pop("num_return_sequences", 1)
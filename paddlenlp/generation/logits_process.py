@@ -109,74 +109,16 @@ class RepetitionPenaltyLogitsProcessor(LogitsProcessor):
         return outputs
 
 
-def _get_ngrams(ngram_size: int, prev_input_ids: paddle.Tensor, num_hypos: int):
-    """
-    Assume ngram_size=2 and prev_input_ids=tensor([[40, 2883, 2712, 4346]]). The output of generated ngrams look like
-    this {(40,): [2883], (2883,): [2712], (2712,): [4346]}.
-
-    Args:
-        ngram_size (`int`):
-            The number sequential tokens taken as a group which may only occur once before being banned.
-        prev_input_ids (`paddle.Tensor`):
-           Generated token ids for the current hypothesis.
-        num_hypos (`int`):
-            The number of hypotheses for which n-grams need to be generated.
-
-    Returns:
-        generated_ngrams (`dict`):
-            Dictionary of generated ngrams.
-    """
-    generated_ngrams = [{} for _ in range(num_hypos)]
-    for idx in range(num_hypos):
-        gen_tokens = prev_input_ids[idx].tolist()
-        generated_ngram = generated_ngrams[idx]
-        for ngram in zip(*[gen_tokens[i:] for i in range(ngram_size)]):
-            prev_ngram_tuple = tuple(ngram[:-1])
-            generated_ngram[prev_ngram_tuple] = generated_ngram.get(prev_ngram_tuple, []) + [ngram[-1]]
-    return generated_ngrams
-
-
-def _get_generated_ngrams(banned_ngrams, prev_input_ids, ngram_size, cur_len):
-    """
-    Determines the banned tokens for the current hypothesis based on previously generated n-grams.
-
-    Args:
-        banned_ngrams (`dict`):
-            A dictionary containing previously generated n-grams for each hypothesis.
-        prev_input_ids (`paddle.Tensor`):
-            Generated token ids for the current hypothesis.
-        ngram_size (`int`):
-            The number sequential tokens taken as a group which may only occur once before being banned.
-        cur_len (`int`):
-            The current length of the token sequences for which the n-grams are being checked.
-
-    Returns:
-        List of tokens that are banned.
-    """
-    start_idx = cur_len + 1 - ngram_size
-    ngram_idx = tuple(prev_input_ids[start_idx:cur_len].tolist())
-    return banned_ngrams.get(ngram_idx, [])
-
-
-def _calc_banned_ngram_tokens(ngram_size: int, prev_input_ids: paddle.Tensor, num_hypos: int, cur_len: int):
-    """Copied from fairseq for no_repeat_ngram in beam_search"""
-    if cur_len + 1 < ngram_size:
-        # return no banned tokens if we haven't generated no_repeat_ngram_size tokens yet
-        return [[] for _ in range(num_hypos)]
-
-    generated_ngrams = _get_ngrams(ngram_size, prev_input_ids, num_hypos)
-
-    banned_tokens = [
-        _get_generated_ngrams(generated_ngrams[hypo_idx], prev_input_ids[hypo_idx], ngram_size, cur_len)
-        for hypo_idx in range(num_hypos)
-    ]
-    return banned_tokens
-
-
 class NoRepeatNGramLogitsProcessor(LogitsProcessor):
     r"""
     [`LogitsProcessor`] that enforces no repetition of n-grams. See
     [Fairseq](https://github.com/pytorch/fairseq/blob/a07cb6f40480928c9e0548b737aadd36ee66ac76/fairseq/sequence_generator.py#L345).
+
+    The n-grams of every hypothesis are indexed by their first `ngram_size - 1` tokens, and the index is updated
+    incrementally with the new tokens at every step instead of being rebuilt. The hypotheses reordered by beam search
+    are traced back to the ones of the last step by their prefixes, and the index is rebuilt for the hypotheses which
+    can not be traced back.
+
     Args:
         ngram_size (`int`):
             All ngrams of size `ngram_size` can only occur once.
@@ -187,17 +129,77 @@ class NoRepeatNGramLogitsProcessor(LogitsProcessor):
             raise ValueError(f"`ngram_size` has to be a strictly positive integer, but is {ngram_size}")
         self.ngram_size = ngram_size
 
+        # the n-gram index of every hypothesis, which maps the prefix of n-gram to the tokens following it
+        self._generated_ngrams: List[Dict[Tuple[int], Tuple[int]]] = []
+        # the input ids which the n-gram index is built from
+        self._prev_input_ids: np.ndarray = None
+
+    def _find_parents(self, input_ids: np.ndarray):
+        # find the hypothesis of the last step which every hypothesis is extended from
+        prev_input_ids = self._prev_input_ids
+        if prev_input_ids is None or prev_input_ids.shape[1] > input_ids.shape[1]:
+            return [None] * input_ids.shape[0]
+
+        prefix = input_ids[:, : prev_input_ids.shape[1]]
+        if prev_input_ids.shape[0] == input_ids.shape[0]:
+            unchanged = np.all(prefix == prev_input_ids, axis=1)
+        else:
+            unchanged = np.zeros([input_ids.shape[0]], dtype=bool)
+
+        parents = []
+        for idx in range(input_ids.shape[0]):
+            if unchanged[idx]:
+                parents.append(idx)
+                continue
+            matches = np.nonzero(np.all(prev_input_ids == prefix[idx], axis=1))[0]
+            parents.append(int(matches[0]) if len(matches) > 0 else None)
+        return parents
+
+    def _update_ngrams(self, input_ids: np.ndarray):
+        parents = self._find_parents(input_ids)
+        start = 0 if self._prev_input_ids is None else self._prev_input_ids.shape[1]
+
+        # the hypotheses extended from the same one share nothing, so all but the first of them take a copy
+        generated_ngrams, claimed = [], set()
+        for parent in parents:
+            if parent is None:
+                generated_ngrams.append({})
+            elif parent in claimed:
+                generated_ngrams.append(dict(self._generated_ngrams[parent]))
+            else:
+                claimed.add(parent)
+                generated_ngrams.append(self._generated_ngrams[parent])
+
+        for row, parent, generated_ngram in zip(input_ids.tolist(), parents, generated_ngrams):
+            for end in range(max(start if parent is not None else 0, self.ngram_size - 1), len(row)):
+                prev_ngram_tuple = tuple(row[end + 1 - self.ngram_size : end])
+                generated_ngram[prev_ngram_tuple] = generated_ngram.get(prev_ngram_tuple, ()) + (row[end],)
+
+        self._generated_ngrams = generated_ngrams
+        self._prev_input_ids = input_ids
+
     def __call__(self, input_ids: paddle.Tensor, scores: paddle.Tensor):
-        num_batch_hypotheses = scores.shape[0]
+        num_batch_hypotheses, vocab_size = scores.shape
         cur_len = input_ids.shape[-1]
-        banned_batch_tokens = _calc_banned_ngram_tokens(self.ngram_size, input_ids, num_batch_hypotheses, cur_len)
+        if cur_len + 1 < self.ngram_size:
+            # no banned tokens if we haven't generated no_repeat_ngram_size tokens yet
+            return scores
 
-        for i, banned_tokens in enumerate(banned_batch_tokens):
-            if len(banned_tokens) == 0:
-                continue
-            scores[i, banned_tokens] = paddle.finfo(scores.dtype).min
+        input_ids = input_ids.numpy()
+        self._update_ngrams(input_ids)
 
-        return scores
+        banned_index = []
+        for idx in range(num_batch_hypotheses):
+            prev_ngram_tuple = tuple(input_ids[idx, cur_len + 1 - self.ngram_size :].tolist())
+            banned_tokens = self._generated_ngrams[idx].get(prev_ngram_tuple, ())
+            banned_index.extend(idx * vocab_size + token for token in banned_tokens)
+        if len(banned_index) == 0:
+            return scores
+
+        # ban all the tokens with one scatter
+        banned_index = paddle.to_tensor(banned_index, dtype="int64")
+        banned_scores = paddle.full(banned_index.shape, paddle.finfo(scores.dtype).min, dtype=scores.dtype)
+        return paddle.scatter(scores.flatten(), banned_index, banned_scores).reshape(scores.shape)
 
 
 class HammingDiversityLogitsProcessor(LogitsProcessor):
@@ -431,6 +433,7 @@ class SequenceBiasLogitsProcessor(LogitsProcessor):
         # Bias variables that will be populated on the first call (for retrocompatibility purposes, the vocabulary size
         # is infered in the first usage, which inhibits initializing here)
         self.length_1_bias = None
+        self.prefix_bias = None
         self.prepared_bias_variables = False
 
     def __call__(self, input_ids, scores):
@@ -445,27 +448,27 @@ class SequenceBiasLogitsProcessor(LogitsProcessor):
         if self.length_1_bias is not None:
             bias += self.length_1_bias
 
-        # 4 - include the bias from length > 1, after determining which biased sequences may be completed.
-        for sequence_ids, sequence_bias in self.sequence_bias.items():
-            if len(sequence_ids) == 1:  # the sequence is of length 1, already applied
-                continue
-            if len(sequence_ids) > input_ids.shape[1]:  # the sequence is longer than the context, ignore
+        # 4 - include the bias from length > 1, after determining which biased sequences may be completed. The
+        # sequences with the same length are matched together.
+        batch_size = input_ids.shape[0]
+        for prefix_length, prefixes, last_tokens, biases in self.prefix_bias:
+            if prefix_length + 1 > input_ids.shape[1]:  # the sequences are longer than the context, ignore
                 continue
-            prefix_length = len(sequence_ids) - 1
-            last_token = sequence_ids[-1]
-            matching_rows = (
-                paddle.equal(
-                    input_ids[:, -prefix_length:],
-                    paddle.to_tensor(sequence_ids[:-1], dtype=input_ids.dtype),
-                )
-                .astype(paddle.int64)
-                .prod(axis=1)
+            # [batch_size, num_sequences]
+            matching_rows = paddle.all(
+                input_ids[:, -prefix_length:].unsqueeze(1) == prefixes.astype(input_ids.dtype).unsqueeze(0), axis=-1
             )
-            bias[:, last_token] += paddle.where(
-                matching_rows == 1,
-                paddle.to_tensor(sequence_bias),
-                paddle.to_tensor(0.0),
+            num_sequences = prefixes.shape[0]
+            index = paddle.stack(
+                [
+                    paddle.arange(batch_size, dtype="int64").unsqueeze(-1).expand([batch_size, num_sequences]),
+                    last_tokens.unsqueeze(0).expand([batch_size, num_sequences]),
+                ],
+                axis=-1,
             )
+            biases = biases.astype(bias.dtype).unsqueeze(0).expand([batch_size, num_sequences])
+            updates = paddle.where(matching_rows, biases, paddle.zeros_like(biases))
+            bias = paddle.scatter_nd_add(bias, index.reshape([-1, 2]), updates.flatten())
 
         # 5 - apply the bias to the scores
         scores = scores + bias
@@ -489,9 +492,24 @@ class SequenceBiasLogitsProcessor(LogitsProcessor):
         # Precompute the bias tensors to be applied. Sequences of length 1 are kept separately, as they can be applied
         # with simpler logic.
         self.length_1_bias = paddle.zeros((vocabulary_size,))
+        prefix_bias = {}
         for sequence_ids, bias in self.sequence_bias.items():
             if len(sequence_ids) == 1:
                 self.length_1_bias[sequence_ids[-1]] = bias
+            else:
+                prefix_bias.setdefault(len(sequence_ids) - 1, []).append((sequence_ids, bias))
+
+        # Sequences of length > 1 are grouped by the length of prefix as (prefix_length, prefixes, last_tokens, biases)
+        self.prefix_bias = []
+        for prefix_length, sequences in prefix_bias.items():
+            self.prefix_bias.append(
+                (
+                    prefix_length,
+                    paddle.to_tensor([sequence_ids[:-1] for sequence_ids, _ in sequences], dtype="int64"),
+                    paddle.to_tensor([sequence_ids[-1] for sequence_ids, _ in sequences], dtype="int64"),
+                    paddle.to_tensor([bias for _, bias in sequences], dtype="float32"),
+                )
+            )
 
         self.prepared_bias_variables = True
 
@@ -0,0 +1,204 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import numpy as np
+import paddle
+from paddle.utils import map_structure
+
+from paddlenlp.transformers.model_outputs import ModelOutput
+
+__all__ = ["PromptLookupProposer", "DraftModelProposer"]
+
+
+def get_cache(model_kwargs):
+    if model_kwargs.get("past_key_values", None) is not None:
+        return model_kwargs["past_key_values"]
+    return model_kwargs.get("cache", None)
+
+
+def set_cache(model_kwargs, cache):
+    for key in ["cache", "past_key_values"]:
+        if key in model_kwargs:
+            model_kwargs[key] = cache
+
+
+def crop_cache(cache, reference_cache, num_tokens):
+    """
+    drop the last `num_tokens` positions of every tensor in `cache`. The sequence axis of every tensor is the one whose
+    size differs from the one of the same tensor in `reference_cache`, which is a shorter cache of the same model.
+    """
+    if num_tokens <= 0:
+        return cache
+
+    def _crop(tensor, reference):
+        axis = [i for i, (size, ref_size) in enumerate(zip(tensor.shape, reference.shape)) if size != ref_size][0]
+        return paddle.slice(tensor, axes=[axis], starts=[0], ends=[tensor.shape[axis] - num_tokens])
+
+    return map_structure(_crop, cache, reference_cache)
+
+
+def extend_model_kwargs(model, model_kwargs, num_tokens):
+    """extend `attention_mask`, `position_ids` and so on by `num_tokens` positions without touching the cache"""
+    for _ in range(num_tokens):
+        model_kwargs = model.update_model_kwargs_for_generation(None, model_kwargs, is_encoder_decoder=False)
+    return model_kwargs
+
+
+def truncate_model_kwargs(model_kwargs, num_tokens):
+    """the reverse of `extend_model_kwargs`"""
+    if num_tokens <= 0:
+        return model_kwargs
+    for key in ["attention_mask", "position_ids", "token_type_ids", "role_ids"]:
+        value = model_kwargs.get(key, None)
+        if value is None:
+            continue
+        if len(value.shape) == 4:
+            model_kwargs[key] = value[:, :, : value.shape[2] - num_tokens, : value.shape[3] - num_tokens]
+        else:
+            model_kwargs[key] = value[..., : value.shape[-1] - num_tokens]
+    return model_kwargs
+
+
+def speculative_forward(model, input_ids, num_new_tokens, model_kwargs):
+    """
+    run `model` on the last `num_new_tokens` tokens of `input_ids`, the former ones of which are in the cache of
+    `model_kwargs`. Note that `model_kwargs` should cover the whole `input_ids`.
+    """
+    cache = get_cache(model_kwargs)
+    model_inputs = model.prepare_inputs_for_generation(input_ids, **model_kwargs)
+    if cache is None:
+        # keep the default position ids to be extended by `update_model_kwargs_for_generation` in later steps
+        position_ids = model_inputs.get("position_ids", None)
+        if model_kwargs.get("position_ids", None) is None and isinstance(position_ids, paddle.Tensor):
+            model_kwargs["position_ids"] = position_ids
+    else:
+        # `prepare_inputs_for_generation` only keeps the last token when cache is given
+        model_inputs["input_ids"] = input_ids[:, -num_new_tokens:]
+        for key in ["position_ids", "token_type_ids", "role_ids"]:
+            if model_inputs.get(key, None) is not None and model_kwargs.get(key, None) is not None:
+                model_inputs[key] = model_kwargs[key][..., -num_new_tokens:]
+        attention_mask = model_kwargs.get("attention_mask", None)
+        if attention_mask is not None and model_inputs.get("attention_mask", None) is not None:
+            if len(attention_mask.shape) == 4:
+                model_inputs["attention_mask"] = attention_mask[:, :, -num_new_tokens:, :]
+
+    outputs = model(**model_inputs)
+    if isinstance(outputs, tuple):
+        logits = outputs[0]
+    elif isinstance(outputs, ModelOutput):
+        logits = outputs.logits
+    else:
+        logits = outputs
+    return outputs, logits
+
+
+class PromptLookupProposer:
+    """
+    Propose the draft tokens by looking up the last n-gram of the sequence in the sequence itself (prompt lookup
+    decoding), which works well when the output copies spans of the prompt, e.g. summarization and retrieval QA.
+
+    Args:
+        max_ngram_size (int): The max size of the n-gram to look up. The smaller ones are tried when the larger
+            ones can not be found.
+    """
+
+    def __init__(self, max_ngram_size: int = 3):
+        self.max_ngram_size = max_ngram_size
+
+    def _lookup(self, tokens, num_tokens):
+        for ngram_size in range(min(self.max_ngram_size, len(tokens) - 1), 0, -1):
+            # the windows exclude the last token so that every match has at least one following token
+            windows = np.lib.stride_tricks.sliding_window_view(tokens[:-1], ngram_size)
+            matches = np.nonzero(np.all(windows == tokens[-ngram_size:], axis=1))[0]
+            if len(matches) > 0:
+                start = matches[-1] + ngram_size
+                return tokens[start : start + num_tokens]
+        return tokens[:0]
+
+    def propose(self, input_ids, num_tokens, select_fn=None):
+        rows = input_ids.numpy()
+        candidates = [self._lookup(row, num_tokens) for row in rows]
+        length = max(len(candidate) for candidate in candidates)
+        # the rows without enough candidates are padded with their last token, which is rejected most probably
+        draft_tokens = np.stack(
+            [
+                np.concatenate([candidate, np.full([length - len(candidate)], row[-1], dtype=row.dtype)])
+                for candidate, row in zip(candidates, rows)
+            ]
+        )
+        return paddle.to_tensor(draft_tokens, dtype=input_ids.dtype), None
+
+    def accept(self, num_accepted):
+        pass
+
+
+class DraftModelProposer:
+    """
+    Propose the draft tokens by decoding with a small draft model which shares the vocabulary with the target model.
+    The cache of the draft model is rolled back to the accepted tokens after every verification.
+
+    Args:
+        model (GenerationMixin): The draft model.
+        input_ids (Tensor): The prompt ids with shape `[batch_size, seq_len]`.
+        model_kwargs (dict): The model inputs of the prompt, e.g. `attention_mask`.
+    """
+
+    def __init__(self, model, input_ids, model_kwargs):
+        self.model = model
+        self.model_kwargs = {
+            key: value for key, value in model_kwargs.items() if key not in ["cache", "past_key_values"]
+        }
+        self.model_kwargs["use_cache"] = True
+        # the number of tokens covered by `model_kwargs`
+        self.num_tokens = input_ids.shape[1]
+        self.cache_length = 0
+        self._start_length = 0
+        self._reference_cache = None
+
+    def propose(self, input_ids, num_tokens, select_fn):
+        length = input_ids.shape[1]
+        model_kwargs = extend_model_kwargs(self.model, self.model_kwargs, length - self.num_tokens)
+
+        draft_tokens, draft_probs = [], []
+        self._start_length, self._reference_cache = length, None
+        for _ in range(num_tokens):
+            outputs, logits = speculative_forward(
+                self.model, input_ids, input_ids.shape[1] - self.cache_length, model_kwargs
+            )
+            next_tokens, next_probs = select_fn(input_ids, logits[:, -1, :])
+            model_kwargs = self.model.update_model_kwargs_for_generation(
+                outputs, model_kwargs, is_encoder_decoder=False
+            )
+            self.cache_length = input_ids.shape[1]
+            if self._reference_cache is None:
+                self._reference_cache = get_cache(model_kwargs)
+
+            input_ids = paddle.concat([input_ids, next_tokens], axis=1)
+            draft_tokens.append(next_tokens)
+            draft_probs.append(next_probs)
+
+        self.model_kwargs, self.num_tokens = model_kwargs, input_ids.shape[1]
+        draft_probs = paddle.stack(draft_probs, axis=1) if draft_probs[0] is not None else None
+        return paddle.concat(draft_tokens, axis=1), draft_probs
+
+    def accept(self, num_accepted):
+        valid_length = self._start_length + num_accepted
+        if self.cache_length > valid_length:
+            cache = crop_cache(get_cache(self.model_kwargs), self._reference_cache, self.cache_length - valid_length)
+            set_cache(self.model_kwargs, cache)
+            self.cache_length = valid_length
+        self.model_kwargs = truncate_model_kwargs(self.model_kwargs, self.num_tokens - valid_length)
+        self.num_tokens = valid_length
+        self._reference_cache = None
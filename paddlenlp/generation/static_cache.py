@@ -0,0 +1,197 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import paddle
+from paddle.common_ops_import import convert_dtype
+
+from paddlenlp.transformers.utils import get_scale_by_dtype
+
+__all__ = ["StaticKVCacheLayer", "StaticDecodingBuffers"]
+
+
+class StaticKVCacheLayer:
+    """
+    The key/value cache of one attention layer, which is allocated once with `max_length` and written in place by
+    step index instead of being concatenated at every decoding step. The attention attends over the whole buffer, and
+    the positions not written yet are masked out by the attention mask of `StaticDecodingBuffers`.
+
+    Args:
+        key (Tensor): The key cache of the prompt, with shape `[batch_size, seq_len, num_heads, head_dim]`.
+        value (Tensor): The value cache of the prompt, with the same layout as `key`.
+        max_length (int): The max length of the whole sequence, including the prompt.
+    """
+
+    def __init__(self, key: paddle.Tensor, value: paddle.Tensor, max_length: int):
+        batch_size, seq_length = key.shape[:2]
+        self.max_length = max_length
+        self.key_cache = paddle.zeros([batch_size, max_length] + key.shape[2:], dtype=key.dtype)
+        self.value_cache = paddle.zeros([batch_size, max_length] + value.shape[2:], dtype=value.dtype)
+        self.key_cache[:, :seq_length] = key
+        self.value_cache[:, :seq_length] = value
+        self.seq_length = seq_length
+
+    def update(self, key_states: paddle.Tensor, value_states: paddle.Tensor):
+        """write the key/value states of the new tokens at the current step, return the whole key/value buffers"""
+        start, end = self.seq_length, self.seq_length + key_states.shape[1]
+        if end > self.max_length:
+            raise ValueError(
+                f"The length of sequence ({end}) exceeds the max length of the static cache ({self.max_length})."
+            )
+        self.key_cache[:, start:end] = key_states
+        self.value_cache[:, start:end] = value_states
+        self.seq_length = end
+        return self.key_cache, self.value_cache
+
+    def __getitem__(self, index):
+        # keep compatible with the `(key, value)` tuple cache
+        return (self.key_cache, self.value_cache)[index][:, : self.seq_length]
+
+    def __len__(self):
+        return 2
+
+
+class StaticDecodingBuffers:
+    """
+    The static cache mode of `GenerationMixin.greedy_search` and `GenerationMixin.sample`: the output token buffer,
+    the attention mask, the 2-D id inputs (`position_ids`, `token_type_ids`, `role_ids`) and, for the models which
+    support it, the per-layer key/value cache are allocated once with `max_length` and written in place by step index.
+
+    With the key/value cache, the model attends over the whole cache buffer with the whole 2-D attention mask buffer,
+    whose positions not written yet are 0, and takes the id inputs of the current token only, so that no step copies
+    the inputs of the whole sequence.
+
+    Args:
+        model (GenerationMixin): The model to run the generation.
+        input_ids (Tensor): The prompt ids with shape `[batch_size, seq_len]`.
+        max_length (int): The max length of the whole sequence, including the prompt.
+        pad_token_id (int): The id used to fill the output token buffer.
+        model_kwargs (dict): The model inputs of the first step.
+    """
+
+    def __init__(self, model, input_ids: paddle.Tensor, max_length: int, pad_token_id: int, model_kwargs: dict):
+        if max_length is None:
+            raise ValueError("`max_length` is required by the static cache mode.")
+        batch_size, self.cur_len = input_ids.shape
+        self.model = model
+        self.max_length = max(max_length, self.cur_len)
+        self.use_cache = model_kwargs.get("use_cache", True)
+
+        pad_token_id = pad_token_id if pad_token_id is not None else 0
+        self.output_ids = paddle.full([batch_size, self.max_length], pad_token_id, dtype=input_ids.dtype)
+        self.output_ids[:, : self.cur_len] = input_ids
+
+        # the inputs can only be buffered for the models whose `update_model_kwargs_for_generation` has the same
+        # semantics with the one of `GenerationMixin`
+        self.inputs = {}
+        self.static_kv_cache = False
+        if not self._has_standard_update(model):
+            return
+
+        for key in ["position_ids", "token_type_ids", "role_ids"]:
+            value = model_kwargs.get(key, None)
+            if value is not None and len(value.shape) == 2:
+                self.inputs[key] = self._allocate(value, self.max_length, fill_value=0)
+
+        attention_mask = model_kwargs.get("attention_mask", None)
+        if attention_mask is None or model.config.is_encoder_decoder:
+            return
+        if len(attention_mask.shape) == 2:
+            self.inputs["attention_mask"] = self._allocate(attention_mask, self.max_length, fill_value=0)
+            # the unwritten positions of the key/value cache can only be masked out by a 2-D mask
+            self.static_kv_cache = self.use_cache and getattr(model, "_supports_static_cache", False)
+        elif len(attention_mask.shape) == 4 and paddle.get_device().split(":")[0] != "npu":
+            # nn.Pad2D don't support the data type `bool`
+            if convert_dtype(attention_mask.dtype) == "bool":
+                attention_mask = paddle.cast(attention_mask, "int64")
+            dtype = convert_dtype(attention_mask.dtype)
+            if "int" not in dtype and "float" not in dtype:
+                raise ValueError("The data type of input `attention_mask` must " "be bool, int or float")
+            self.attend_value = 1 if "int" in dtype else 0.0
+            self.inputs["attention_mask"] = self._allocate(
+                attention_mask,
+                self.max_length,
+                fill_value=get_scale_by_dtype(return_positive=False),
+            )
+
+    @staticmethod
+    def _has_standard_update(model):
+        from .utils import GenerationMixin
+
+        update_fn = type(model).update_model_kwargs_for_generation
+        return update_fn is GenerationMixin.update_model_kwargs_for_generation or getattr(
+            model, "_supports_static_cache", False
+        )
+
+    @staticmethod
+    def _allocate(value: paddle.Tensor, max_length: int, fill_value):
+        length = value.shape[-1]
+        if len(value.shape) == 4:
+            # the mask grows one row and one column at every step
+            num_rows = value.shape[2]
+            shape = value.shape[:2] + [num_rows + max_length - length, max_length]
+            buffer = paddle.full(shape, fill_value, dtype=value.dtype)
+            buffer[:, :, :num_rows, :length] = value
+        else:
+            buffer = paddle.full(value.shape[:-1] + [max_length], fill_value, dtype=value.dtype)
+            buffer[..., :length] = value
+        return buffer
+
+    def append(self, next_tokens: paddle.Tensor) -> paddle.Tensor:
+        """write the tokens of the current step, return the ids of the whole sequence"""
+        self.output_ids[:, self.cur_len : self.cur_len + 1] = next_tokens
+        self.cur_len += 1
+        return self.output_ids[:, : self.cur_len]
+
+    def _step_inputs(self, model_kwargs: dict):
+        cur = self.cur_len - 1
+        for key, buffer in self.inputs.items():
+            if key == "position_ids":
+                buffer[:, cur] = buffer[:, cur - 1] + 1
+            elif key in ["token_type_ids", "role_ids"]:
+                buffer[:, cur] = buffer[:, cur - 1]
+            elif len(buffer.shape) == 2:
+                buffer[:, cur] = 1
+                if self.static_kv_cache:
+                    model_kwargs[key] = buffer
+                    continue
+            else:
+                # the new row attends to what the last row does and itself
+                row = cur - (buffer.shape[3] - buffer.shape[2])
+                buffer[:, :, row, :cur] = buffer[:, :, row - 1, :cur]
+                buffer[:, :, row, cur] = self.attend_value
+                model_kwargs[key] = buffer[:, :, : row + 1, : cur + 1]
+                continue
+            model_kwargs[key] = buffer[:, cur : cur + 1] if self.static_kv_cache else buffer[:, : cur + 1]
+
+    def update_model_kwargs(self, outputs, model_kwargs: dict) -> dict:
+        """the static cache version of `update_model_kwargs_for_generation`, which should be called after `append`"""
+        # the buffered inputs are skipped by `update_model_kwargs_for_generation`
+        for key in self.inputs:
+            model_kwargs.pop(key, None)
+        model_kwargs = self.model.update_model_kwargs_for_generation(
+            outputs, model_kwargs, is_encoder_decoder=self.model.config.is_encoder_decoder
+        )
+        self._step_inputs(model_kwargs)
+
+        past_key_values = model_kwargs.get("past_key_values", None)
+        if (
+            self.static_kv_cache
+            and past_key_values is not None
+            and not isinstance(past_key_values[0], StaticKVCacheLayer)
+        ):
+            model_kwargs["past_key_values"] = tuple(
+                StaticKVCacheLayer(key, value, self.max_length) for key, value in past_key_values
+            )
+        return model_kwargs
@@ -15,6 +15,9 @@
 from queue import Queue
 from typing import Optional
 
+import numpy as np
+import paddle
+
 from paddlenlp.transformers.tokenizer_utils import PretrainedTokenizer
 
 
@@ -214,3 +217,65 @@ class TextIteratorStreamer(TextStreamer):
             raise StopIteration()
         else:
             return value
+
+
+class TokenIteratorStreamer(BaseStreamer):
+    """
+    Streamer that stores the token ids of every decoding step in a queue as NumPy arrays of shape `[batch_size]`,
+    without any file I/O or decoding. It can be consumed as an iterator from another thread while `.generate()` is
+    running, or collected at once with `tokens()` after `.generate()` returns.
+
+    Parameters:
+        skip_prompt (`bool`, *optional*, defaults to `False`):
+            Whether to skip the first `put` call, which is the prompt in `GenerationMixin.generate`.
+        timeout (`float`, *optional*):
+            The timeout for the token queue. If `None`, the queue will block indefinitely.
+
+    Examples:
+
+        ```python
+        >>> from paddlenlp.generation import TokenIteratorStreamer
+
+        >>> streamer = TokenIteratorStreamer()
+        >>> _ = model.generate(**inputs, streamer=streamer)
+        >>> streamer.tokens().shape
+        [batch_size, num_steps]
+        ```
+    """
+
+    def __init__(self, skip_prompt: bool = False, timeout: Optional[float] = None):
+        self.skip_prompt = skip_prompt
+        self.timeout = timeout
+        self.token_queue = Queue()
+        self.stop_signal = None
+        self.next_tokens_are_prompt = True
+
+    def put(self, value):
+        """Put the token ids of one step into the queue."""
+        if self.skip_prompt and self.next_tokens_are_prompt:
+            self.next_tokens_are_prompt = False
+            return
+        if paddle.is_tensor(value):
+            value = value.numpy()
+        self.token_queue.put(np.asarray(value).reshape([-1]), timeout=self.timeout)
+
+    def end(self):
+        """Put a stop signal in the queue."""
+        self.next_tokens_are_prompt = True
+        self.token_queue.put(self.stop_signal, timeout=self.timeout)
+
+    def tokens(self) -> np.ndarray:
+        """Block until the generation ends, return the token ids of all steps with shape `[batch_size, num_steps]`."""
+        steps = list(self)
+        if len(steps) == 0:
+            return np.zeros([0, 0], dtype="int64")
+        return np.stack(steps, axis=1)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self.token_queue.get(timeout=self.timeout)
+        if value is self.stop_signal:
+            raise StopIteration()
+        return value
@@ -47,6 +47,17 @@ from .stopping_criteria import (
     StoppingCriteriaList,
     validate_stopping_criteria,
 )
+from .speculative import (
+    DraftModelProposer,
+    PromptLookupProposer,
+    crop_cache,
+    extend_model_kwargs,
+    get_cache,
+    set_cache,
+    speculative_forward,
+    truncate_model_kwargs,
+)
+from .static_cache import StaticDecodingBuffers
 from .streamers import BaseStreamer
 
 if is_paddlenlp_ops_available():
@@ -333,6 +344,10 @@ class GenerationMixin(object):
     """
     # enable `to_static` method for CausalLM Model
     enable_to_static_method = False
+    # whether the attention layers accept `StaticKVCacheLayer` as `past_key_value`, which is used by the static cache
+    # mode of `greedy_search` and `sample`. The model attends over the whole cache buffer with the 2-D attention mask
+    # of `max_length`, and takes the position ids of the current token only.
+    _supports_static_cache = False
 
     @staticmethod
     def prepare_input_ids_for_generation(bos_token_id, encoder_output=None):
@@ -611,8 +626,9 @@ class GenerationMixin(object):
     ):
         r"""
         The interface for generation task. This method can generate sequences
-        by using decoding strategy. Currently, there are three decoding
-        strategies supported: "greedy_search", "sampling" and "beam_search".
+        by using decoding strategy. Currently, there are four decoding
+        strategies supported: "greedy_search", "sampling", "beam_search" and
+        "speculative".
 
         Args:
             input_ids (Tensor, optional): The input sequence ids for the
@@ -635,7 +651,9 @@ class GenerationMixin(object):
                 Streamer object that will be used to stream the generated sequences. Generated tokens are passed
                 through `streamer.put(token_ids)` and the streamer is responsible for any further processing.
             kwargs (dict): It can be used to specify additional kwargs
-                passed to the model.
+                passed to the model. `draft_model` (`PretrainedModel`) in it is
+                used to propose the draft tokens in the "speculative" strategy,
+                which looks up the n-grams of the prompt instead if not given.
 
         Returns:
             tuple[Tensor]: It is a tuple contains two elements: ids and scores.
@@ -749,9 +767,12 @@ class GenerationMixin(object):
             "greedy_search",
             "sampling",
             "beam_search",
-        ], "`decode_strategy` must be one of 'greedy_search', 'sampling' or 'beam_search' but received {}.".format(
-            generation_config.decode_strategy
+            "speculative",
+        ], (
+            "`decode_strategy` must be one of 'greedy_search', 'sampling', 'beam_search' or 'speculative' "
+            "but received {}.".format(generation_config.decode_strategy)
         )
+        draft_model = model_kwargs.pop("draft_model", None)
 
         if getattr(self, "deprecated_warnings", None) is None:
             self.deprecated_warnings = {}
@@ -929,6 +950,8 @@ class GenerationMixin(object):
                 eos_token_id,
                 stopping_criteria=stopping_criteria,
                 streamer=streamer,
+                use_static_cache=generation_config.use_static_cache,
+                drop_finished_sequences=generation_config.drop_finished_sequences,
                 **model_kwargs,
             )
 
@@ -949,6 +972,37 @@ class GenerationMixin(object):
                 generation_config.temperature,
                 stopping_criteria=stopping_criteria,
                 streamer=streamer,
+                use_static_cache=generation_config.use_static_cache,
+                drop_finished_sequences=generation_config.drop_finished_sequences,
+                **model_kwargs,
+            )
+
+        elif generation_config.decode_strategy == "speculative":
+            if generation_config.num_return_sequences > 1:
+                if not generation_config.do_sample:
+                    raise ValueError(
+                        "`num_return_sequences` has to be 1, but is {} "
+                        "when doing greedy speculative decoding.".format(generation_config.num_return_sequences)
+                    )
+                input_ids, model_kwargs = self.expand_inputs_for_generation(
+                    input_ids, expand_size=generation_config.num_return_sequences, **model_kwargs
+                )
+
+            return self.speculative_decoding(
+                input_ids,
+                logits_processors,
+                max_len,
+                pad_token_id,
+                eos_token_id,
+                draft_model=draft_model,
+                num_speculative_tokens=generation_config.num_speculative_tokens,
+                prompt_lookup_ngram_size=generation_config.prompt_lookup_ngram_size,
+                do_sample=generation_config.do_sample,
+                top_k=generation_config.top_k,
+                top_p=generation_config.top_p,
+                temperature=generation_config.temperature,
+                stopping_criteria=stopping_criteria,
+                streamer=streamer,
                 **model_kwargs,
             )
 
@@ -1015,6 +1069,7 @@ class GenerationMixin(object):
                     pad_token_id,
                     eos_token_id,
                     stopping_criteria=stopping_criteria,
+                    drop_finished_sequences=generation_config.drop_finished_sequences,
                     **model_kwargs,
                 )
 
@@ -1027,6 +1082,8 @@ class GenerationMixin(object):
         eos_token_id,
         stopping_criteria=None,
         streamer=None,
+        use_static_cache=False,
+        drop_finished_sequences=False,
         **model_kwargs
     ):
         model_kwargs["use_cache"] = model_kwargs.get("use_cache", True)
@@ -1045,11 +1102,20 @@ class GenerationMixin(object):
         origin_len = cur_len
         unfinished_flag = paddle.full([batch_size, 1], True, dtype="bool")
         scores = paddle.full([batch_size, 1], 0.0, dtype=paddle.get_default_dtype())
+        # the buffers are written in place by step index instead of being concatenated
+        static_buffers = None
+        if use_static_cache:
+            static_buffers = StaticDecodingBuffers(self, input_ids, max_length, pad_token_id, model_kwargs)
+        # the rows whose model forward is still running, None means all rows
+        active_rows = None
+        # the finished rows are kept in the preallocated buffers of the static cache mode
+        drop_finished_sequences = drop_finished_sequences and eos_token_id is not None and static_buffers is None
         generate_end = False
         while True:
 
             # prepare model inputs & get model output
-            model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+            model_input_ids = input_ids if active_rows is None else paddle.index_select(input_ids, active_rows)
+            model_inputs = self.prepare_inputs_for_generation(model_input_ids, **model_kwargs)
 
             outputs = self(**model_inputs)
 
@@ -1061,7 +1127,7 @@ class GenerationMixin(object):
                 logits = outputs
 
             # [batch_size, vocab_size]
-            next_token_logits = logits[:, -1, :]
+            next_token_logits = self._scatter_active_logits(logits[:, -1, :], active_rows, batch_size)
 
             # pre-process distribution
             next_token_logits = self.adjust_logits_during_generation(next_token_logits)
@@ -1078,7 +1144,10 @@ class GenerationMixin(object):
             scores = self.update_scores_for_generation(scores, next_scores, cur_len - origin_len, unfinished_flag)
             cur_len += 1
 
-            input_ids = paddle.concat([input_ids, next_tokens], axis=1)
+            if static_buffers is not None:
+                input_ids = static_buffers.append(next_tokens)
+            else:
+                input_ids = paddle.concat([input_ids, next_tokens], axis=1)
             if streamer is not None:
                 streamer.put(next_tokens.cpu())
 
@@ -1092,9 +1161,14 @@ class GenerationMixin(object):
             if not paddle.any(unfinished_flag) or generate_end:
                 break
 
-            model_kwargs = self.update_model_kwargs_for_generation(
-                outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
-            )
+            if static_buffers is not None:
+                model_kwargs = static_buffers.update_model_kwargs(outputs, model_kwargs)
+            else:
+                model_kwargs = self.update_model_kwargs_for_generation(
+                    outputs, model_kwargs, is_encoder_decoder=self.config.is_encoder_decoder
+                )
+            if drop_finished_sequences:
+                active_rows, model_kwargs = self._drop_finished_rows(unfinished_flag, active_rows, model_kwargs)
 
         if streamer is not None:
             streamer.end()
@@ -1114,6 +1188,8 @@ class GenerationMixin(object):
         min_tokens_to_keep=1,
         stopping_criteria=None,
         streamer=None,
+        use_static_cache=False,
+        drop_finished_sequences=False,
         **model_kwargs
     ):
         model_kwargs["use_cache"] = model_kwargs.get("use_cache", True)
@@ -1133,11 +1209,20 @@ class GenerationMixin(object):
         origin_len = cur_len
         unfinished_flag = paddle.full([batch_size, 1], True, dtype="bool")
         scores = paddle.full([batch_size, 1], 0.0, dtype=paddle.get_default_dtype())
+        # the buffers are written in place by step index instead of being concatenated
+        static_buffers = None
+        if use_static_cache:
+            static_buffers = StaticDecodingBuffers(self, input_ids, max_length, pad_token_id, model_kwargs)
+        # the rows whose model forward is still running, None means all rows
+        active_rows = None
+        # the finished rows are kept in the preallocated buffers of the static cache mode
+        drop_finished_sequences = drop_finished_sequences and eos_token_id is not None and static_buffers is None
 
         generate_end = False
         while True:
             # prepare model inputs & get model output
-            model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+            model_input_ids = input_ids if active_rows is None else paddle.index_select(input_ids, active_rows)
+            model_inputs = self.prepare_inputs_for_generation(model_input_ids, **model_kwargs)
             outputs = self(**model_inputs)
 
             if isinstance(outputs, tuple):
@@ -1148,7 +1233,7 @@ class GenerationMixin(object):
                 logits = outputs
 
             # [batch_size, vocab_size]
-            logits = logits[:, -1, :]
+            logits = self._scatter_active_logits(logits[:, -1, :], active_rows, batch_size)
 
             # pre-process distribution
             logits = self.adjust_logits_during_generation(logits)
@@ -1183,7 +1268,10 @@ class GenerationMixin(object):
             scores = self.update_scores_for_generation(scores, next_scores, cur_len - origin_len, unfinished_flag)
 
             cur_len += 1
-            input_ids = paddle.concat([input_ids, next_tokens], axis=1)
+            if static_buffers is not None:
+                input_ids = static_buffers.append(next_tokens)
+            else:
+                input_ids = paddle.concat([input_ids, next_tokens], axis=1)
             if streamer is not None:
                 streamer.put(next_tokens.cpu())
 
@@ -1197,9 +1285,200 @@ class GenerationMixin(object):
             if not paddle.any(unfinished_flag) or generate_end:
                 break
 
-            model_kwargs = self.update_model_kwargs_for_generation(
-                outputs, model_kwargs, is_encoder_decoder=self.is_encoder_decoder
+            if static_buffers is not None:
+                model_kwargs = static_buffers.update_model_kwargs(outputs, model_kwargs)
+            else:
+                model_kwargs = self.update_model_kwargs_for_generation(
+                    outputs, model_kwargs, is_encoder_decoder=self.is_encoder_decoder
+                )
+            if drop_finished_sequences:
+                active_rows, model_kwargs = self._drop_finished_rows(unfinished_flag, active_rows, model_kwargs)
+
+        if streamer is not None:
+            streamer.end()
+
+        return input_ids[:, origin_len:], scores
+
+    def speculative_decoding(
+        self,
+        input_ids,
+        logits_processors,
+        max_length,
+        pad_token_id,
+        eos_token_id,
+        draft_model=None,
+        num_speculative_tokens=5,
+        prompt_lookup_ngram_size=3,
+        do_sample=False,
+        top_k=None,
+        top_p=None,
+        temperature=None,
+        min_tokens_to_keep=1,
+        stopping_criteria=None,
+        streamer=None,
+        **model_kwargs
+    ):
+        """
+        Speculative decoding: the draft tokens proposed by `draft_model` (or by looking up the n-grams of the
+        sequence) are verified with one forward of this model, and the longest prefix of them which agrees with this
+        model is accepted. The draft tokens are accepted by comparing with the greedy tokens when `do_sample` is
+        False, otherwise by speculative sampling, so that the outputs follow the same distribution as `sample`.
+        """
+        if self.config.is_encoder_decoder:
+            raise ValueError("Speculative decoding only supports the decoder-only models.")
+        model_kwargs["use_cache"] = True
+        logits_processors = logits_processors if logits_processors is not None else LogitsProcessorList()
+
+        # max_length will be convert to MaxLengthCriteria
+        stopping_criteria = stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+        if max_length is not None:
+            stopping_criteria = validate_stopping_criteria(stopping_criteria, max_length)
+
+        if draft_model is not None:
+            proposer = DraftModelProposer(draft_model, input_ids, model_kwargs)
+        else:
+            proposer = PromptLookupProposer(prompt_lookup_ngram_size)
+
+        def warp(ids, logits):
+            # return the distribution to select the next token from and the log probs used as scores
+            logits = self.adjust_logits_during_generation(logits)
+            logits = logits_processors(ids, logits)
+            log_probs = paddle.log(F.softmax(logits.astype("float32")))
+            if do_sample and temperature is not None and temperature != 1.0:
+                logits = logits / temperature
+            probs = F.softmax(logits.astype("float32"))
+            if do_sample and top_k is not None and top_k != 0:
+                probs = TopKProcess(probs, top_k, min_tokens_to_keep)
+            if do_sample and top_p is not None and top_p < 1.0:
+                probs = TopPProcess(probs, top_p, min_tokens_to_keep)
+            return probs, log_probs
+
+        def choose(probs):
+            if not do_sample:
+                return paddle.argmax(probs, axis=-1).unsqueeze(-1)
+            next_tokens = paddle.multinomial(probs)
+            if self.config.tensor_parallel_degree > 1:
+                paddle.distributed.broadcast(next_tokens, 0)
+            return next_tokens
+
+        def select_draft(ids, logits):
+            probs, _ = warp(ids, logits)
+            vocab_size = self.config.vocab_size
+            if probs.shape[-1] > vocab_size:
+                probs = probs[:, :vocab_size]
+            elif probs.shape[-1] < vocab_size:
+                padding = paddle.zeros([probs.shape[0], vocab_size - probs.shape[-1]], dtype=probs.dtype)
+                probs = paddle.concat([probs, padding], axis=-1)
+            return choose(probs), probs if do_sample else None
+
+        batch_size, cur_len = input_ids.shape
+        origin_len = cur_len
+        unfinished_flag = paddle.full([batch_size, 1], True, dtype="bool")
+        scores = paddle.full([batch_size, 1], 0.0, dtype=paddle.get_default_dtype())
+        # the number of tokens in the cache of this model
+        cache_length = 0
+        generate_end = False
+        while True:
+            # the first step only fills the cache of the prompt
+            num_drafts = min(num_speculative_tokens, max_length - cur_len - 1) if cache_length > 0 else 0
+            if num_drafts > 0:
+                draft_tokens, draft_probs = proposer.propose(input_ids, num_drafts, select_draft)
+                num_drafts = draft_tokens.shape[1]
+            if num_drafts > 0:
+                candidate_ids = paddle.concat([input_ids, draft_tokens], axis=1)
+                model_kwargs = extend_model_kwargs(self, model_kwargs, num_drafts)
+            else:
+                candidate_ids = input_ids
+
+            # verify all the draft tokens with one forward
+            reference_cache = get_cache(model_kwargs)
+            outputs, logits = speculative_forward(
+                self, candidate_ids, candidate_ids.shape[1] - cache_length, model_kwargs
             )
+            probs, log_probs = [], []
+            for i in range(num_drafts + 1):
+                step_probs, step_log_probs = warp(candidate_ids[:, : cur_len + i], logits[:, i - num_drafts - 1, :])
+                probs.append(step_probs)
+                log_probs.append(step_log_probs)
+            probs = paddle.stack(probs, axis=1)
+
+            # accept the longest prefix of the draft tokens, the batch keeps the shortest one of all the sequences
+            if num_drafts > 0:
+                if do_sample:
+                    target_probs = paddle.take_along_axis(probs[:, :-1], draft_tokens.unsqueeze(-1), axis=-1)
+                    if draft_probs is None:
+                        accepted = paddle.rand(target_probs.shape) < target_probs
+                    else:
+                        proposal_probs = paddle.take_along_axis(draft_probs, draft_tokens.unsqueeze(-1), axis=-1)
+                        accepted = paddle.rand(target_probs.shape) * proposal_probs < target_probs
+                    accepted = accepted.squeeze(-1)
+                    if self.config.tensor_parallel_degree > 1:
+                        accepted = accepted.astype("int32")
+                        paddle.distributed.broadcast(accepted, 0)
+                else:
+                    accepted = draft_tokens == paddle.argmax(probs[:, :-1], axis=-1)
+                num_accepted = paddle.cumprod(accepted.astype("int32"), dim=1).sum(axis=1, keepdim=True)
+                num_accepted_tokens = int(num_accepted.min())
+            else:
+                num_accepted_tokens = 0
+
+            next_probs = probs[:, num_accepted_tokens]
+            if do_sample and num_accepted_tokens < num_drafts:
+                # sample from the residual distribution where the draft token is rejected
+                if draft_probs is None:
+                    rejected_probs = F.one_hot(draft_tokens[:, num_accepted_tokens], next_probs.shape[-1])
+                else:
+                    rejected_probs = draft_probs[:, num_accepted_tokens]
+                residual_probs = paddle.clip(next_probs - rejected_probs, min=0.0)
+                residual_sum = residual_probs.sum(axis=-1, keepdim=True)
+                next_probs = paddle.where(
+                    residual_sum > 0, residual_probs / paddle.clip(residual_sum, min=1e-12), next_probs
+                )
+            last_tokens = choose(next_probs)
+            if num_accepted_tokens < num_drafts:
+                last_tokens = paddle.where(
+                    num_accepted > num_accepted_tokens,
+                    draft_tokens[:, num_accepted_tokens : num_accepted_tokens + 1],
+                    last_tokens,
+                )
+            new_tokens = [draft_tokens[:, i : i + 1] for i in range(num_accepted_tokens)] + [last_tokens]
+
+            for i, next_tokens in enumerate(new_tokens):
+                next_scores = paddle.index_sample(log_probs[i], next_tokens)
+
+                if eos_token_id is not None:
+                    next_tokens = paddle.where(
+                        unfinished_flag, next_tokens, paddle.full_like(next_tokens, pad_token_id)
+                    )
+
+                scores = self.update_scores_for_generation(scores, next_scores, cur_len - origin_len, unfinished_flag)
+                cur_len += 1
+
+                input_ids = paddle.concat([input_ids, next_tokens], axis=1)
+                if streamer is not None:
+                    streamer.put(next_tokens.cpu())
+
+                if stopping_criteria(input_ids, scores):
+                    generate_end = True
+
+                if eos_token_id is not None:
+                    unfinished_flag = get_unfinished_flag(input_ids, unfinished_flag, eos_token_id)
+
+                # Stop when there is a </s> in all sentences
+                if not paddle.any(unfinished_flag) or generate_end:
+                    break
+
+            if not paddle.any(unfinished_flag) or generate_end:
+                break
+
+            # roll back the cache and the model inputs of the rejected draft tokens
+            model_kwargs = self.update_model_kwargs_for_generation(outputs, model_kwargs, is_encoder_decoder=False)
+            num_rejected = num_drafts - num_accepted_tokens
+            set_cache(model_kwargs, crop_cache(get_cache(model_kwargs), reference_cache, num_rejected))
+            model_kwargs = truncate_model_kwargs(model_kwargs, num_rejected)
+            cache_length = cur_len - 1
+            if num_drafts > 0:
+                proposer.accept(num_accepted_tokens)
 
         if streamer is not None:
             streamer.end()
@@ -1419,6 +1698,54 @@ class GenerationMixin(object):
         cache = map_structure(lambda x: paddle.index_select(x, beam_idx), cache)
         return cache
 
+    def gather_model_kwargs_for_generation(self, model_kwargs, index, cache_only=False):
+        # select the rows of `index` from the batch of the cache and the other model inputs
+        gathered = {}
+        for key in ["cache", "past_key_values"]:
+            cache = model_kwargs.get(key, None)
+            if cache is not None:
+                # `cache` and `past_key_values` may be the same object
+                if id(cache) not in gathered:
+                    gathered[id(cache)] = self.reorder_cache(cache, index)
+                model_kwargs[key] = gathered[id(cache)]
+        if cache_only:
+            return model_kwargs
+
+        for key in ["attention_mask", "token_type_ids", "position_ids", "seq_len", "encoder_output", "role_ids"]:
+            if key in model_kwargs and model_kwargs[key] is not None:
+                model_kwargs[key] = paddle.index_select(model_kwargs[key], index)
+        return model_kwargs
+
+    @staticmethod
+    def _local_rows(active_rows, rows, batch_size):
+        # the positions of `rows` in the batch which only keeps `active_rows`
+        if active_rows is None:
+            return rows
+        local_index = paddle.scatter(
+            paddle.full([batch_size], -1, dtype="int64"),
+            active_rows,
+            paddle.arange(active_rows.shape[0], dtype="int64"),
+        )
+        return paddle.gather(local_index, rows)
+
+    @staticmethod
+    def _scatter_active_logits(logits, active_rows, batch_size):
+        # fill the logits of the dropped rows with zeros to keep the batch size
+        if active_rows is None:
+            return logits
+        return paddle.scatter(paddle.zeros([batch_size, logits.shape[-1]], dtype=logits.dtype), active_rows, logits)
+
+    def _drop_finished_rows(self, unfinished_flag, active_rows, model_kwargs):
+        batch_size = unfinished_flag.shape[0]
+        num_active = batch_size if active_rows is None else active_rows.shape[0]
+        rows = paddle.nonzero(unfinished_flag.flatten()).flatten()
+        if rows.shape[0] < num_active:
+            model_kwargs = self.gather_model_kwargs_for_generation(
+                model_kwargs, self._local_rows(active_rows, rows, batch_size)
+            )
+            active_rows = rows
+        return active_rows, model_kwargs
+
     def beam_search(
         self,
         input_ids,
@@ -1429,6 +1756,7 @@ class GenerationMixin(object):
         pad_token_id,
         eos_token_id,
         stopping_criteria=None,
+        drop_finished_sequences=False,
         **model_kwargs
     ):
         model_kwargs["use_cache"] = model_kwargs.get("use_cache", True)
@@ -1460,9 +1788,12 @@ class GenerationMixin(object):
         beam_scores[:, 1:] = get_scale_by_dtype(return_positive=False)
         beam_scores = paddle.reshape(beam_scores, [-1])
 
+        # the rows of the unfinished batches whose model forward is still running, None means all rows
+        active_rows = None
         while True:
             # prepare model inputs & get model output
-            model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
+            model_input_ids = input_ids if active_rows is None else paddle.index_select(input_ids, active_rows)
+            model_inputs = self.prepare_inputs_for_generation(model_input_ids, **model_kwargs)
 
             outputs = self(**model_inputs)
 
@@ -1474,7 +1805,7 @@ class GenerationMixin(object):
                 logits = outputs
 
             # [batch_size, vocab_size]
-            logits = logits[:, -1, :]
+            logits = self._scatter_active_logits(logits[:, -1, :], active_rows, batch_beam_size)
 
             # pre-process distribution
             logits = self.adjust_logits_during_generation(logits)
@@ -1547,6 +1878,19 @@ class GenerationMixin(object):
             model_kwargs = self.update_model_kwargs_for_generation(
                 outputs, model_kwargs, is_encoder_decoder=self.is_encoder_decoder
             )
+            if drop_finished_sequences:
+                # reorder the cache and drop the rows of the finished batches at the same time
+                unfinished_batches = (beam_scorer._done == 0).astype("int64")
+                rows = paddle.nonzero(paddle.repeat_interleave(unfinished_batches, num_beams)).flatten()
+                num_active = batch_beam_size if active_rows is None else active_rows.shape[0]
+                model_kwargs = self.gather_model_kwargs_for_generation(
+                    model_kwargs,
+                    self._local_rows(active_rows, paddle.gather(beam_idx, rows), batch_beam_size),
+                    cache_only=rows.shape[0] == num_active,
+                )
+                active_rows = rows
+                continue
+
             if "cache" in model_kwargs:
                 # reorder the cache
                 model_kwargs["cache"] = self.reorder_cache(model_kwargs["cache"], beam_idx)
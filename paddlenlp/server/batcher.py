@@ -0,0 +1,189 @@
+# coding:utf-8
+# Copyright (c) 2023  PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import collections
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from ..utils.log import logger
+
+# the fields of the request data which hold the input texts, they are concatenated when the requests are coalesced.
+# Only the requests whose input texts are lists are coalesced, since a single text is usually unwrapped in the output.
+BATCH_FIELDS = ["text", "text_pair"]
+
+
+class _BatchItem:
+    def __init__(self, data, parameters):
+        self.data = data
+        self.parameters = parameters
+        self.future = Future()
+        self.num_texts, self.key = self._inspect(data, parameters)
+
+    @staticmethod
+    def _inspect(data, parameters):
+        """the number of input texts and the key of the requests which can be coalesced with this one"""
+        if not isinstance(data, dict) or not isinstance(data.get("text", None), list):
+            return 0, None
+        num_texts = len(data["text"])
+        if any(not isinstance(data[k], list) or len(data[k]) != num_texts for k in BATCH_FIELDS if k in data):
+            return num_texts, None
+        try:
+            others = {k: v for k, v in data.items() if k not in BATCH_FIELDS}
+            key = json.dumps([parameters, others, [k for k in BATCH_FIELDS if k in data]], sort_keys=True)
+        except (TypeError, ValueError):
+            return num_texts, None
+        return num_texts, key if num_texts > 0 else None
+
+    def compatible(self, other):
+        return self.key is not None and self.key == other.key
+
+
+def _merge_data(items):
+    data = dict(items[0].data)
+    for field in BATCH_FIELDS:
+        if field not in data:
+            continue
+        data[field] = [value for item in items for value in item.data[field]]
+    return data
+
+
+def _split_output(output, counts):
+    """
+    split the output of the coalesced requests by the number of texts of every request, return None if any part of
+    the output can not be attributed to a single request
+    """
+    total = sum(counts)
+    offsets = [sum(counts[:i]) for i in range(len(counts) + 1)]
+    if isinstance(output, list) and len(output) == total:
+        return [output[offsets[i] : offsets[i + 1]] for i in range(len(counts))]
+    if isinstance(output, dict) and len(output) > 0:
+        if any(not isinstance(v, list) or len(v) != total for v in output.values()):
+            return None
+        return [{k: v[offsets[i] : offsets[i + 1]] for k, v in output.items()} for i in range(len(counts))]
+    return None
+
+
+class DynamicBatcher:
+    """
+    Coalesce the concurrent requests into batches and run them on a group of workers (predictors or taskflows).
+
+    The requests with the same parameters and a list of input texts are merged by concatenating their input texts,
+    at most `max_batch_size` texts in one batch. A worker waits at most `max_wait_time` seconds for more requests
+    after it takes the first one. Every worker runs in its own thread and takes the next batch as soon as it is idle,
+    so the batches always go to the least loaded worker. The output of the batch is split back by the number of texts
+    of every request. If any part of the output can not be split, the requests of the batch are run one by one and
+    the batcher stops coalescing the requests.
+
+    Args:
+        workers (list): The predictors or taskflows, each of them runs one batch at a time.
+        run_fn (Callable): Called as `run_fn(worker, data, parameters)` to run one batch.
+        max_batch_size (int, optional): The max number of texts in one batch.
+        max_wait_time (float, optional): The max seconds to wait for more requests to fill a batch.
+        coalesce (bool, optional): Whether the output of `run_fn` has one result per input text, so that the requests
+            can be coalesced. Otherwise every request runs alone.
+    """
+
+    def __init__(self, workers, run_fn, max_batch_size=32, max_wait_time=0.005, coalesce=True):
+        self._run_fn = run_fn
+        self._coalesce = coalesce
+        self._max_batch_size = max_batch_size
+        self._max_wait_time = max_wait_time
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        for index, worker in enumerate(workers):
+            thread = threading.Thread(target=self._loop, args=(worker,), name=f"batcher-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, data, parameters):
+        """submit the request and return the `concurrent.futures.Future` of its result"""
+        item = _BatchItem(data, parameters)
+        with self._cond:
+            self._queue.append(item)
+            self._cond.notify_all()
+        return item.future
+
+    def predict(self, data, parameters):
+        return self.submit(data, parameters).result()
+
+    async def async_predict(self, data, parameters):
+        return await asyncio.wrap_future(self.submit(data, parameters))
+
+    def _take_compatible(self, batch, num_texts):
+        for item in list(self._queue):
+            if num_texts >= self._max_batch_size:
+                break
+            if batch[0].compatible(item) and num_texts + item.num_texts <= self._max_batch_size:
+                self._queue.remove(item)
+                batch.append(item)
+                num_texts += item.num_texts
+        return num_texts
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = [self._queue.popleft()]
+            if batch[0].key is None or not self._coalesce:
+                return batch
+
+            num_texts = self._take_compatible(batch, batch[0].num_texts)
+            deadline = time.time() + self._max_wait_time
+            while num_texts < self._max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                num_texts = self._take_compatible(batch, num_texts)
+            return batch
+
+    def _run_one(self, worker, item):
+        try:
+            item.future.set_result(self._run_fn(worker, item.data, item.parameters))
+        except Exception as e:
+            item.future.set_exception(e)
+
+    def _loop(self, worker):
+        while True:
+            batch = self._next_batch()
+            if len(batch) == 1:
+                self._run_one(worker, batch[0])
+                continue
+
+            try:
+                output = self._run_fn(worker, _merge_data(batch), batch[0].parameters)
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            results = _split_output(output, [item.num_texts for item in batch])
+            if results is None:
+                # the requests are never coalesced again, so that no more work is run twice
+                if self._coalesce:
+                    self._coalesce = False
+                    logger.warning(
+                        "The output of the coalesced requests can not be split, run them one by one and stop "
+                        "coalescing the requests."
+                    )
+                for item in batch:
+                    self._run_one(worker, item)
+                continue
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
@@ -27,6 +27,10 @@ class BaseModelHandler(metaclass=ABCMeta):
 
 
 class BasePostHandler(metaclass=ABCMeta):
+    # whether every field of the output is a list with one result per input text, so that the concurrent requests
+    # can be coalesced into one batch and their outputs split back
+    per_text_output = False
+
     def __init__(self):
         super().__init__()
 
@@ -37,6 +41,9 @@ class BasePostHandler(metaclass=ABCMeta):
 
 
 class BaseTaskflowHandler(metaclass=ABCMeta):
+    # whether the output is a list with one result per input text, see `BasePostHandler.per_text_output`
+    per_text_output = False
+
     def __init__(self):
         super().__init__()
 
@@ -18,6 +18,8 @@ from .base_handler import BasePostHandler
 
 
 class MultiClassificationPostHandler(BasePostHandler):
+    per_text_output = True
+
     def __init__(self):
         super().__init__()
 
@@ -39,6 +41,8 @@ class MultiClassificationPostHandler(BasePostHandler):
 
 
 class MultiLabelClassificationPostHandler(BasePostHandler):
+    per_text_output = True
+
     def __init__(self):
         super().__init__()
 
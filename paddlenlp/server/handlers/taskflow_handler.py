@@ -16,6 +16,8 @@ from .base_handler import BaseTaskflowHandler
 
 
 class TaskflowHandler(BaseTaskflowHandler):
+    per_text_output = True
+
     def __init__(self):
         self._name = "taskflow_handler"
 
@@ -57,8 +57,9 @@ class HttpRouterManager(BaseRouterManager):
         )
 
         # Template predict endpoint function to dynamically serve different models
-        def predict(request: Request, inference_request: req_model):
-            result = self._app._model_manager.predict(inference_request.data, inference_request.parameters)
+        async def predict(request: Request, inference_request: req_model):
+            # the model runs in the threads of the batcher, which does not block the event loop
+            result = await self._app._model_manager.async_predict(inference_request.data, inference_request.parameters)
             return {"result": result}
 
         # Register the route and add to the app
@@ -100,8 +101,11 @@ class HttpRouterManager(BaseRouterManager):
         )
 
         # Template predict endpoint function to dynamically serve different models
-        def predict(request: Request, inference_request: req_model):
-            result = self._app._taskflow_manager.predict(inference_request.data, inference_request.parameters)
+        async def predict(request: Request, inference_request: req_model):
+            # the taskflow runs in the threads of the batcher, which does not block the event loop
+            result = await self._app._taskflow_manager.async_predict(
+                inference_request.data, inference_request.parameters
+            )
             return {"result": result}
 
         # Register the route and add to the app
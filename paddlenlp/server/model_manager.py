@@ -13,18 +13,28 @@
 # see the license for the specific language governing permissions and
 # limitations under the license.
 
-import time
-
 from ..transformers import AutoTokenizer
 from ..utils.log import logger
 from ..utils.tools import get_env_device
+from .batcher import DynamicBatcher
 from .handlers import BaseModelHandler, BasePostHandler
 from .predictor import Predictor
 from .utils import lock_predictor
 
 
 class ModelManager:
-    def __init__(self, task_name, model_path, tokenizer_name, model_handler, post_handler, precision, device_id):
+    def __init__(
+        self,
+        task_name,
+        model_path,
+        tokenizer_name,
+        model_handler,
+        post_handler,
+        precision,
+        device_id,
+        max_batch_size=32,
+        max_wait_time=0.005,
+    ):
         self._task_name = task_name
         self._model_path = model_path
         self._tokenizer_name = tokenizer_name
@@ -34,6 +44,13 @@ class ModelManager:
         self._device_id = device_id
         self._tokenizer = None
         self._register()
+        self._batcher = DynamicBatcher(
+            self._predictor_list,
+            self._run,
+            max_batch_size=max_batch_size,
+            max_wait_time=max_wait_time,
+            coalesce=post_handler.per_text_output,
+        )
 
     def _register(self):
         # Get the model handler
@@ -81,16 +98,14 @@ class ModelManager:
                 logger.error("The argrument of `tokenizer_name`  must be the name of tokenizer.")
         assert self._tokenizer is not None, "The tokenizer must be not register, you could set the class of Tokenizer"
 
-    def _get_predict_id(self):
-        t = time.time()
-        t = int(round(t * 1000))
-        predictor_id = t % len(self._predictor_list)
-        logger.info("The predictor id: {} is selected by running the model.".format(predictor_id))
-        return predictor_id
-
-    def predict(self, data, parameters):
-        predictor_id = self._get_predict_id()
-        with lock_predictor(self._predictor_list[predictor_id]._lock):
-            model_output = self._model_handler(self._predictor_list[predictor_id], self._tokenizer, data, parameters)
+    def _run(self, predictor, data, parameters):
+        with lock_predictor(predictor._lock):
+            model_output = self._model_handler(predictor, self._tokenizer, data, parameters)
             final_output = self._post_handler(model_output, parameters)
             return final_output
+
+    def predict(self, data, parameters):
+        return self._batcher.predict(data, parameters)
+
+    async def async_predict(self, data, parameters):
+        return await self._batcher.async_predict(data, parameters)
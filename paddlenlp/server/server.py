@@ -33,7 +33,16 @@ class SimpleServer(FastAPI):
         self._service_type = None
 
     def register(
-        self, task_name, model_path, tokenizer_name, model_handler, post_handler, precision="fp32", device_id=0
+        self,
+        task_name,
+        model_path,
+        tokenizer_name,
+        model_handler,
+        post_handler,
+        precision="fp32",
+        device_id=0,
+        max_batch_size=32,
+        max_wait_time=0.005,
     ):
         """
         The register function for the SimpleServer, the main register argrument as follows:
@@ -43,16 +52,26 @@ class SimpleServer(FastAPI):
             model_path (str):
             handler(str):
             device (int|list|str, optional):
+            max_batch_size (int, optional): The max number of texts in one batch of the coalesced requests.
+            max_wait_time (float, optional): The max seconds to wait for more requests to fill a batch.
         """
         self._server_type = "models"
         model_manager = ModelManager(
-            task_name, model_path, tokenizer_name, model_handler, post_handler, precision, device_id
+            task_name,
+            model_path,
+            tokenizer_name,
+            model_handler,
+            post_handler,
+            precision,
+            device_id,
+            max_batch_size=max_batch_size,
+            max_wait_time=max_wait_time,
         )
         self._model_manager = model_manager
         # Register transformers model server router
         self._router_manager.register_models_router(task_name)
 
-    def register_taskflow(self, task_name, task, taskflow_handler=None):
+    def register_taskflow(self, task_name, task, taskflow_handler=None, max_batch_size=32, max_wait_time=0.005):
         """
         The register function for the SimpleServer, the main register argrument as follows:
 
@@ -61,6 +80,8 @@ class SimpleServer(FastAPI):
             model_or_path (str):
             handler(str):
             device (int|list|str, optional):
+            max_batch_size (int, optional): The max number of texts in one batch of the coalesced requests.
+            max_wait_time (float, optional): The max seconds to wait for more requests to fill a batch.
         """
         self._server_type = "server"
         check_flag = True
@@ -78,6 +99,6 @@ class SimpleServer(FastAPI):
             )
 
         # Register Taskflow server router
-        taskflow_manager = TaskflowManager(task, taskflow_handler)
+        taskflow_manager = TaskflowManager(task, taskflow_handler, max_batch_size, max_wait_time)
         self._taskflow_manager = taskflow_manager
         self._router_manager.register_taskflow_router(task_name)
@@ -13,10 +13,9 @@
 # see the license for the specific language governing permissions and
 # limitations under the license.
 
-import time
+from .batcher import DynamicBatcher
 from .handlers import TaskflowHandler
 from .utils import lock_predictor
-from ..utils.log import logger
 
 
 class TaskflowManager:
@@ -24,17 +23,25 @@ class TaskflowManager:
     The TaskflowManager could predict the raw text.
     """
 
-    def __init__(self, task, taskflow_handler=None):
+    def __init__(self, task, taskflow_handler=None, max_batch_size=32, max_wait_time=0.005):
         self._task = task
         if taskflow_handler is None:
-            self._handler_func = TaskflowHandler.process
-        else:
-            self._handler_func = taskflow_handler.process
+            taskflow_handler = TaskflowHandler
+        self._handler_func = taskflow_handler.process
+        self._batcher = DynamicBatcher(
+            self._task,
+            self._run,
+            max_batch_size=max_batch_size,
+            max_wait_time=max_wait_time,
+            coalesce=getattr(taskflow_handler, "per_text_output", False),
+        )
+
+    def _run(self, task, data, parameters):
+        with lock_predictor(task._lock):
+            return self._handler_func(task, data, parameters)
 
     def predict(self, data, parameters):
-        t = time.time()
-        t = int(round(t * 1000))
-        task_index = t % len(self._task)
-        logger.info("The predictor id: {} is selected by running the taskflow.".format(task_index))
-        with lock_predictor(self._task[task_index]._lock):
-            return self._handler_func(self._task[task_index], data, parameters)
+        return self._batcher.predict(data, parameters)
+
+    async def async_predict(self, data, parameters):
+        return await self._batcher.async_predict(data, parameters)
@@ -25,7 +25,14 @@ from huggingface_hub import hf_hub_download
 
 from ..datasets import load_dataset
 from ..layers import GlobalPointerForEntityExtraction, GPLinkerForRelationExtraction
-from ..transformers import UIE, UIEM, UIEX, AutoModel, AutoTokenizer
+from ..transformers import (
+    UIE,
+    UIEM,
+    UIEX,
+    AutoModel,
+    AutoTokenizer,
+    PretrainedTokenizer,
+)
 from ..utils.doc_parser import DocParser
 from ..utils.env import CONFIG_NAME, LEGACY_CONFIG_NAME
 from ..utils.ie_utils import map_offset, pad_image_data
@@ -480,6 +487,8 @@ class UIETask(Task):
         self._ocr_lang = kwargs.get("ocr_lang", "ch")
         self._schema_lang = kwargs.get("schema_lang", "ch")
         self._expand_to_a4_size = False if self._custom_model else True
+        # the token ids and offsets of the texts, which are shared by the prompts in one multi-stage prediction
+        self._text_encoding_cache = {}
 
         if self.model in [
             "uie-m-base",
@@ -662,7 +671,7 @@ class UIETask(Task):
         prompts = [d["prompt"] for d in inputs]
 
         # max predict length should exclude the length of prompt and summary tokens
-        max_predict_len = self._max_seq_len - len(max(prompts)) - self._summary_token_num
+        max_predict_len = self._max_seq_len - max(len(prompt) for prompt in prompts) - self._summary_token_num
 
         if self._init_class in ["UIEX"]:
             bbox_list = [d["bbox"] for d in inputs]
@@ -670,9 +679,18 @@ class UIETask(Task):
                 input_texts, max_predict_len, bbox_list=bbox_list, split_sentence=self._split_sentence
             )
         else:
-            short_input_texts, input_mapping = self._auto_splitter(
-                input_texts, max_predict_len, split_sentence=self._split_sentence
+            # the same text is shared by the prompts of the schema nodes, split every distinct text only once
+            text_ids = {}
+            for text in input_texts:
+                text_ids.setdefault(text, len(text_ids))
+            unique_short_texts, unique_mapping = self._auto_splitter(
+                list(text_ids.keys()), max_predict_len, split_sentence=self._split_sentence
             )
+            short_input_texts, input_mapping = [], {}
+            for k, text in enumerate(input_texts):
+                for v in unique_mapping[text_ids[text]]:
+                    input_mapping.setdefault(k, []).append(len(short_input_texts))
+                    short_input_texts.append(unique_short_texts[v])
 
         short_texts_prompts = []
         for k, v in input_mapping.items():
@@ -695,63 +713,6 @@ class UIETask(Task):
                 {"text": short_input_texts[i], "prompt": short_texts_prompts[i]} for i in range(len(short_input_texts))
             ]
 
-        def text_reader(inputs):
-            for example in inputs:
-                if self._dynamic_max_length is not None:
-                    temp_encoded_inputs = self._tokenizer(
-                        text=[example["prompt"]],
-                        text_pair=[example["text"]],
-                        truncation=True,
-                        max_seq_len=self._max_seq_len,
-                        return_attention_mask=True,
-                        return_position_ids=True,
-                        return_dict=False,
-                        return_offsets_mapping=True,
-                    )
-                    max_length = get_dynamic_max_length(
-                        examples=temp_encoded_inputs,
-                        default_max_length=self._max_seq_len,
-                        dynamic_max_length=self._dynamic_max_length,
-                    )
-                    encoded_inputs = self._tokenizer(
-                        text=[example["prompt"]],
-                        text_pair=[example["text"]],
-                        truncation=True,
-                        max_seq_len=max_length,
-                        pad_to_max_seq_len=True,
-                        return_attention_mask=True,
-                        return_position_ids=True,
-                        return_offsets_mapping=True,
-                    )
-                    logger.info("Inference with dynamic max length in {}".format(max_length))
-                else:
-                    encoded_inputs = self._tokenizer(
-                        text=[example["prompt"]],
-                        text_pair=[example["text"]],
-                        truncation=True,
-                        max_seq_len=self._max_seq_len,
-                        pad_to_max_seq_len=True,
-                        return_attention_mask=True,
-                        return_position_ids=True,
-                        return_offsets_mapping=True,
-                    )
-                if self._init_class in ["UIEM"]:
-                    tokenized_output = [
-                        encoded_inputs["input_ids"][0],
-                        encoded_inputs["position_ids"][0],
-                        encoded_inputs["offset_mapping"][0],
-                    ]
-                else:
-                    tokenized_output = [
-                        encoded_inputs["input_ids"][0],
-                        encoded_inputs["token_type_ids"][0],
-                        encoded_inputs["position_ids"][0],
-                        encoded_inputs["attention_mask"][0],
-                        encoded_inputs["offset_mapping"][0],
-                    ]
-                tokenized_output = [np.array(x, dtype="int64") for x in tokenized_output]
-                yield tuple(tokenized_output)
-
         def doc_reader(inputs, pad_id=1, c_sep_id=2):
             def _process_bbox(tokens, bbox_lines, offset_mapping, offset_bias):
                 bbox_list = [[0, 0, 0, 0] for x in range(len(tokens))]
@@ -943,17 +904,101 @@ class UIETask(Task):
                 assert len(bbox_list) == self._max_seq_len
                 yield tuple(return_list)
 
-        reader = doc_reader if self._init_class in ["UIEX"] else text_reader
-        infer_ds = load_dataset(reader, inputs=short_inputs, lazy=self._lazy_load)
-        batch_sampler = paddle.io.BatchSampler(dataset=infer_ds, batch_size=self._batch_size, shuffle=False)
+        if self._init_class in ["UIEX"]:
+            infer_ds = load_dataset(doc_reader, inputs=short_inputs, lazy=self._lazy_load)
+            batch_sampler = paddle.io.BatchSampler(dataset=infer_ds, batch_size=self._batch_size, shuffle=False)
 
-        infer_data_loader = paddle.io.DataLoader(
-            dataset=infer_ds, batch_sampler=batch_sampler, num_workers=self._num_workers, return_list=True
-        )
+            infer_data_loader = paddle.io.DataLoader(
+                dataset=infer_ds, batch_sampler=batch_sampler, num_workers=self._num_workers, return_list=True
+            )
+            batches = ([field.numpy() for field in batch] for batch in infer_data_loader)
+            sentence_ids, probs = self._predict_spans(batches)
+        else:
+            # sort the inputs by length, so that every batch is only padded to the longest input in it
+            encoded_inputs = [self._encode_pair(d["prompt"], d["text"]) for d in short_inputs]
+            order = sorted(range(len(encoded_inputs)), key=lambda i: len(encoded_inputs[i]["input_ids"]))
+            batches = (
+                self._pad_batch([encoded_inputs[i] for i in order[start : start + self._batch_size]])
+                for start in range(0, len(order), self._batch_size)
+            )
+            sorted_sentence_ids, sorted_probs = self._predict_spans(batches)
+            sentence_ids, probs = [None] * len(order), [None] * len(order)
+            for i, sentence_id, prob in zip(order, sorted_sentence_ids, sorted_probs):
+                sentence_ids[i], probs[i] = sentence_id, prob
+        results = self._convert_ids_to_results(short_inputs, sentence_ids, probs)
+        results = self._auto_joiner(results, short_input_texts, input_mapping)
+        return results
 
+    def _encode_text(self, text):
+        """the token ids and offset mapping of the text without special tokens, which are cached"""
+        if text not in self._text_encoding_cache:
+            token_ids = self._tokenizer.convert_tokens_to_ids(self._tokenizer.tokenize(text))
+            self._text_encoding_cache[text] = (token_ids, self._tokenizer.get_offset_mapping(text))
+        return self._text_encoding_cache[text]
+
+    def _encode_pair(self, prompt, text):
+        """
+        Encode the pair `(prompt, text)` without padding. The prompts and the texts are encoded separately with cache
+        and then joined with the special tokens, which is the same as what the (slow) tokenizer does for a pair.
+        """
+        if isinstance(self._tokenizer, PretrainedTokenizer):
+            prompt_ids, prompt_offsets = self._encode_text(prompt)
+            text_ids, text_offsets = self._encode_text(text)
+            num_tokens = len(prompt_ids) + len(text_ids) + self._tokenizer.num_special_tokens_to_add(pair=True)
+            if num_tokens <= self._max_seq_len:
+                input_ids = self._tokenizer.build_inputs_with_special_tokens(prompt_ids, text_ids)
+                return {
+                    "input_ids": input_ids,
+                    "token_type_ids": self._tokenizer.create_token_type_ids_from_sequences(prompt_ids, text_ids),
+                    "position_ids": list(range(len(input_ids))),
+                    "offset_mapping": self._tokenizer.build_offset_mapping_with_special_tokens(
+                        prompt_offsets, text_offsets
+                    ),
+                }
+
+        # the pair needs truncation or the tokenizer is a fast tokenizer
+        encoded_inputs = self._tokenizer(
+            text=[prompt],
+            text_pair=[text],
+            truncation=True,
+            max_seq_len=self._max_seq_len,
+            return_token_type_ids=True,
+            return_position_ids=True,
+            return_offsets_mapping=True,
+        )
+        keys = ["input_ids", "token_type_ids", "position_ids", "offset_mapping"]
+        return {key: encoded_inputs[key][0] for key in keys}
+
+    def _pad_batch(self, encoded_inputs):
+        """pad the encoded pairs to the longest one in the batch (or the next option of `dynamic_max_length`)"""
+        max_length = max(len(encoded["input_ids"]) for encoded in encoded_inputs)
+        if self._dynamic_max_length is not None:
+            options = [option for option in self._dynamic_max_length if option >= max_length]
+            max_length = min(options) if len(options) > 0 else self._max_seq_len
+
+        batch_size = len(encoded_inputs)
+        input_ids = np.full([batch_size, max_length], self._tokenizer.pad_token_id, dtype="int64")
+        token_type_ids = np.full([batch_size, max_length], self._tokenizer.pad_token_type_id, dtype="int64")
+        position_ids = np.zeros([batch_size, max_length], dtype="int64")
+        attention_mask = np.zeros([batch_size, max_length], dtype="int64")
+        offset_maps = np.zeros([batch_size, max_length, 2], dtype="int64")
+        for i, encoded in enumerate(encoded_inputs):
+            length = len(encoded["input_ids"])
+            input_ids[i, :length] = encoded["input_ids"]
+            token_type_ids[i, :length] = encoded["token_type_ids"]
+            position_ids[i, :length] = encoded["position_ids"]
+            attention_mask[i, :length] = 1
+            offset_maps[i, :length] = encoded["offset_mapping"]
+
+        if self._init_class in ["UIEM"]:
+            return [input_ids, position_ids, offset_maps]
+        return [input_ids, token_type_ids, position_ids, attention_mask, offset_maps]
+
+    def _predict_spans(self, batches):
+        """run the model on the batches of numpy inputs, return the predicted spans and probabilities"""
         sentence_ids = []
         probs = []
-        for batch in infer_data_loader:
+        for batch in batches:
             if self._init_class in ["UIEX"]:
                 input_ids, token_type_ids, pos_ids, att_mask, bbox, image, offset_maps = batch
             elif self._init_class in ["UIEM"]:
@@ -962,44 +1007,44 @@ class UIETask(Task):
                 input_ids, token_type_ids, pos_ids, att_mask, offset_maps = batch
             if self._predictor_type == "paddle-inference":
                 if self._init_class in ["UIEX"]:
-                    self.input_handles[0].copy_from_cpu(input_ids.numpy())
-                    self.input_handles[1].copy_from_cpu(token_type_ids.numpy())
-                    self.input_handles[2].copy_from_cpu(pos_ids.numpy())
-                    self.input_handles[3].copy_from_cpu(att_mask.numpy())
-                    self.input_handles[4].copy_from_cpu(bbox.numpy())
-                    self.input_handles[5].copy_from_cpu(image.numpy())
+                    self.input_handles[0].copy_from_cpu(input_ids)
+                    self.input_handles[1].copy_from_cpu(token_type_ids)
+                    self.input_handles[2].copy_from_cpu(pos_ids)
+                    self.input_handles[3].copy_from_cpu(att_mask)
+                    self.input_handles[4].copy_from_cpu(bbox)
+                    self.input_handles[5].copy_from_cpu(image)
                 elif self._init_class in ["UIEM"]:
-                    self.input_handles[0].copy_from_cpu(input_ids.numpy())
-                    self.input_handles[1].copy_from_cpu(pos_ids.numpy())
+                    self.input_handles[0].copy_from_cpu(input_ids)
+                    self.input_handles[1].copy_from_cpu(pos_ids)
                 else:
-                    self.input_handles[0].copy_from_cpu(input_ids.numpy())
-                    self.input_handles[1].copy_from_cpu(token_type_ids.numpy())
-                    self.input_handles[2].copy_from_cpu(pos_ids.numpy())
-                    self.input_handles[3].copy_from_cpu(att_mask.numpy())
+                    self.input_handles[0].copy_from_cpu(input_ids)
+                    self.input_handles[1].copy_from_cpu(token_type_ids)
+                    self.input_handles[2].copy_from_cpu(pos_ids)
+                    self.input_handles[3].copy_from_cpu(att_mask)
                 self.predictor.run()
                 start_prob = self.output_handle[0].copy_to_cpu().tolist()
                 end_prob = self.output_handle[1].copy_to_cpu().tolist()
             else:
                 if self._init_class in ["UIEX"]:
                     input_dict = {
-                        "input_ids": input_ids.numpy(),
-                        "token_type_ids": token_type_ids.numpy(),
-                        "position_ids": pos_ids.numpy(),
-                        "attention_mask": att_mask.numpy(),
-                        "bbox": bbox.numpy(),
-                        "image": image.numpy(),
+                        "input_ids": input_ids,
+                        "token_type_ids": token_type_ids,
+                        "position_ids": pos_ids,
+                        "attention_mask": att_mask,
+                        "bbox": bbox,
+                        "image": image,
                     }
                 elif self._init_class in ["UIEM"]:
                     input_dict = {
-                        "input_ids": input_ids.numpy(),
-                        "position_ids": pos_ids.numpy(),
+                        "input_ids": input_ids,
+                        "position_ids": pos_ids,
                     }
                 else:
                     input_dict = {
-                        "input_ids": input_ids.numpy(),
-                        "token_type_ids": token_type_ids.numpy(),
-                        "position_ids": pos_ids.numpy(),
-                        "attention_mask": att_mask.numpy(),
+                        "input_ids": input_ids,
+                        "token_type_ids": token_type_ids,
+                        "position_ids": pos_ids,
+                        "attention_mask": att_mask,
                     }
                 start_prob, end_prob = self.predictor.run(None, input_dict)
                 start_prob = start_prob.tolist()
@@ -1012,22 +1057,21 @@ class UIETask(Task):
                 sentence_id, prob = get_id_and_prob(span_set, offset_map)
                 sentence_ids.append(sentence_id)
                 probs.append(prob)
-        results = self._convert_ids_to_results(short_inputs, sentence_ids, probs)
-        results = self._auto_joiner(results, short_input_texts, input_mapping)
-        return results
+        return sentence_ids, probs
 
     def _auto_joiner(self, short_results, short_inputs, input_mapping):
         concat_results = []
-        is_cls_task = False
-        for short_result in short_results:
-            if short_result == []:
-                continue
-            elif "start" not in short_result[0].keys() and "end" not in short_result[0].keys():
-                is_cls_task = True
-                break
-            else:
-                break
         for k, vs in input_mapping.items():
+            # the inputs may come from different schema nodes, check the task type of every input
+            is_cls_task = False
+            for v in vs:
+                if short_results[v] == []:
+                    continue
+                elif "start" not in short_results[v][0].keys() and "end" not in short_results[v][0].keys():
+                    is_cls_task = True
+                    break
+                else:
+                    break
             if is_cls_task:
                 cls_options = {}
                 single_results = []
@@ -1115,103 +1159,117 @@ class UIETask(Task):
         # Copy to stay `self._schema_tree` unchanged
         schema_list = self._schema_tree.children[:]
         while len(schema_list) > 0:
-            node = schema_list.pop(0)
-            examples = []
-            input_map = {}
-            cnt = 0
-            idx = 0
-            if not node.prefix:
-                for one_data in data:
-                    examples.append(
-                        {
-                            "text": one_data["text"],
-                            "bbox": one_data["bbox"],
-                            "image": one_data["image"],
-                            "prompt": dbc2sbc(node.name),
-                        }
-                    )
-                    input_map[cnt] = [idx]
-                    idx += 1
-                    cnt += 1
-            else:
-                for pre, one_data in zip(node.prefix, data):
-                    if len(pre) == 0:
-                        input_map[cnt] = []
-                    else:
-                        for p in pre:
-                            if self._is_en:
-                                if re.search(r"\[.*?\]$", node.name):
-                                    prompt_prefix = node.name[: node.name.find("[", 1)].strip()
-                                    cls_options = re.search(r"\[.*?\]$", node.name).group()
-                                    # Sentiment classification of xxx [positive, negative]
-                                    prompt = prompt_prefix + p + " " + cls_options
-                                else:
-                                    prompt = node.name + p
-                            else:
-                                prompt = p + node.name
-                            examples.append(
-                                {
-                                    "text": one_data["text"],
-                                    "bbox": one_data["bbox"],
-                                    "image": one_data["image"],
-                                    "prompt": dbc2sbc(prompt),
-                                }
-                            )
-                        input_map[cnt] = [i + idx for i in range(len(pre))]
-                        idx += len(pre)
-                    cnt += 1
-            if len(examples) == 0:
-                result_list = []
-            else:
-                result_list = self._single_stage_predict(examples)
+            # the nodes at the same level of the schema tree only depend on their parents, predict them in one pass
+            nodes, schema_list = schema_list, []
+            node_inputs = [self._build_stage_examples(node, data) for node in nodes]
+            all_examples = [example for examples, _ in node_inputs for example in examples]
+            all_results = self._single_stage_predict(all_examples) if len(all_examples) > 0 else []
+
+            offset = 0
+            for node, (examples, input_map) in zip(nodes, node_inputs):
+                result_list = all_results[offset : offset + len(examples)]
+                offset += len(examples)
+                self._update_stage_results(node, data, results, result_list, input_map)
+                schema_list.extend(node.children)
+
+        self._text_encoding_cache.clear()
+        results = self._add_bbox_info(results, data)
+        return results
 
-            if not node.parent_relations:
-                relations = [[] for i in range(len(data))]
-                for k, v in input_map.items():
-                    for idx in v:
-                        if len(result_list[idx]) == 0:
-                            continue
-                        if node.name not in results[k].keys():
-                            results[k][node.name] = result_list[idx]
-                        else:
-                            results[k][node.name].extend(result_list[idx])
-                    if node.name in results[k].keys():
-                        relations[k].extend(results[k][node.name])
-            else:
-                relations = node.parent_relations
-                for k, v in input_map.items():
-                    for i in range(len(v)):
-                        if len(result_list[v[i]]) == 0:
-                            continue
-                        if "relations" not in relations[k][i].keys():
-                            relations[k][i]["relations"] = {node.name: result_list[v[i]]}
-                        elif node.name not in relations[k][i]["relations"].keys():
-                            relations[k][i]["relations"][node.name] = result_list[v[i]]
+    def _build_stage_examples(self, node, data):
+        """build the (prompt, text) examples of the schema node, and the mapping from every data to its examples"""
+        examples = []
+        input_map = {}
+        cnt = 0
+        idx = 0
+        if not node.prefix:
+            for one_data in data:
+                examples.append(
+                    {
+                        "text": one_data["text"],
+                        "bbox": one_data["bbox"],
+                        "image": one_data["image"],
+                        "prompt": dbc2sbc(node.name),
+                    }
+                )
+                input_map[cnt] = [idx]
+                idx += 1
+                cnt += 1
+        else:
+            for pre, one_data in zip(node.prefix, data):
+                if len(pre) == 0:
+                    input_map[cnt] = []
+                else:
+                    for p in pre:
+                        if self._is_en:
+                            if re.search(r"\[.*?\]$", node.name):
+                                prompt_prefix = node.name[: node.name.find("[", 1)].strip()
+                                cls_options = re.search(r"\[.*?\]$", node.name).group()
+                                # Sentiment classification of xxx [positive, negative]
+                                prompt = prompt_prefix + p + " " + cls_options
+                            else:
+                                prompt = node.name + p
                         else:
-                            relations[k][i]["relations"][node.name].extend(result_list[v[i]])
-                new_relations = [[] for i in range(len(data))]
-                for i in range(len(relations)):
-                    for j in range(len(relations[i])):
-                        if "relations" in relations[i][j].keys() and node.name in relations[i][j]["relations"].keys():
-                            for k in range(len(relations[i][j]["relations"][node.name])):
-                                new_relations[i].append(relations[i][j]["relations"][node.name][k])
-                relations = new_relations
-
-            prefix = [[] for _ in range(len(data))]
+                            prompt = p + node.name
+                        examples.append(
+                            {
+                                "text": one_data["text"],
+                                "bbox": one_data["bbox"],
+                                "image": one_data["image"],
+                                "prompt": dbc2sbc(prompt),
+                            }
+                        )
+                    input_map[cnt] = [i + idx for i in range(len(pre))]
+                    idx += len(pre)
+                cnt += 1
+        return examples, input_map
+
+    def _update_stage_results(self, node, data, results, result_list, input_map):
+        """merge the predictions of the schema node into the results, and set the prompt prefix of its children"""
+        if not node.parent_relations:
+            relations = [[] for i in range(len(data))]
             for k, v in input_map.items():
                 for idx in v:
-                    for i in range(len(result_list[idx])):
-                        if self._is_en:
-                            prefix[k].append(" of " + result_list[idx][i]["text"])
-                        else:
-                            prefix[k].append(result_list[idx][i]["text"] + "的")
+                    if len(result_list[idx]) == 0:
+                        continue
+                    if node.name not in results[k].keys():
+                        results[k][node.name] = result_list[idx]
+                    else:
+                        results[k][node.name].extend(result_list[idx])
+                if node.name in results[k].keys():
+                    relations[k].extend(results[k][node.name])
+        else:
+            relations = node.parent_relations
+            for k, v in input_map.items():
+                for i in range(len(v)):
+                    if len(result_list[v[i]]) == 0:
+                        continue
+                    if "relations" not in relations[k][i].keys():
+                        relations[k][i]["relations"] = {node.name: result_list[v[i]]}
+                    elif node.name not in relations[k][i]["relations"].keys():
+                        relations[k][i]["relations"][node.name] = result_list[v[i]]
+                    else:
+                        relations[k][i]["relations"][node.name].extend(result_list[v[i]])
+            new_relations = [[] for i in range(len(data))]
+            for i in range(len(relations)):
+                for j in range(len(relations[i])):
+                    if "relations" in relations[i][j].keys() and node.name in relations[i][j]["relations"].keys():
+                        for k in range(len(relations[i][j]["relations"][node.name])):
+                            new_relations[i].append(relations[i][j]["relations"][node.name][k])
+            relations = new_relations
+
+        prefix = [[] for _ in range(len(data))]
+        for k, v in input_map.items():
+            for idx in v:
+                for i in range(len(result_list[idx])):
+                    if self._is_en:
+                        prefix[k].append(" of " + result_list[idx][i]["text"])
+                    else:
+                        prefix[k].append(result_list[idx][i]["text"] + "的")
 
-            for child in node.children:
-                child.prefix = prefix
-                child.parent_relations = relations
-                schema_list.append(child)
-        results = self._add_bbox_info(results, data)
-        return results
+        for child in node.children:
+            child.prefix = prefix
+            child.parent_relations = relations
 
     def _add_bbox_info(self, results, data):
         def _add_bbox(result, char_boxes):
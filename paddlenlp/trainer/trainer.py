@@ -30,6 +30,7 @@ import types
 import warnings
 from collections import OrderedDict
 from collections.abc import Mapping
+from functools import partial
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
@@ -71,6 +72,7 @@ from paddle.io import DataLoader, Dataset, DistributedBatchSampler
 from tqdm.auto import tqdm
 
 from ..data import (
+    BatchFetchDataLoader,
     DataCollator,
     DataCollatorWithPadding,
     DistDataLoader,
@@ -85,6 +87,7 @@ from ..transformers.model_utils import (
 )
 from ..transformers.tokenizer_utils import PretrainedTokenizer
 from ..utils.batch_sampler import DistributedBatchSampler as NlpDistributedBatchSampler
+from ..utils.batch_sampler import LengthGroupedBatchSampler
 from ..utils.env import (
     LORA_WEIGHTS_NAME,
     PADDLE_WEIGHTS_INDEX_NAME,
@@ -119,13 +122,15 @@ from .trainer_utils import (  # set_hyrbid_parallel_seed,
     get_last_checkpoint,
     get_scheduler,
     has_length,
+    is_checkpoint_complete,
     set_seed,
     speed_metrics,
 )
 from .training_args import TrainingArguments
+from .utils.async_save import AsyncCheckpointSaver, count_ranks_sharing_dir
 from .utils.helper import (  # nested_truncate,
+    EvalLoopContainer,
     distributed_concat,
-    nested_concat,
     nested_detach,
     nested_numpify,
     nested_truncate,
@@ -304,6 +309,10 @@ class Trainer:
         self.sharding_io = None
         if self.args.should_save_sharding_stage1_model or self.args.should_load_sharding_stage1_model:
             self.sharding_io = ShardingIO(self.args, self.model, self.optimizer)
+        # the function to save the files of the model, which is replaced by the async saver in `_save_checkpoint`
+        self._save_function = paddle.save
+        # created by the first checkpoint of `async_save`
+        self._async_saver = None
 
         if self.sharding is not None and self.optimizer is not None:
             raise RuntimeError(
@@ -662,6 +671,8 @@ class Trainer:
         epochs_trained = 0
         steps_trained_in_current_epoch = 0
         steps_trained_progress_bar = None
+        # whether the position of the train sampler is restored from the checkpoint
+        sampler_position_restored = False
 
         # Check if continuing training from a checkpoint
         if resume_from_checkpoint is not None and os.path.isfile(
@@ -689,16 +700,29 @@ class Trainer:
                     steps_trained_progress_bar.set_description("Skipping the first batches")
             if not args.ignore_data_skip:
                 if isinstance(train_dataloader, paddle.io.DataLoader) and isinstance(
+                    train_dataloader.batch_sampler, LengthGroupedBatchSampler
+                ):
+                    # the batches have different sizes, so the sampler seeks by the number of batches
+                    train_dataloader.batch_sampler.load_state_dict(
+                        {"epoch": epochs_trained, "consumed_batches": steps_trained_in_current_epoch}
+                    )
+                    sampler_position_restored = True
+                    logger.info(
+                        f"Resume LengthGroupedBatchSampler at epoch {epochs_trained} "
+                        f"consumed_batches {steps_trained_in_current_epoch}"
+                    )
+                elif isinstance(train_dataloader, paddle.io.DataLoader) and isinstance(
                     train_dataloader.batch_sampler, NlpDistributedBatchSampler
                 ):
-                    consumed_samples = (
-                        self.state.global_step
-                        * args.train_batch_size
-                        * args.gradient_accumulation_steps
-                        * args.dataset_world_size
+                    # seek to the position of the checkpoint, the skipped batches are never loaded
+                    consumed_samples = steps_trained_in_current_epoch * args.train_batch_size * args.dataset_world_size
+                    train_dataloader.batch_sampler.load_state_dict(
+                        {"epoch": epochs_trained, "consumed_samples": consumed_samples}
+                    )
+                    sampler_position_restored = True
+                    logger.info(
+                        f"Resume DistributedBatchSampler at epoch {epochs_trained} consumed_samples {consumed_samples}"
                     )
-                    train_dataloader.batch_sampler.set_epoch(consumed_samples=consumed_samples)
-                    logger.info(f"Set DistributedBatchSampler consumed_samples to {consumed_samples}")
 
         epoch_iterator = train_dataloader
         # steps_in_epoch = len(epoch_iterator)
@@ -737,6 +761,12 @@ class Trainer:
 
         for epoch in range(epochs_trained, num_train_epochs):
             if isinstance(train_dataloader, paddle.io.DataLoader) and isinstance(
+                train_dataloader.batch_sampler, (NlpDistributedBatchSampler, LengthGroupedBatchSampler)
+            ):
+                # keep the position restored from the checkpoint in the first epoch (none with `ignore_data_skip`)
+                if epoch > epochs_trained or not sampler_position_restored:
+                    train_dataloader.batch_sampler.set_epoch(epoch)
+            elif isinstance(train_dataloader, paddle.io.DataLoader) and isinstance(
                 train_dataloader.batch_sampler, DistributedBatchSampler
             ):
                 train_dataloader.batch_sampler.set_epoch(epoch)
@@ -753,7 +783,7 @@ class Trainer:
                 # for paddlenlp.utils.batch_sampler.DistributedBatchSampler
                 # We use consumed_samples to reset the status
                 if isinstance(train_dataloader, paddle.io.DataLoader) and isinstance(
-                    train_dataloader.batch_sampler, NlpDistributedBatchSampler
+                    train_dataloader.batch_sampler, (NlpDistributedBatchSampler, LengthGroupedBatchSampler)
                 ):
                     if step == 0:
                         if steps_trained_progress_bar is not None:
@@ -905,6 +935,8 @@ class Trainer:
                     break
                 self.timers and self.timers("read-data").start()
 
+            # only the first epoch after resuming is partially trained
+            steps_trained_in_current_epoch = 0
             if step < 0:
                 logger.warning(
                     f"There seems to be not a single sample in your epoch_iterator, stopping training at step"
@@ -923,6 +955,9 @@ class Trainer:
             # Clean the state at the end of training
             delattr(self, "_past")
 
+        if self._async_saver is not None:
+            self._async_saver.wait()
+
         logger.info("\nTraining completed. \n")
         if args.load_best_model_at_end and self.state.best_model_checkpoint is not None:
             if args.local_rank != -1:
@@ -973,25 +1008,62 @@ class Trainer:
 
         return TrainOutput(self.state.global_step, train_loss, metrics)
 
+    def _get_train_lengths(self) -> List[int]:
+        """the lengths of the training samples for `max_tokens_per_batch`, without running the lazy transforms"""
+        dataset = self.train_dataset
+        column = self.args.length_column_name
+        if is_datasets_available():
+            from ..datasets import MapDataset
+
+            if isinstance(dataset, datasets.Dataset) and column in dataset.column_names:
+                return dataset[column]
+            # the samples of a MapDataset without lazy transforms are already in memory
+            if isinstance(dataset, MapDataset) and not dataset._transform_pipline:
+                return [
+                    sample[column] if column in sample else len(sample["input_ids"]) for sample in dataset.new_data
+                ]
+        raise ValueError(
+            f"`max_tokens_per_batch` needs the lengths of the training samples. Add a `{column}` column "
+            "(`length_column_name`) to the dataset, or map the dataset with `lazy=False`."
+        )
+
     def _get_train_sampler(self) -> Optional[paddle.io.Sampler]:
         if self.train_dataset is None or not has_length(self.train_dataset):
             return None
 
-        if self.args.world_size <= 1:
-            return paddle.io.BatchSampler(
-                dataset=self.train_dataset,
+        # the sampler seeks to the position of the checkpoint when resuming, instead of skipping the loaded batches
+        if self.args.max_tokens_per_batch is not None:
+            return LengthGroupedBatchSampler(
+                self.train_dataset,
+                max_tokens=self.args.max_tokens_per_batch,
+                lengths=self._get_train_lengths(),
+                group_size=self.args.length_group_size,
+                num_replicas=self.args.dataset_world_size if self.args.world_size > 1 else 1,
+                rank=self.args.dataset_rank if self.args.world_size > 1 else 0,
                 shuffle=True,
+                drop_last=self.args.dataloader_drop_last,
+                seed=self.args.seed,
+            )
+
+        if self.args.world_size <= 1:
+            return NlpDistributedBatchSampler(
+                self.train_dataset,
                 batch_size=self.args.per_device_train_batch_size,
+                shuffle=True,
+                num_replicas=1,
+                rank=0,
                 drop_last=self.args.dataloader_drop_last,
+                seed=self.args.seed,
             )
 
-        return DistributedBatchSampler(
+        return NlpDistributedBatchSampler(
             self.train_dataset,
             batch_size=self.args.per_device_train_batch_size,
             shuffle=True,
             num_replicas=self.args.dataset_world_size,
             rank=self.args.dataset_rank,
             drop_last=self.args.dataloader_drop_last,
+            seed=self.args.seed,
         )
 
     def _set_state_dict_in_model(self, state_dict):
@@ -1100,7 +1172,8 @@ class Trainer:
         train_dataset = self.train_dataset
         if is_datasets_available() and train_dataset is not None and isinstance(train_dataset, datasets.Dataset):
             train_dataset = self._remove_unused_columns(train_dataset, description="training")
-        _DataLoader = DistDataLoader if self.args.distributed_dataloader else DataLoader
+        # the datasets with `__getitems__` are fetched by batch
+        _DataLoader = DistDataLoader if self.args.distributed_dataloader else BatchFetchDataLoader
 
         if self._is_iterable_dataset(train_dataset):
             if self.args.dataset_world_size > 1:
@@ -1840,27 +1913,43 @@ class Trainer:
 
         output_dir = os.path.join(run_dir, checkpoint_folder)
 
-        self.save_model(output_dir)
+        # with async_save, the tensors are copied to the host and the files are written in the background
+        save_function = paddle.save
+        if self.args.async_save:
+            if self._async_saver is None:
+                # the nodes may save to their local disks, so a checkpoint only waits for the ranks sharing its disk
+                num_ranks = 1
+                if self.args.world_size > 1:
+                    num_ranks = count_ranks_sharing_dir(run_dir, self.args.process_index)
+                self._async_saver = AsyncCheckpointSaver(self.args.process_index, num_ranks)
+            self._async_saver.begin(output_dir)
+            save_function = self._async_saver.save
+
+        self._save_function = save_function
+        try:
+            self.save_model(output_dir)
+        finally:
+            self._save_function = paddle.save
 
         optimizer_name = _add_variant(OPTIMIZER_NAME, self.args.optimizer_name_suffix)
 
         if self.args.use_hybrid_parallel:
             if self.dp_group.rank <= 0:
                 os.makedirs(output_dir, exist_ok=True)
-                paddle.save(
+                save_function(
                     self.optimizer.state_dict(),
                     os.path.join(output_dir, optimizer_name),
                 )
 
         if self.args.should_save:
             if not self.args.use_hybrid_parallel:
-                paddle.save(self.optimizer.state_dict(), os.path.join(output_dir, OPTIMIZER_NAME))
+                save_function(self.optimizer.state_dict(), os.path.join(output_dir, OPTIMIZER_NAME))
 
             # FIXME: manybe only save one copy
-            paddle.save(self.lr_scheduler.state_dict(), os.path.join(output_dir, SCHEDULER_NAME))
+            save_function(self.lr_scheduler.state_dict(), os.path.join(output_dir, SCHEDULER_NAME))
 
             if self.do_grad_scaling:
-                paddle.save(self.scaler.state_dict(), os.path.join(output_dir, SCALER_NAME))
+                save_function(self.scaler.state_dict(), os.path.join(output_dir, SCALER_NAME))
 
         # Determine the new best metric / best model checkpoint
         if metrics is not None and self.args.metric_for_best_model is not None:
@@ -1901,15 +1990,28 @@ class Trainer:
         if self.args.world_size > 1:
             # use global process_index to save
             process_index = self.args.process_index
-            paddle.save(rng_states, os.path.join(output_dir, f"rng_state_{process_index}.pth"))
+            save_function(rng_states, os.path.join(output_dir, f"rng_state_{process_index}.pth"))
         else:
-            paddle.save(rng_states, os.path.join(output_dir, "rng_state.pth"))
+            save_function(rng_states, os.path.join(output_dir, "rng_state.pth"))
 
         # Maybe delete some older checkpoints.
+        rotate_checkpoints = None
         if self.args.should_save_model_state and (
             True if not self.args.use_hybrid_parallel else self.args.local_rank == 0
         ):
-            self._rotate_checkpoints(use_mtime=True, output_dir=run_dir)
+            # the checkpoints may be rotated in the background while the training updates the state
+            rotate_checkpoints = partial(
+                self._rotate_checkpoints,
+                use_mtime=True,
+                output_dir=run_dir,
+                best_model_checkpoint=self.state.best_model_checkpoint,
+            )
+
+        if self._async_saver is not None:
+            # the older checkpoints are deleted after the new one is complete
+            self._async_saver.commit(output_dir, callback=rotate_checkpoints)
+        elif rotate_checkpoints is not None:
+            rotate_checkpoints()
 
     def set_optimizer_grouped_parameters(self, optimizer_grouped_parameters=None):
         """
@@ -1929,12 +2031,15 @@ class Trainer:
         self.enable_autocast_context_manager = False
 
     def _sorted_checkpoints(
-        self, output_dir=None, checkpoint_prefix=PREFIX_CHECKPOINT_DIR, use_mtime=False
+        self, output_dir=None, checkpoint_prefix=PREFIX_CHECKPOINT_DIR, use_mtime=False, best_model_checkpoint=None
     ) -> List[str]:
         ordering_and_checkpoint_path = []
 
         glob_checkpoints = [str(x) for x in Path(output_dir).glob(f"{checkpoint_prefix}-*")]
 
+        # the checkpoints being saved asynchronously are neither counted nor deleted
+        glob_checkpoints = [path for path in glob_checkpoints if is_checkpoint_complete(path)]
+
         for path in glob_checkpoints:
             if use_mtime:
                 ordering_and_checkpoint_path.append((os.path.getmtime(path), path))
@@ -1946,18 +2051,20 @@ class Trainer:
         checkpoints_sorted = sorted(ordering_and_checkpoint_path)
         checkpoints_sorted = [checkpoint[1] for checkpoint in checkpoints_sorted]
         # Make sure we don't delete the best model.
-        if self.state.best_model_checkpoint is not None:
-            best_model_index = checkpoints_sorted.index(str(Path(self.state.best_model_checkpoint)))
+        if best_model_checkpoint is not None and str(Path(best_model_checkpoint)) in checkpoints_sorted:
+            best_model_index = checkpoints_sorted.index(str(Path(best_model_checkpoint)))
             for i in range(best_model_index, len(checkpoints_sorted) - 2):
                 checkpoints_sorted[i], checkpoints_sorted[i + 1] = checkpoints_sorted[i + 1], checkpoints_sorted[i]
         return checkpoints_sorted
 
-    def _rotate_checkpoints(self, use_mtime=False, output_dir=None) -> None:
+    def _rotate_checkpoints(self, use_mtime=False, output_dir=None, best_model_checkpoint=None) -> None:
         if self.args.save_total_limit is None or self.args.save_total_limit <= 0:
             return
 
         # Check if we should delete older checkpoint(s)
-        checkpoints_sorted = self._sorted_checkpoints(use_mtime=use_mtime, output_dir=output_dir)
+        checkpoints_sorted = self._sorted_checkpoints(
+            use_mtime=use_mtime, output_dir=output_dir, best_model_checkpoint=best_model_checkpoint
+        )
         if len(checkpoints_sorted) <= self.args.save_total_limit:
             return
 
@@ -1965,9 +2072,9 @@ class Trainer:
         # we don't do to allow resuming.
         save_total_limit = self.args.save_total_limit
         if (
-            self.state.best_model_checkpoint is not None
+            best_model_checkpoint is not None
             and self.args.save_total_limit == 1
-            and checkpoints_sorted[-1] != self.state.best_model_checkpoint
+            and checkpoints_sorted[-1] != best_model_checkpoint
         ):
             save_total_limit = 2
 
@@ -2009,6 +2116,7 @@ class Trainer:
                         merge_tensor_parallel=merge_tensor_parallel,
                         variant=weight_name_suffix,
                         is_main_process=self.args.should_save,
+                        save_function=self._save_function,
                     )
                 else:
                     unwrap_model(self.model).save_pretrained(
@@ -2016,6 +2124,7 @@ class Trainer:
                         merge_tensor_parallel=merge_tensor_parallel,
                         variant=self.args.weight_name_suffix,
                         is_main_process=self.args.should_save,
+                        save_function=self._save_function,
                     )
             else:
                 logger.info("Trainer.model is not a `PretrainedModel`, only saving its state dict.")
@@ -2023,7 +2132,7 @@ class Trainer:
                     logger.warning("Trainer.model is not a `PretrainedModel`, not suppor for merge_tensor_parallel.")
                 if state_dict is None:
                     state_dict = self.model.state_dict()
-                paddle.save(
+                self._save_function(
                     state_dict,
                     os.path.join(output_dir, _add_variant(PADDLE_WEIGHTS_NAME, self.args.weight_name_suffix)),
                 )
@@ -2040,6 +2149,7 @@ class Trainer:
                     merge_tensor_parallel=merge_tensor_parallel,
                     variant=weight_name_suffix,
                     is_main_process=self.args.should_save,
+                    save_function=self._save_function,
                 )
             else:
                 self.model.save_pretrained(
@@ -2047,6 +2157,7 @@ class Trainer:
                     merge_tensor_parallel=merge_tensor_parallel,
                     variant=self.args.weight_name_suffix,
                     is_main_process=self.args.should_save,
+                    save_function=self._save_function,
                 )
         if self.args.should_save_sharding_stage1_model:
             self.sharding_io.save_distributed_model_meta(output_dir)
@@ -2161,6 +2272,7 @@ class Trainer:
             ignore_keys=ignore_keys,
             metric_key_prefix=metric_key_prefix,
             max_eval_iters=self.args.max_evaluate_steps,
+            keep_predictions=False,
         )
 
         total_batch_size = self.args.eval_batch_size * self.args.dataset_world_size
@@ -2189,11 +2301,13 @@ class Trainer:
         ignore_keys: Optional[List[str]] = None,
         metric_key_prefix: str = "eval",
         max_eval_iters: Optional[int] = -1,
+        keep_predictions: bool = True,
     ) -> EvalLoopOutput:
         """
         Prediction/evaluation loop, shared by `Trainer.evaluate()` and `Trainer.predict()`.
 
-        Works both with or without labels.
+        Works both with or without labels. With `args.batch_eval_metrics`, the predictions and labels are only
+        accumulated and returned if `keep_predictions` is True.
         """
         args = self.args
 
@@ -2259,14 +2373,24 @@ class Trainer:
             self._past = None
 
         # Initialize containers
-        # losses/preds/labels on GPU (accumulated for eval_accumulation_steps)
-        losses_host = None
-        preds_host = None
-        labels_host = None
-        # losses/preds/labels on CPU (final containers)
-        all_losses = None
-        all_preds = None
-        all_labels = None
+        # the outputs of every step are kept on GPU, and moved to CPU every eval_accumulation_steps
+        all_losses = EvalLoopContainer(padding_index=-100)
+        all_preds = EvalLoopContainer(padding_index=-100)
+        all_labels = EvalLoopContainer(padding_index=-100)
+        # with batch_eval_metrics, the metrics are computed on the previous batch when the next one arrives, so that
+        # the last batch is known when calling compute_metrics with compute_result=True
+        batch_eval_metrics = args.batch_eval_metrics and self.compute_metrics is not None
+        last_batch = None
+        # the samples padded to the last batch in distributed evaluation are truncated before computing the metrics
+        if num_samples is not None:
+            metric_num_samples = num_samples
+        elif has_length(eval_dataset):
+            metric_num_samples = len(eval_dataset)
+        elif has_length(dataloader):
+            metric_num_samples = self.num_examples(dataloader)
+        else:
+            metric_num_samples = None
+        metric_observed_samples = 0
         # Will be useful when we have an iterable dataset so don't know its length.
 
         observed_num_examples = 0
@@ -2287,50 +2411,46 @@ class Trainer:
             if loss is not None:
                 # losses = self._nested_gather(loss.repeat(batch_size))
                 losses = self._nested_gather(paddle.tile(loss, repeat_times=[batch_size, 1]))
-                losses_host = losses if losses_host is None else paddle.concat((losses_host, losses), axis=0)
+                all_losses.add(losses)
             if labels is not None:
                 labels = self._pad_across_processes(labels)
                 labels = self._nested_gather(labels)
-                labels_host = labels if labels_host is None else nested_concat(labels_host, labels, padding_index=-100)
             if logits is not None:
                 logits = self._pad_across_processes(logits)
                 logits = self._nested_gather(logits)
                 if self.preprocess_logits_for_metrics is not None:
                     logits = self.preprocess_logits_for_metrics(logits, labels)
-                preds_host = logits if preds_host is None else nested_concat(preds_host, logits, padding_index=-100)
+            if batch_eval_metrics and logits is not None and labels is not None:
+                batch_preds, batch_labels = nested_numpify(logits), nested_numpify(labels)
+                if metric_num_samples is not None:
+                    limit = max(metric_num_samples - metric_observed_samples, 0)
+                    metric_observed_samples += find_batch_size(batch_labels)
+                    batch_preds = nested_truncate(batch_preds, limit)
+                    batch_labels = nested_truncate(batch_labels, limit)
+                if find_batch_size(batch_labels) != 0:
+                    if last_batch is not None:
+                        self.compute_metrics(last_batch, compute_result=False)
+                    last_batch = EvalPrediction(predictions=batch_preds, label_ids=batch_labels)
+            if not batch_eval_metrics or keep_predictions:
+                if labels is not None:
+                    all_labels.add(labels)
+                if logits is not None:
+                    all_preds.add(logits)
             self.control = self.callback_handler.on_prediction_step(args, self.state, self.control)
 
             # Gather all tensors and put them back on the CPU if we have done enough accumulation steps.
             if args.eval_accumulation_steps is not None and (step + 1) % args.eval_accumulation_steps == 0:
-                if losses_host is not None:
-                    losses = nested_numpify(losses_host)
-                    all_losses = losses if all_losses is None else np.concatenate((all_losses, losses), axis=0)
-                if preds_host is not None:
-                    logits = nested_numpify(preds_host)
-                    all_preds = logits if all_preds is None else nested_concat(all_preds, logits, padding_index=-100)
-
-                if labels_host is not None:
-                    labels = nested_numpify(labels_host)
-                    all_labels = (
-                        labels if all_labels is None else nested_concat(all_labels, labels, padding_index=-100)
-                    )
-
-                # Set back to None to begin a new accumulation
-                losses_host, preds_host, labels_host = None, None, None
+                all_losses.to_cpu_and_numpy()
+                all_preds.to_cpu_and_numpy()
+                all_labels.to_cpu_and_numpy()
 
             if max_eval_iters > 0 and step >= max_eval_iters - 1:
                 break
 
-        # Gather all remaining tensors and put them back on the CPU
-        if losses_host is not None:
-            losses = nested_numpify(losses_host)
-            all_losses = losses if all_losses is None else np.concatenate((all_losses, losses), axis=0)
-        if preds_host is not None:
-            logits = nested_numpify(preds_host)
-            all_preds = logits if all_preds is None else nested_concat(all_preds, logits, padding_index=-100)
-        if labels_host is not None:
-            labels = nested_numpify(labels_host)
-            all_labels = labels if all_labels is None else nested_concat(all_labels, labels, padding_index=-100)
+        # Gather all remaining tensors and put them back on the CPU, the outputs are padded and concatenated once
+        all_losses = all_losses.get_arrays()
+        all_preds = all_preds.get_arrays()
+        all_labels = all_labels.get_arrays()
 
         # Number of samples
         if num_samples is not None:
@@ -2359,7 +2479,9 @@ class Trainer:
         model.train()
 
         # Metrics!
-        if self.compute_metrics is not None and all_preds is not None and all_labels is not None:
+        if batch_eval_metrics and last_batch is not None:
+            metrics = self.compute_metrics(last_batch, compute_result=True)
+        elif self.compute_metrics is not None and all_preds is not None and all_labels is not None:
             metrics = self.compute_metrics(EvalPrediction(predictions=all_preds, label_ids=all_labels))
         else:
             metrics = {}
@@ -132,12 +132,41 @@ PREFIX_CHECKPOINT_DIR = "checkpoint"
 _re_checkpoint = re.compile(r"^" + PREFIX_CHECKPOINT_DIR + r"\-(\d+)$")
 
 
+# the markers of the checkpoints saved asynchronously, every rank creates its saving marker before writing any file,
+# and atomically renames it to the done marker after all of its files are written. The markers hold the number of the
+# ranks saving to the filesystem of the checkpoint, which is less than the world size if the nodes save to local disks.
+CHECKPOINT_SAVING_MARKER = ".checkpoint_saving"
+CHECKPOINT_DONE_MARKER = ".checkpoint_done"
+
+
+def is_checkpoint_complete(checkpoint, world_size=None):
+    """
+    whether all the files of the checkpoint are written, the checkpoints saved synchronously are always complete. A
+    checkpoint saved asynchronously is complete when all the `world_size` ranks saving to its filesystem have their
+    done markers, `world_size` is read from the markers if not given.
+    """
+    markers = [
+        name for name in os.listdir(checkpoint) if name.startswith((CHECKPOINT_SAVING_MARKER, CHECKPOINT_DONE_MARKER))
+    ]
+    if len(markers) == 0:
+        return True
+    if any(name.startswith(CHECKPOINT_SAVING_MARKER) for name in markers):
+        return False
+    if world_size is None:
+        with open(os.path.join(checkpoint, markers[0])) as f:
+            content = f.read().strip()
+        world_size = int(content) if content.isdigit() else 1
+    return len(markers) >= world_size
+
+
 def get_last_checkpoint(folder):
     content = os.listdir(folder)
     checkpoints = [
         path
         for path in content
-        if _re_checkpoint.search(path) is not None and os.path.isdir(os.path.join(folder, path))
+        if _re_checkpoint.search(path) is not None
+        and os.path.isdir(os.path.join(folder, path))
+        and is_checkpoint_complete(os.path.join(folder, path))
     ]
     if len(checkpoints) == 0:
         return
@@ -113,6 +113,10 @@ class TrainingArguments:
             Number of predictions steps to accumulate the output tensors for, before moving the results to the CPU. If
             left unset, the whole predictions are accumulated on GPU/TPU before being moved to the CPU (faster but
             requires more memory).
+        batch_eval_metrics (`bool`, *optional*, defaults to `False`):
+            Whether to call `compute_metrics` on every evaluation batch instead of on the whole predictions, which are
+            not kept in memory by `evaluate`. `compute_metrics` is called with the `compute_result` argument, which is
+            `True` for the last batch, when the metrics over all the batches should be returned.
         learning_rate (`float`, *optional*, defaults to 5e-5):
             The initial learning rate for [`AdamW`] optimizer.
         weight_decay (`float`, *optional*, defaults to 0):
@@ -179,6 +183,10 @@ class TrainingArguments:
 
             This should not be activated when the different nodes use the same storage as the files will be saved with
             the same names for each node.
+        async_save (`bool`, *optional*, defaults to `False`):
+            Whether to save the checkpoints asynchronously. The training goes on once the model and optimizer states
+            are copied to the host memory, and the files are written in a background thread. A checkpoint is not
+            resumed from or rotated until all of its files are written.
         no_cuda (`bool`, *optional*, defaults to `False`):
             Whether to not use CUDA even when it is available or not.
         seed (`int`, *optional*, defaults to 42):
@@ -249,6 +257,12 @@ class TrainingArguments:
         dataloader_drop_last (`bool`, *optional*, defaults to `False`):
             Whether to drop the last incomplete batch (if the length of the dataset is not divisible by the batch size)
             or not.
+        max_tokens_per_batch (`int`, *optional*):
+            If set, the training samples of similar lengths are grouped into the batches of at most this number of
+            padded tokens per device, instead of `per_device_train_batch_size` samples. The lengths of the samples are
+            read from `length_column_name`, or from `input_ids` of a dataset which is mapped with `lazy=False`.
+        length_group_size (`int`, *optional*, defaults to 10000):
+            The number of training samples sorted together by length when `max_tokens_per_batch` is set.
         eval_steps (`int`, *optional*):
             Number of update steps between two evaluations if `evaluation_strategy="steps"`. Will default to the same
             value as `logging_steps` if not set.
@@ -304,8 +318,7 @@ class TrainingArguments:
             The optimizer to use: adamw, or adafactor.
         length_column_name (`str`, *optional*, defaults to `"length"`):
             Column name for precomputed lengths. If the column exists, grouping by length will use these values rather
-            than computing them on train startup. Ignored unless `group_by_length` is `True` and the dataset is an
-            instance of `Dataset`.
+            than computing them on train startup. Ignored unless `max_tokens_per_batch` is set.
         report_to (`str` or `List[str]`, *optional*, defaults to `"visualdl"`):
             The list of integrations to report the results and logs to. Supported platforms is `"visualdl"`.
             `"none"` for no integrations.
@@ -360,6 +373,10 @@ class TrainingArguments:
         default=None,
         metadata={"help": "Number of predictions steps to accumulate before moving the tensors to the CPU."},
     )
+    batch_eval_metrics: bool = field(
+        default=False,
+        metadata={"help": "Whether to call compute_metrics on every evaluation batch to accumulate the metrics."},
+    )
 
     learning_rate: float = field(default=5e-5, metadata={"help": "The initial learning rate for AdamW."})
     weight_decay: float = field(default=0.0, metadata={"help": "Weight decay for AdamW if we apply some."})
@@ -419,6 +436,10 @@ class TrainingArguments:
             "help": "When doing multi-node distributed training, whether to save models and checkpoints on each node, or only on the main one"
         },
     )
+    async_save: bool = field(
+        default=False,
+        metadata={"help": "Whether to save the checkpoints in a background thread without blocking the training."},
+    )
     no_cuda: bool = field(default=False, metadata={"help": "Do not use CUDA even when it is available"})
     seed: int = field(default=42, metadata={"help": "Random seed that will be set at the beginning of training."})
 
@@ -618,6 +639,21 @@ class TrainingArguments:
     dataloader_drop_last: bool = field(
         default=False, metadata={"help": "Drop the last incomplete batch if it is not divisible by the batch size."}
     )
+    max_tokens_per_batch: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "If set, the training samples of similar lengths are grouped into the batches of at most this "
+            "number of padded tokens per device, instead of per_device_train_batch_size samples."
+        },
+    )
+    length_group_size: int = field(
+        default=10000,
+        metadata={"help": "The number of training samples sorted together by length for max_tokens_per_batch."},
+    )
+    length_column_name: str = field(
+        default="length",
+        metadata={"help": "Column name with precomputed lengths to use when grouping by length."},
+    )
     eval_steps: int = field(default=None, metadata={"help": "Run an evaluation every X steps."})
     max_evaluate_steps: int = field(
         default=-1, metadata={"help": "If set to a positive number, the total number of evaluation steps to perform."}
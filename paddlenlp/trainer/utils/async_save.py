@@ -0,0 +1,131 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import queue
+import threading
+
+import numpy as np
+import paddle
+
+from ...utils.log import logger
+from ..trainer_utils import CHECKPOINT_DONE_MARKER, CHECKPOINT_SAVING_MARKER
+
+__all__ = ["AsyncCheckpointSaver", "count_ranks_sharing_dir"]
+
+_RANK_PROBE = ".rank_probe"
+
+
+def _snapshot(obj):
+    """copy the tensors of `obj` to the host, so that the training could go on updating them"""
+    if isinstance(obj, paddle.Tensor):
+        # the copy to pinned memory is faster than the one to pageable memory
+        return obj.pin_memory() if obj.place.is_gpu_place() else obj.clone()
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return type(obj)((key, _snapshot(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(value) for value in obj)
+    return obj
+
+
+def count_ranks_sharing_dir(directory, process_index):
+    """
+    count the ranks which see the same `directory`, e.g. all the ranks for a shared filesystem, or the ranks of the
+    node for a local disk. It must be called by all the ranks.
+    """
+    os.makedirs(directory, exist_ok=True)
+    probe = os.path.join(directory, f"{_RANK_PROBE}_{process_index}")
+    with open(probe, "w"):
+        pass
+    paddle.distributed.barrier()
+    num_ranks = len([name for name in os.listdir(directory) if name.startswith(_RANK_PROBE)])
+    paddle.distributed.barrier()
+    os.remove(probe)
+    return num_ranks
+
+
+class AsyncCheckpointSaver:
+    """
+    Persist the checkpoints in a background thread, so that the training loop only waits for the copy of the tensors
+    to the host.
+
+    The files of one checkpoint are saved between `begin` and `commit`. `begin` creates the saving marker of the rank
+    before any file is written, and the marker is atomically renamed to the done marker after all the files of the
+    rank are written, so a checkpoint is complete when it has the done markers of all the ranks saving to its
+    filesystem (see `is_checkpoint_complete`). At most one checkpoint is staged in the host memory, `begin` waits for
+    the previous checkpoint to be persisted.
+
+    Args:
+        process_index (int): The global rank of the process, which names the markers of the rank.
+        world_size (int): The number of the ranks saving the checkpoint to the same filesystem, which is written into
+            the markers. On multi-node jobs saving to the local disks, it is the number of the ranks of a node (see
+            `count_ranks_sharing_dir`).
+    """
+
+    def __init__(self, process_index=0, world_size=1):
+        self.process_index = process_index
+        self.world_size = world_size
+        self._tasks = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._loop, name="async-checkpoint-saver", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            task = self._tasks.get()
+            try:
+                if self._error is None:
+                    task()
+            except Exception as e:
+                logger.error(f"Failed to save the checkpoint asynchronously: {e}")
+                self._error = e
+            finally:
+                self._tasks.task_done()
+
+    def _marker(self, checkpoint_dir, name):
+        return os.path.join(checkpoint_dir, f"{name}_{self.process_index}")
+
+    def begin(self, checkpoint_dir):
+        self.wait()
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        with open(self._marker(checkpoint_dir, CHECKPOINT_SAVING_MARKER), "w") as f:
+            f.write(str(self.world_size))
+
+    def save(self, obj, path):
+        """an async replacement of `paddle.save`, which is called between `begin` and `commit`"""
+        obj = _snapshot(obj)
+        self._tasks.put(lambda: paddle.save(obj, path))
+
+    def commit(self, checkpoint_dir, callback=None):
+        """mark the checkpoint done after all of its files are written, then run `callback` in the background"""
+
+        def _commit():
+            os.replace(
+                self._marker(checkpoint_dir, CHECKPOINT_SAVING_MARKER),
+                self._marker(checkpoint_dir, CHECKPOINT_DONE_MARKER),
+            )
+            logger.info(f"Checkpoint {checkpoint_dir} is saved.")
+            if callback is not None:
+                callback()
+
+        self._tasks.put(_commit)
+
+    def wait(self):
+        """wait for all the checkpoints to be persisted, and raise the error of the background saving if any"""
+        self._tasks.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Failed to save the checkpoint asynchronously.") from error
@@ -29,6 +29,8 @@ __all__ = [
     "nested_detach",
     "nested_numpify",
     "nested_truncate",
+    "nested_pad_and_concatenate",
+    "EvalLoopContainer",
 ]
 
 
@@ -102,6 +104,61 @@ def nested_concat(tensors, new_tensors, padding_index=-100):
         raise TypeError(f"Unsupported type for concatenation: got {type(tensors)}")
 
 
+def nested_pad_and_concatenate(chunks, padding_index=-100):
+    """
+    Concat the list of numpy `chunks` on the first dim and pad them on the second if needed, the result is allocated
+    only once. Works for arrays or nested list/tuples of arrays.
+    """
+    first = chunks[0]
+    if isinstance(first, (list, tuple)):
+        return type(first)(
+            nested_pad_and_concatenate([chunk[i] for chunk in chunks], padding_index=padding_index)
+            for i in range(len(first))
+        )
+    if len(first.shape) == 1 or all(chunk.shape[1] == first.shape[1] for chunk in chunks):
+        return np.concatenate(chunks, axis=0)
+
+    new_shape = (sum(chunk.shape[0] for chunk in chunks), max(chunk.shape[1] for chunk in chunks)) + first.shape[2:]
+    result = np.full_like(first, padding_index, shape=new_shape)
+    offset = 0
+    for chunk in chunks:
+        result[offset : offset + chunk.shape[0], : chunk.shape[1]] = chunk
+        offset += chunk.shape[0]
+    return result
+
+
+class EvalLoopContainer:
+    """
+    Container of the losses/preds/labels of the evaluation steps. The outputs of every step are appended to a list,
+    and are padded and concatenated only once in `get_arrays`, so that accumulating N steps costs O(N) copying
+    instead of the O(N^2) of concatenating the outputs on every step.
+
+    Args:
+        padding_index (int, optional): The value to pad the second dim of the outputs with.
+    """
+
+    def __init__(self, padding_index=-100):
+        self.padding_index = padding_index
+        # the tensors on the device, which are moved to the host by `to_cpu_and_numpy`
+        self.tensors = []
+        self.arrays = []
+
+    def add(self, tensors):
+        self.tensors.append(tensors)
+
+    def to_cpu_and_numpy(self):
+        self.arrays.extend(nested_numpify(tensors) for tensors in self.tensors)
+        self.tensors = []
+
+    def get_arrays(self):
+        self.to_cpu_and_numpy()
+        if len(self.arrays) == 0:
+            return None
+        if len(self.arrays) > 1:
+            self.arrays = [nested_pad_and_concatenate(self.arrays, padding_index=self.padding_index)]
+        return self.arrays[0]
+
+
 def nested_detach(tensors):
     "Detach `tensors` (even if it's a nested list/tuple of tensors)."
     if isinstance(tensors, (list, tuple)):
@@ -46,6 +46,7 @@ from paddlenlp.transformers.model_outputs import (
 from paddlenlp.transformers.model_utils import PretrainedModel, register_base_model
 from paddlenlp.utils.log import logger
 
+from ...generation import StaticKVCacheLayer
 from ..sequence_parallel_utils import (
     ColumnSequenceParallelLinear,
     GatherOp,
@@ -732,7 +733,9 @@ class LlamaAttention(nn.Layer):
 
         kv_seq_len = key_states.shape[-3]
 
-        if past_key_value is not None:
+        if isinstance(past_key_value, StaticKVCacheLayer):
+            kv_seq_len += past_key_value.seq_length
+        elif past_key_value is not None:
             kv_seq_len += past_key_value[0].shape[-3]
 
         if self.config.rope:
@@ -753,12 +756,22 @@ class LlamaAttention(nn.Layer):
                 query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin, position_ids)
 
         # [bsz, nh, t, hd]
-        if past_key_value is not None:
-            # reuse k, v, self_attention
-            key_states = paddle.concat([past_key_value[0], key_states], axis=1)
-            value_states = paddle.concat([past_key_value[1], value_states], axis=1)
+        if isinstance(past_key_value, StaticKVCacheLayer):
+            # write k, v into the preallocated cache in place, and attend over the whole cache, whose positions not
+            # written yet are masked out by the attention mask
+            key_states, value_states = past_key_value.update(key_states, value_states)
+            if self.config.use_flash_attention and flash_attention:
+                # flash attention ignores the attention mask, so it only takes the written positions
+                key_states = key_states[:, : past_key_value.seq_length]
+                value_states = value_states[:, : past_key_value.seq_length]
+            past_key_value = past_key_value if use_cache else None
+        else:
+            if past_key_value is not None:
+                # reuse k, v, self_attention
+                key_states = paddle.concat([past_key_value[0], key_states], axis=1)
+                value_states = paddle.concat([past_key_value[1], value_states], axis=1)
 
-        past_key_value = (key_states, value_states) if use_cache else None
+            past_key_value = (key_states, value_states) if use_cache else None
 
         if self.kv_indices is not None:
             key_states = paddle.index_select(key_states, self.kv_indices, axis=2)
@@ -1203,7 +1216,11 @@ class LlamaModel(LlamaPretrainedModel):
 
         seq_length_with_past = seq_length
         cache_length = 0
-        if past_key_values[0] is not None:
+        if isinstance(past_key_values[0], StaticKVCacheLayer):
+            # the new tokens are written into the static cache, which is attended as a whole
+            cache_length = past_key_values[0].max_length - seq_length
+            seq_length_with_past += cache_length
+        elif past_key_values[0] is not None:
             cache_length = paddle.shape(past_key_values[0][0])[1]
             seq_length_with_past += cache_length
         if inputs_embeds is None:
@@ -1380,6 +1397,7 @@ class LlamaLMHead(nn.Layer):
 
 class LlamaForCausalLM(LlamaPretrainedModel):
     enable_to_static_method = True
+    _supports_static_cache = True
 
     def __init__(self, config):
         super().__init__(config)
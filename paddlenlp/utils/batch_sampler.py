@@ -16,9 +16,10 @@ from __future__ import division, print_function
 
 import math
 
+import numpy as np
 import paddle
 
-__all__ = ["DistributedBatchSampler"]
+__all__ = ["DistributedBatchSampler", "LengthGroupedBatchSampler"]
 
 
 class DistributedBatchSampler(paddle.io.BatchSampler):
@@ -45,9 +46,16 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
             processes. If :attr:`rank` is None, :attr:`rank` is retrieved from
             :code:`paddle.distributed.ParallenEnv`. Default None.
         shuffle(bool): whther to shuffle indices order before genrating
-            batch indices. Default False.
+            batch indices. The order only depends on `seed` and the epoch set by
+            :code:`set_epoch`, so that it could be restored when resuming.
+            Default False.
         drop_last(bool): whether drop the last incomplete batch dataset size
             is not divisible by the batch size. Default False
+        consumed_samples(int, optional): the number of samples of all the
+            replicas consumed in the current epoch, which are skipped without
+            being loaded. Default 0.
+        seed(int, optional): the base seed of the shuffle, which is `seed + epoch`.
+            It should be the same for all the replicas. Default 0.
 
     Examples:
         .. code-block:: python
@@ -78,7 +86,15 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
     """
 
     def __init__(
-        self, dataset, batch_size, num_replicas=None, rank=None, shuffle=False, drop_last=False, consumed_samples=0
+        self,
+        dataset,
+        batch_size,
+        num_replicas=None,
+        rank=None,
+        shuffle=False,
+        drop_last=False,
+        consumed_samples=0,
+        seed=0,
     ):
         self.dataset = dataset
 
@@ -103,6 +119,7 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
             self.local_rank = ParallelEnv().local_rank
 
         self.drop_last = drop_last
+        self.seed = seed
         self.epoch = 0
 
         self.consumed_samples = consumed_samples
@@ -126,14 +143,27 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
         self.batch_size_times_rank_size = self.batch_size * self.nranks
 
         batch_indices = []
-        for idx in range(self.consumed_samples, self.total_size):
+        for idx in self._get_indices():
             batch_indices.append(idx)
             if len(batch_indices) == self.batch_size_times_rank_size:
                 start_idx, end_idx = self.get_start_end_idx()
                 yield batch_indices[start_idx:end_idx]
                 batch_indices = []
         if not self.drop_last and len(batch_indices) > 0:
-            yield batch_indices
+            # the indices are padded to `total_size`, so the last batch is evenly split by the replicas
+            local_batch_size = len(batch_indices) // self.nranks
+            start_idx = self.local_rank * local_batch_size
+            yield batch_indices[start_idx : start_idx + local_batch_size]
+
+    def _get_indices(self):
+        """the indices of the samples after `consumed_samples`, padded to `total_size` by wrapping around"""
+        num_samples = len(self.dataset)
+        if not self.shuffle:
+            return (idx % num_samples for idx in range(self.consumed_samples, self.total_size))
+        indices = np.arange(num_samples)
+        np.random.RandomState(self.seed + self.epoch).shuffle(indices)
+        indices = np.resize(indices, self.total_size)
+        return indices[self.consumed_samples :].tolist()
 
     def __len__(self):
         num_samples = self.num_samples
@@ -150,6 +180,8 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
 
         Arguments:
             epoch (int): Epoch number.
+            consumed_samples (int): The number of samples of all the replicas
+                consumed in the epoch, which are skipped. Default 0.
 
         Examples:
             .. code-block:: python
@@ -178,3 +210,145 @@ class DistributedBatchSampler(paddle.io.BatchSampler):
         self.epoch = epoch
         # if we reset the epoch, the consumed_samples should be set to 0.
         self.consumed_samples = consumed_samples
+
+    def state_dict(self):
+        """
+        Returns the position of the sampler, which is restored by
+        :code:`load_state_dict` to resume from the position without loading
+        the samples before it.
+        """
+        return {"epoch": self.epoch, "consumed_samples": self.consumed_samples}
+
+    def load_state_dict(self, state_dict):
+        self.set_epoch(state_dict["epoch"], consumed_samples=state_dict["consumed_samples"])
+
+
+class LengthGroupedBatchSampler(paddle.io.BatchSampler):
+    """Sampler that groups the samples of similar lengths into the batches under
+    a token budget, to reduce the padding of the variable-length samples.
+
+    The (shuffled) samples are split into groups of `group_size` samples. The
+    samples of a group are sorted by length, and cut into batches whose padded
+    size, the number of samples times the longest length, is at most
+    `max_tokens`. Every `num_replicas` consecutive batches make one step, which
+    gives every replica a batch of similar lengths and thus similar number of
+    tokens. The steps are built once, so that every epoch has the same number
+    of steps; every epoch only shuffles the order of the steps, and the replica
+    of :attr:`rank` takes its batch of every step.
+
+    Args:
+        dataset(paddle.io.Dataset): The dataset.
+        max_tokens(int): The maximum number of (padded) tokens of a batch. A
+            sample longer than it makes a batch alone.
+        lengths(list[int]): The lengths of the samples, which should be cheap to
+            get, e.g. a precomputed length column, rather than loading every sample.
+        group_size(int, optional): The number of samples sorted together by length.
+            The larger it is, the less padding but the less randomness. Default 10000.
+        num_replicas(int, optional): porcess number in distributed training.
+            If None, it is retrieved from :code:`paddle.distributed.ParallenEnv`.
+            Default None.
+        rank(int, optional): the rank of the current process among :attr:`num_replicas`
+            processes. If None, it is retrieved from :code:`paddle.distributed.ParallenEnv`.
+            Default None.
+        shuffle(bool): whether to shuffle the samples before grouping them (with `seed`),
+            and the order of the steps of every epoch (with `seed` plus the epoch set by
+            :code:`set_epoch`). Default True.
+        drop_last(bool): whether to drop the last batches, which are not enough for
+            all the replicas. Otherwise the first batches are repeated. Default False.
+        consumed_batches(int, optional): the number of batches of every replica
+            consumed in the current epoch, which are skipped without being loaded.
+            Default 0.
+        seed(int, optional): the base seed of the shuffles. It should be the same for
+            all the replicas. Default 0.
+    """
+
+    def __init__(
+        self,
+        dataset,
+        max_tokens,
+        lengths,
+        group_size=10000,
+        num_replicas=None,
+        rank=None,
+        shuffle=True,
+        drop_last=False,
+        consumed_batches=0,
+        seed=0,
+    ):
+        self.dataset = dataset
+        assert isinstance(max_tokens, int) and max_tokens > 0, "max_tokens should be a positive integer"
+        self.max_tokens = max_tokens
+        assert len(lengths) == len(dataset), "the number of lengths should be the number of samples"
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.group_size = group_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+        from paddle.distributed import ParallelEnv
+
+        self.nranks = num_replicas if num_replicas is not None else ParallelEnv().nranks
+        self.local_rank = rank if rank is not None else ParallelEnv().local_rank
+
+        self.seed = seed
+        self.epoch = 0
+        self.consumed_batches = consumed_batches
+        self._steps = self._build_steps()
+        # (epoch, the steps in the order of the epoch)
+        self._epoch_steps = None
+
+    def _build_steps(self):
+        """the batches of all the replicas of every step, which are the same in every epoch"""
+        indices = np.arange(len(self.lengths))
+        if self.shuffle:
+            np.random.RandomState(self.seed).shuffle(indices)
+
+        batches = []
+        for start in range(0, len(indices), self.group_size):
+            group = indices[start : start + self.group_size]
+            # the longest first, so the longest length of a batch is the length of its first sample
+            group = group[np.argsort(-self.lengths[group], kind="stable")].tolist()
+            batch = []
+            for idx in group:
+                if batch and (len(batch) + 1) * self.lengths[batch[0]] > self.max_tokens:
+                    batches.append(batch)
+                    batch = []
+                batch.append(idx)
+            if batch:
+                batches.append(batch)
+
+        num_steps, remainder = divmod(len(batches), self.nranks)
+        if remainder > 0 and not self.drop_last:
+            # repeat the first batches, so that every replica gets a batch in the last step
+            batches += [batches[idx % len(batches)] for idx in range(self.nranks - remainder)]
+            num_steps += 1
+        return [batches[step * self.nranks : (step + 1) * self.nranks] for step in range(num_steps)]
+
+    def _get_steps(self):
+        if not self.shuffle:
+            return self._steps
+        if self._epoch_steps is None or self._epoch_steps[0] != self.epoch:
+            order = np.random.RandomState(self.seed + self.epoch).permutation(len(self._steps))
+            self._epoch_steps = (self.epoch, [self._steps[idx] for idx in order])
+        return self._epoch_steps[1]
+
+    def __iter__(self):
+        for step in self._get_steps()[self.consumed_batches :]:
+            yield step[self.local_rank]
+
+    def __len__(self):
+        return len(self._steps)
+
+    def set_epoch(self, epoch=0, consumed_batches=0):
+        """
+        Sets the epoch number, which is added to `seed` as the seed of the
+        order of the steps when :attr:`shuffle=True`, and the number of batches of every replica
+        consumed in the epoch, which are skipped.
+        """
+        self.epoch = epoch
+        self.consumed_batches = consumed_batches
+
+    def state_dict(self):
+        return {"epoch": self.epoch, "consumed_batches": self.consumed_batches}
+
+    def load_state_dict(self, state_dict):
+        self.set_epoch(state_dict["epoch"], consumed_batches=state_dict["consumed_batches"])
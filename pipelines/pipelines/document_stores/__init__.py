@@ -39,6 +39,8 @@ BaiduElasticsearchDocumentStore = safe_import(
 
 FAISSDocumentStore = safe_import("pipelines.document_stores.faiss", "FAISSDocumentStore", "faiss")
 
+BM25DocumentStore = safe_import("pipelines.document_stores.bm25", "BM25DocumentStore", "sql")
+
 MilvusDocumentStore = safe_import("pipelines.document_stores.milvus2", "Milvus2DocumentStore", "milvus")
 
 from pipelines.document_stores.utils import (
@@ -297,6 +297,7 @@ class BaseDocumentStore(BaseComponent):
         index: Optional[str] = None,
         return_embedding: Optional[bool] = None,
         headers: Optional[Dict[str, str]] = None,
+        scale_score: Optional[bool] = None,
     ) -> List[List[Document]]:
         if isinstance(filters, list):
             if len(filters) != len(query_embs):
@@ -306,6 +307,8 @@ class BaseDocumentStore(BaseComponent):
                 )
         else:
             filters = [filters] * len(query_embs)
+        # only the document stores which support `scale_score` take it
+        kwargs = {} if scale_score is None else {"scale_score": scale_score}
         results = []
         for query_emb, filter in zip(query_embs, filters):
             results.append(
@@ -316,6 +319,7 @@ class BaseDocumentStore(BaseComponent):
                     index=index,
                     return_embedding=return_embedding,
                     headers=headers,
+                    **kwargs,
                 )
             )
         return results
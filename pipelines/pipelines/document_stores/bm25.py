@@ -0,0 +1,641 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from pipelines.document_stores.sql import (  # its deps are optional, but get installed with the `sql` extra
+        DocumentORM,
+        MetaDocumentORM,
+        SQLDocumentStore,
+    )
+except (ImportError, ModuleNotFoundError) as ie:
+    from pipelines.utils.import_utils import _optional_component_not_installed
+
+    _optional_component_not_installed(__name__, "sql", ie)
+
+from pipelines.document_stores.base import KeywordDocumentStore
+from pipelines.document_stores.filter_utils import LogicalFilterClause
+from pipelines.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+class BM25Index:
+    """
+    In-memory inverted index of one index of the `BM25DocumentStore`.
+
+    The posting lists are kept in CSR layout: the postings of term `t` are `postings[offsets[t]:offsets[t + 1]]`
+    (sorted document numbers) with their term frequencies in `tfs`. Every posting list is cut into blocks of
+    `block_size` postings, and each block keeps its last document number, its largest term frequency and its
+    shortest document, which bound the BM25 score of any document in the block.
+
+    New documents are buffered and merged into the arrays on the next search or save. Deleted documents are only
+    marked as such and dropped from the arrays once they make up `compact_ratio` of the index.
+    """
+
+    block_size = 128
+    compact_ratio = 0.25
+    _array_names = (
+        "offsets",
+        "postings",
+        "tfs",
+        "block_offsets",
+        "block_last_docs",
+        "block_max_tfs",
+        "block_min_lens",
+        "doc_lens",
+        "alive",
+    )
+    # memory-mapped when loaded, the other arrays are modified in place
+    _mmap_array_names = _array_names[:-2]
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.doc_nums: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.block_offsets = np.zeros(1, dtype=np.int64)
+        self.block_last_docs = np.zeros(0, dtype=np.int32)
+        self.block_max_tfs = np.zeros(0, dtype=np.uint16)
+        self.block_min_lens = np.zeros(0, dtype=np.int32)
+        self.doc_lens = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self._norms: Optional[np.ndarray] = None
+        self._avg_doc_len = 1.0
+        self._pending_terms: List[int] = []
+        self._pending_docs: List[int] = []
+        self._pending_tfs: List[int] = []
+        self._pending_lens: List[int] = []
+        self._pending_deleted: set = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_nums)
+
+    def add(self, doc_id: str, tokens: List[str]):
+        """
+        Index the `tokens` of the document `doc_id`, replacing the document if it is already indexed.
+        """
+        with self._lock:
+            if doc_id in self.doc_nums:
+                self.remove([doc_id])
+            doc_num = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.doc_nums[doc_id] = doc_num
+            for term, tf in Counter(tokens).items():
+                self._pending_terms.append(self.vocab.setdefault(term, len(self.vocab)))
+                self._pending_docs.append(doc_num)
+                self._pending_tfs.append(min(tf, np.iinfo(np.uint16).max))
+            self._pending_lens.append(len(tokens))
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                doc_num = self.doc_nums.pop(doc_id, None)
+                if doc_num is None:
+                    continue
+                if doc_num < len(self.alive):
+                    self.alive[doc_num] = False
+                else:
+                    self._pending_deleted.add(doc_num)
+
+    def commit(self):
+        """
+        Merge the buffered documents into the posting lists.
+        """
+        with self._lock:
+            if not self._pending_lens:
+                return
+            new_alive = np.ones(len(self._pending_lens), dtype=bool)
+            new_alive[np.array(list(self._pending_deleted), dtype=np.int64) - len(self.alive)] = False
+            alive = np.concatenate([self.alive, new_alive])
+            doc_lens = np.concatenate([self.doc_lens, np.array(self._pending_lens, dtype=np.int32)])
+            doc_ids = self.doc_ids
+
+            terms = np.concatenate(
+                [
+                    np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets)),
+                    np.array(self._pending_terms, dtype=np.int32),
+                ]
+            )
+            postings = np.concatenate([self.postings, np.array(self._pending_docs, dtype=np.int32)])
+            tfs = np.concatenate([self.tfs, np.array(self._pending_tfs, dtype=np.uint16)])
+
+            if (~alive).sum() > self.compact_ratio * len(alive):
+                keep = alive[postings]
+                terms, postings, tfs = terms[keep], postings[keep], tfs[keep]
+                postings = (np.cumsum(alive, dtype=np.int32) - 1)[postings]
+                doc_ids = [doc_ids[doc_num] for doc_num in np.flatnonzero(alive)]
+                doc_lens = doc_lens[alive]
+                alive = np.ones(len(doc_ids), dtype=bool)
+
+            # the pending postings come after the existing ones and are in document order, so a stable sort by term
+            # keeps every posting list sorted by document
+            order = np.argsort(terms, kind="stable")
+            postings, tfs = postings[order], tfs[order]
+            offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=offsets[1:])
+
+            self.doc_ids = doc_ids
+            self.doc_nums = {doc_id: doc_num for doc_num, doc_id in enumerate(doc_ids) if alive[doc_num]}
+            self.offsets, self.postings, self.tfs = offsets, postings, tfs
+            self.doc_lens, self.alive = doc_lens, alive
+            self._build_blocks()
+            self._norms = None
+            self._pending_terms, self._pending_docs, self._pending_tfs, self._pending_lens = [], [], [], []
+            self._pending_deleted = set()
+
+    def _build_blocks(self):
+        lengths = np.diff(self.offsets)
+        num_blocks = (lengths + self.block_size - 1) // self.block_size
+        self.block_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(num_blocks, out=self.block_offsets[1:])
+        if self.block_offsets[-1] == 0:
+            self.block_last_docs = np.zeros(0, dtype=np.int32)
+            self.block_max_tfs = np.zeros(0, dtype=np.uint16)
+            self.block_min_lens = np.zeros(0, dtype=np.int32)
+            return
+        block_terms = np.repeat(np.arange(len(lengths)), num_blocks)
+        block_ranks = np.arange(self.block_offsets[-1]) - self.block_offsets[block_terms]
+        block_starts = self.offsets[block_terms] + block_ranks * self.block_size
+        block_ends = np.minimum(block_starts + self.block_size, self.offsets[block_terms + 1])
+        self.block_last_docs = self.postings[block_ends - 1]
+        self.block_max_tfs = np.maximum.reduceat(self.tfs, block_starts)
+        self.block_min_lens = np.minimum.reduceat(self.doc_lens[self.postings], block_starts)
+
+    def _length_norms(self, doc_lens: np.ndarray) -> np.ndarray:
+        return self.k1 * (1 - self.b + self.b * doc_lens / self._avg_doc_len)
+
+    def search(
+        self,
+        tokens: List[str],
+        top_k: int = 10,
+        doc_ids: Optional[Iterable[str]] = None,
+        all_terms_must_match: bool = False,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the ids and BM25 scores of the `top_k` documents that match `tokens` best, best first.
+
+        The posting lists of the query terms whose summed maximum scores cannot reach the running top_k threshold are
+        not traversed. Those terms are only looked up for the candidates that survive pruning against their block-max
+        score bounds.
+
+        :param tokens: The tokens of the query.
+        :param top_k: How many documents to return.
+        :param doc_ids: Restrict the search to these documents.
+        :param all_terms_must_match: Only return documents which contain all the query terms.
+        """
+        self.commit()
+        with self._lock:
+            if self._norms is None:
+                self._avg_doc_len = max(float(self.doc_lens.mean()), 1.0) if len(self.doc_lens) else 1.0
+                self._norms = self._length_norms(self.doc_lens)
+            norms, alive, index_doc_ids = self._norms, self.alive.copy(), self.doc_ids
+            offsets, postings, tfs = self.offsets, self.postings, self.tfs
+            block_offsets, block_last_docs = self.block_offsets, self.block_last_docs
+            block_max_tfs, block_min_lens = self.block_max_tfs, self.block_min_lens
+            if doc_ids is not None:
+                allowed = np.zeros(len(alive), dtype=bool)
+                allowed[[self.doc_nums[doc_id] for doc_id in doc_ids if doc_id in self.doc_nums]] = True
+                alive &= allowed
+            query_terms = list(dict.fromkeys(tokens))
+            term_ids = [self.vocab[term] for term in query_terms if term in self.vocab]
+            # the postings of a term can all be compacted away
+            term_ids = [term_id for term_id in term_ids if offsets[term_id + 1] > offsets[term_id]]
+
+        if top_k <= 0 or not term_ids or (all_terms_must_match and len(term_ids) < len(query_terms)):
+            return []
+
+        num_docs = len(alive)
+        k1 = self.k1
+
+        def term_postings(term_id):
+            return postings[offsets[term_id] : offsets[term_id + 1]], tfs[offsets[term_id] : offsets[term_id + 1]]
+
+        def term_scores(idf, docs, doc_tfs):
+            doc_tfs = doc_tfs.astype(np.float64)
+            return idf * doc_tfs * (k1 + 1) / (doc_tfs + norms[docs])
+
+        dfs = np.diff(offsets)[term_ids]
+        idfs = np.log(1 + (num_docs - dfs + 0.5) / (dfs + 0.5))
+        block_bounds = []
+        for term_id, idf in zip(term_ids, idfs):
+            max_tfs = block_max_tfs[block_offsets[term_id] : block_offsets[term_id + 1]].astype(np.float64)
+            min_lens = block_min_lens[block_offsets[term_id] : block_offsets[term_id + 1]]
+            block_bounds.append(idf * max_tfs * (k1 + 1) / (max_tfs + self._length_norms(min_lens)))
+
+        scores = np.zeros(num_docs, dtype=np.float64)
+        if all_terms_must_match:
+            hits = np.zeros(num_docs, dtype=np.int32)
+            for term_id, idf in zip(term_ids, idfs):
+                docs, doc_tfs = term_postings(term_id)
+                scores[docs] += term_scores(idf, docs, doc_tfs)
+                hits[docs] += 1
+            candidates = np.flatnonzero((hits == len(term_ids)) & alive)
+            return self._top_k(index_doc_ids, candidates, scores[candidates], top_k)
+
+        # every document of the top_k of the strongest term scores at least its score for that term
+        max_bounds = np.array([bounds.max() for bounds in block_bounds])
+        order = np.argsort(max_bounds)
+        docs, doc_tfs = term_postings(term_ids[order[-1]])
+        threshold = self._kth_largest(term_scores(idfs[order[-1]], docs, doc_tfs)[alive[docs]], top_k)
+        # documents which only contain non-essential terms cannot reach the threshold
+        num_non_essential = int(np.searchsorted(np.cumsum(max_bounds[order]), threshold, side="left"))
+
+        for i in order[num_non_essential:]:
+            docs, doc_tfs = term_postings(term_ids[i])
+            scores[docs] += term_scores(idfs[i], docs, doc_tfs)
+        scores[~alive] = 0
+        candidates = np.flatnonzero(scores)
+        candidate_scores = scores[candidates]
+
+        if num_non_essential > 0:
+            threshold = max(threshold, self._kth_largest(candidate_scores, top_k))
+            upper_bounds = candidate_scores.copy()
+            for i in order[:num_non_essential]:
+                term_id = term_ids[i]
+                last_docs = block_last_docs[block_offsets[term_id] : block_offsets[term_id + 1]]
+                blocks = np.searchsorted(last_docs, candidates, side="left")
+                in_blocks = blocks < len(last_docs)
+                upper_bounds[in_blocks] += block_bounds[i][blocks[in_blocks]]
+            keep = upper_bounds >= threshold
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+
+            for i in order[:num_non_essential]:
+                docs, doc_tfs = term_postings(term_ids[i])
+                positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                found = docs[positions] == candidates
+                candidate_scores[found] += term_scores(idfs[i], candidates[found], doc_tfs[positions[found]])
+
+        return self._top_k(index_doc_ids, candidates, candidate_scores, top_k)
+
+    @staticmethod
+    def _kth_largest(scores: np.ndarray, k: int) -> float:
+        if len(scores) < k:
+            return 0.0
+        return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+    @staticmethod
+    def _top_k(doc_ids: List[str], candidates: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        if len(candidates) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(doc_ids[doc_num], float(score)) for doc_num, score in zip(candidates[top], scores[top])]
+
+    def save(self, path: Union[str, Path]):
+        self.commit()
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            for name in self._array_names:
+                np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(
+                    {"k1": self.k1, "b": self.b, "vocab": list(self.vocab), "doc_ids": self.doc_ids},
+                    f,
+                    ensure_ascii=False,
+                )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "BM25Index":
+        """
+        Load an index saved with `save()`. The posting lists are memory-mapped.
+        """
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        bm25_index = cls(k1=config["k1"], b=config["b"])
+        for name in cls._array_names:
+            mmap_mode = "r" if name in cls._mmap_array_names else None
+            setattr(bm25_index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode))
+        bm25_index.vocab = {term: term_id for term_id, term in enumerate(config["vocab"])}
+        bm25_index.doc_ids = config["doc_ids"]
+        bm25_index.doc_nums = {
+            doc_id: doc_num for doc_num, doc_id in enumerate(bm25_index.doc_ids) if bm25_index.alive[doc_num]
+        }
+        return bm25_index
+
+
+def get_tokenizer(tokenizer: Union[str, Callable[[str], List[str]]]) -> Callable[[str], List[str]]:
+    """
+    Return the tokenize function for `tokenizer`, which is one of "jieba", "lac" and "whitespace", or a function.
+    """
+    if callable(tokenizer):
+        return tokenizer
+    if tokenizer == "jieba":
+        import jieba
+
+        return jieba.lcut_for_search
+    if tokenizer == "lac":
+        try:
+            from LAC import LAC
+        except ImportError:
+            raise ImportError("Please install the dependencies first, pip install LAC --upgrade")
+        return LAC(mode="seg").run
+    if tokenizer == "whitespace":
+        return str.split
+    raise ValueError(f"Unsupported tokenizer {tokenizer}, please use one of jieba, lac and whitespace.")
+
+
+class BM25DocumentStore(SQLDocumentStore, KeywordDocumentStore):
+    """
+    A keyword DocumentStore that runs in process. The documents and their metadata are stored in a SQL database
+    and the BM25 search runs on an inverted index per index (see `BM25Index`), so `BM25Retriever` can be used without
+    an Elasticsearch service.
+    """
+
+    def __init__(
+        self,
+        sql_url: str = "sqlite:///bm25_document_store.db",
+        index: str = "document",
+        label_index: str = "label",
+        tokenizer: Union[str, Callable[[str], List[str]]] = "jieba",
+        k1: float = 1.2,
+        b: float = 0.75,
+        duplicate_documents: str = "overwrite",
+        bm25_index_path: Optional[Union[str, Path]] = None,
+        isolation_level: str = None,
+    ):
+        """
+        :param sql_url: SQL connection URL for database. It defaults to local file based SQLite DB. For large scale
+                        deployment, Postgres is recommended.
+        :param index: The default index of the documents.
+        :param label_index: The default index of the labels.
+        :param tokenizer: How to split the documents and queries into terms: "jieba" (the search mode of jieba, which
+                          suits Chinese text), "lac" (the segmentation of LAC), "whitespace" or a function that maps
+                          a text to its tokens. The terms are lowercased.
+        :param k1: The term frequency saturation of BM25.
+        :param b: The document length normalization of BM25.
+        :param duplicate_documents: Handle duplicates document based on parameter options.
+                                    Parameter options : ( 'skip','overwrite','fail')
+                                    skip: Ignore the duplicates documents
+                                    overwrite: Update any existing documents with the same ID when adding documents.
+                                    fail: an error is raised if the document ID of the document being added already
+                                    exists.
+        :param bm25_index_path: Directory of the inverted indexes saved with `save()`. The indexes are rebuilt from the
+                                SQL database if they are missing or out of sync with it.
+        :param isolation_level: see SQLAlchemy's `isolation_level` parameter for `create_engine()` (https://docs.sqlalchemy.org/en/14/core/engines.html#sqlalchemy.create_engine.params.isolation_level)
+        """
+        # save init parameters to enable export of component config as YAML
+        self.set_config(
+            sql_url=sql_url,
+            index=index,
+            label_index=label_index,
+            tokenizer=tokenizer if isinstance(tokenizer, str) else None,
+            k1=k1,
+            b=b,
+            duplicate_documents=duplicate_documents,
+            bm25_index_path=bm25_index_path,
+            isolation_level=isolation_level,
+        )
+        self.tokenizer = get_tokenizer(tokenizer)
+        self.k1 = k1
+        self.b = b
+
+        super().__init__(
+            url=sql_url,
+            index=index,
+            label_index=label_index,
+            duplicate_documents=duplicate_documents,
+            isolation_level=isolation_level,
+        )
+
+        self.bm25_indexes: Dict[str, BM25Index] = {}
+        self._synced_indexes: set = set()
+        if bm25_index_path and os.path.isdir(bm25_index_path):
+            for name in os.listdir(bm25_index_path):
+                if os.path.isfile(os.path.join(bm25_index_path, name, "index.json")):
+                    self.bm25_indexes[name] = BM25Index.load(os.path.join(bm25_index_path, name))
+
+    def _tokenize(self, text: str) -> List[str]:
+        tokens = (token.strip().lower() for token in self.tokenizer(text))
+        return [token for token in tokens if any(char.isalnum() for char in token)]
+
+    def _get_bm25_index(self, index: str) -> BM25Index:
+        """
+        Return the inverted index of `index`, (re)building it from the SQL database if it is missing or out of sync.
+        """
+        bm25_index = self.bm25_indexes.get(index)
+        if index in self._synced_indexes:
+            return bm25_index
+        num_documents = self.session.query(DocumentORM).filter_by(index=index, content_type="text").count()
+        if bm25_index is None or len(bm25_index) != num_documents:
+            if bm25_index is not None:
+                logger.warning(f"The BM25 index of '{index}' is out of sync with the SQL database, rebuilding it.")
+            bm25_index = BM25Index(k1=self.k1, b=self.b)
+            for doc in super().get_all_documents_generator(index=index, return_embedding=False):
+                if doc.content_type == "text":
+                    bm25_index.add(doc.id, self._tokenize(doc.content))
+            self.bm25_indexes[index] = bm25_index
+        self._synced_indexes.add(index)
+        return bm25_index
+
+    def _get_filtered_document_ids(self, filters: Dict[str, Any], index: str) -> List[str]:
+        document_ids = LogicalFilterClause.parse(filters).convert_to_sql(MetaDocumentORM)
+        rows = self.session.query(DocumentORM.id).filter(DocumentORM.index == index, DocumentORM.id.in_(document_ids))
+        return [row.id for row in rows]
+
+    def write_documents(
+        self,
+        documents: Union[List[dict], List[Document]],
+        index: Optional[str] = None,
+        batch_size: int = 10_000,
+        duplicate_documents: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Add new documents to the DocumentStore and index their content for keyword search.
+
+        :param documents: List of `Dicts` or List of `Documents`.
+        :param index: (SQL) index name for storing the docs and metadata
+        :param batch_size: When working with large number of documents, batching can help reduce memory footprint.
+        :param duplicate_documents: Handle duplicates document based on parameter options.
+                                    Parameter options : ( 'skip','overwrite','fail')
+                                    skip: Ignore the duplicates documents
+                                    overwrite: Update any existing documents with the same ID when adding documents.
+                                    fail: an error is raised if the document ID of the document being added already
+                                    exists.
+        :raises DuplicateDocumentError: Exception trigger on duplicate document
+        :return: None
+        """
+        if headers:
+            raise NotImplementedError("BM25DocumentStore does not support headers.")
+
+        index = index or self.index
+        duplicate_documents = duplicate_documents or self.duplicate_documents
+        assert (
+            duplicate_documents in self.duplicate_documents_options
+        ), f"duplicate_documents parameter must be {', '.join(self.duplicate_documents_options)}"
+
+        field_map = self._create_document_field_map()
+        document_objects = [
+            Document.from_dict(d, field_map=field_map) if isinstance(d, dict) else d for d in documents
+        ]
+        document_objects = self._handle_duplicate_documents(
+            documents=document_objects, index=index, duplicate_documents=duplicate_documents
+        )
+        if len(document_objects) == 0:
+            return
+
+        bm25_index = self._get_bm25_index(index)
+        super().write_documents(
+            document_objects, index=index, batch_size=batch_size, duplicate_documents=duplicate_documents
+        )
+        for doc in document_objects:
+            if doc.content_type == "text":
+                bm25_index.add(doc.id, self._tokenize(doc.content))
+            else:
+                bm25_index.remove([doc.id])
+
+    def delete_documents(
+        self,
+        index: Optional[str] = None,
+        ids: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Delete documents from the document store. All documents are deleted if no filters are passed.
+
+        :param index: Index name to delete the documents from. If None, the
+                      DocumentStore's default index (self.index) will be used.
+        :param ids: Optional list of IDs to narrow down the documents to be deleted.
+        :param filters: Optional filters to narrow down the documents to be deleted, see `query()` for the syntax.
+            If filters are provided along with a list of IDs, this method deletes the
+            intersection of the two query results (documents that match the filters and
+            have their ID in the list).
+        :return: None
+        """
+        if headers:
+            raise NotImplementedError("BM25DocumentStore does not support headers.")
+
+        index = index or self.index
+        if not filters and not ids:
+            super().delete_documents(index=index)
+            self.bm25_indexes[index] = BM25Index(k1=self.k1, b=self.b)
+            self._synced_indexes.add(index)
+            return
+
+        bm25_index = self._get_bm25_index(index)
+        document_ids = ids if not filters else self._get_filtered_document_ids(filters, index=index)
+        if filters and ids:
+            document_ids = list(set(document_ids) & set(ids))
+        if document_ids:
+            super().delete_documents(index=index, ids=document_ids)
+            bm25_index.remove(document_ids)
+
+    def query(
+        self,
+        query: Optional[str],
+        filters: Optional[Dict[str, Union[Dict, List, str, int, float, bool]]] = None,
+        top_k: int = 10,
+        custom_query: Optional[str] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        all_terms_must_match: bool = False,
+        scale_score: bool = True,
+    ) -> List[Document]:
+        """
+        Return the `top_k` documents that are most relevant to the query as defined by the BM25 algorithm.
+
+        :param query: The query. If None, the first `top_k` documents which match the filters are returned.
+        :param filters: Optional filters to narrow down the search space to documents whose metadata fulfill certain
+                        conditions, see `KeywordDocumentStore.query()` for the syntax.
+        :param top_k: How many documents to return per query.
+        :param custom_query: Not supported by BM25DocumentStore.
+        :param index: The name of the index in the DocumentStore from which to retrieve documents
+        :param headers: Not supported by BM25DocumentStore.
+        :param all_terms_must_match: Whether all terms of the query must match the document.
+        :param scale_score: Whether to scale the BM25 scores to the unit interval like ElasticsearchDocumentStore does.
+        """
+        if headers:
+            raise NotImplementedError("BM25DocumentStore does not support headers.")
+        if custom_query:
+            raise NotImplementedError("BM25DocumentStore does not support custom_query.")
+
+        index = index or self.index
+        if query is None:
+            return self.get_all_documents(index=index, filters=filters)[:top_k]
+
+        document_ids = self._get_filtered_document_ids(filters, index=index) if filters else None
+        hits = self._get_bm25_index(index).search(
+            self._tokenize(query), top_k=top_k, doc_ids=document_ids, all_terms_must_match=all_terms_must_match
+        )
+        documents = self.get_documents_by_id([doc_id for doc_id, _ in hits], index=index)
+        documents_by_id = {doc.id: doc for doc in documents}
+
+        documents = []
+        for doc_id, score in hits:
+            if doc_id not in documents_by_id:
+                continue
+            doc = copy.copy(documents_by_id[doc_id])
+            # scaling probability from BM25, the same as ElasticsearchDocumentStore
+            doc.score = float(1 / (1 + np.exp(-score / 8))) if scale_score else score
+            documents.append(doc)
+        return documents
+
+    def query_batch(
+        self,
+        queries: List[str],
+        filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None,
+        top_k: int = 10,
+        custom_query: Optional[str] = None,
+        index: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        all_terms_must_match: bool = False,
+        scale_score: bool = True,
+    ) -> List[List[Document]]:
+        """
+        Run `query()` for each of the `queries`. `filters` is either one filter for all the queries or a list with a
+        filter (or None) per query.
+        """
+        if not isinstance(filters, list):
+            filters = [filters] * len(queries)
+        elif len(filters) != len(queries):
+            raise ValueError("Number of filters does not match number of queries.")
+        return [
+            self.query(
+                query,
+                filters=query_filters,
+                top_k=top_k,
+                custom_query=custom_query,
+                index=index,
+                headers=headers,
+                all_terms_must_match=all_terms_must_match,
+                scale_score=scale_score,
+            )
+            for query, query_filters in zip(queries, filters)
+        ]
+
+    def save(self, bm25_index_path: Union[str, Path]):
+        """
+        Save the inverted indexes to `bm25_index_path`, one directory per index. Pass the path as `bm25_index_path`
+        when creating the store again to load them instead of rebuilding them from the SQL database.
+        """
+        for index, bm25_index in self.bm25_indexes.items():
+            bm25_index.save(os.path.join(bm25_index_path, index))
@@ -12,6 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
 import glob
 from typing import TYPE_CHECKING, Any
 
@@ -33,6 +34,8 @@ try:
     import faiss
 
     from pipelines.document_stores.sql import (  # its deps are optional, but get installed with the `faiss` extra
+        DocumentORM,
+        MetaDocumentORM,
         SQLDocumentStore,
     )
 except (ImportError, ModuleNotFoundError) as ie:
@@ -41,6 +44,7 @@ except (ImportError, ModuleNotFoundError) as ie:
     _optional_component_not_installed(__name__, "faiss", ie)
 
 from pipelines.document_stores.base import get_batches_from_generator
+from pipelines.document_stores.filter_utils import LogicalFilterClause
 from pipelines.schema import Document
 
 logger = logging.getLogger(__name__)
@@ -73,6 +77,7 @@ class FAISSDocumentStore(SQLDocumentStore):
         faiss_index_path: Union[str, Path, list] = None,
         faiss_config_path: Union[str, Path, list] = None,
         isolation_level: str = None,
+        filter_brute_force_threshold: int = 10_000,
         **kwargs,
     ):
         """
@@ -117,6 +122,9 @@ class FAISSDocumentStore(SQLDocumentStore):
         :param faiss_config_path: Stored FAISS initial configuration parameters.
             Can be created via calling `save()`
         :param isolation_level: see SQLAlchemy's `isolation_level` parameter for `create_engine()` (https://docs.sqlalchemy.org/en/14/core/engines.html#sqlalchemy.create_engine.params.isolation_level)
+        :param filter_brute_force_threshold: Filtered queries whose filters match at most this many documents are
+                                             answered by exact search over the matching vectors instead of a filtered
+                                             search over the FAISS index.
         """
         # special case if we want to load an existing index from disk
         # load init params from disk and run init again
@@ -140,6 +148,7 @@ class FAISSDocumentStore(SQLDocumentStore):
             embedding_field=embedding_field,
             progress_bar=progress_bar,
             isolation_level=isolation_level,
+            filter_brute_force_threshold=filter_brute_force_threshold,
         )
 
         if similarity in ("dot_product", "cosine"):
@@ -179,6 +188,7 @@ class FAISSDocumentStore(SQLDocumentStore):
 
         self.return_embedding = return_embedding
         self.embedding_field = embedding_field
+        self.filter_brute_force_threshold = filter_brute_force_threshold
 
         self.progress_bar = progress_bar
         if type(index_name) == list:
@@ -472,9 +482,9 @@ class FAISSDocumentStore(SQLDocumentStore):
         """
         Return the count of embeddings in the document store.
         """
-        if filters:
-            raise Exception("filters are not supported for get_embedding_count in FAISSDocumentStore")
         index = index or self.index
+        if filters:
+            return len(self._get_filtered_vector_ids(filters, index=index))
         return self.faiss_indexes[index].ntotal
 
     def train_index(
@@ -576,19 +586,51 @@ class FAISSDocumentStore(SQLDocumentStore):
         Find the document that is most similar to the provided `query_emb` by using a vector similarity metric.
 
         :param query_emb: Embedding of the query.
-        :param filters: Optional filters to narrow down the search space.
+        :param filters: Optional filters to narrow down the search space, see `SQLDocumentStore.get_all_documents()`
+                        for the filter syntax.
                         Example: {"name": ["some", "more"], "category": ["only_one"]}
         :param top_k: How many documents to return
         :param index: Index name to query the document from.
         :param return_embedding: To return document embedding. Unlike other document stores, FAISS will return normalized embeddings
         :return:
         """
+        return self.query_by_embedding_batch(
+            query_embs=[query_emb],
+            filters=filters,
+            top_k=top_k,
+            index=index,
+            return_embedding=return_embedding,
+            headers=headers,
+        )[0]
+
+    def query_by_embedding_batch(
+        self,
+        query_embs: Union[List[np.ndarray], np.ndarray],
+        filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None,
+        top_k: int = 10,
+        index: Optional[str] = None,
+        return_embedding: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+        scale_score: Optional[bool] = None,
+    ) -> List[List[Document]]:
+        """
+        Find the documents that are most similar to each of the provided `query_embs`. All the queries are searched
+        with one FAISS search, and the documents of all the hits are fetched with one SQL query.
+
+        :param query_embs: Embeddings of the queries, a list of vectors or a matrix of shape (queries, embedding_dim).
+        :param filters: Optional filters to narrow down the search space. Either one filter for all the queries or a
+                        list with a filter (or None) per query. The filters are resolved to the matching vector ids
+                        with a SQL query, and only those vectors are searched.
+        :param top_k: How many documents to return per query.
+        :param index: Index name to query the documents from.
+        :param return_embedding: To return document embedding. Unlike other document stores, FAISS will return
+                                 normalized embeddings
+        :param scale_score: Not supported by FAISSDocumentStore, the scores are always scaled to the unit interval.
+        :return: The documents of every query.
+        """
         if headers:
             raise NotImplementedError("FAISSDocumentStore does not support headers.")
 
-        if filters:
-            logger.warning("Query filters are not implemented for the FAISSDocumentStore.")
-
         index = index or self.index
         if not self.faiss_indexes.get(index):
             raise Exception(f"Index named '{index}' does not exists. Use 'update_embeddings()' to create an index.")
@@ -596,25 +638,146 @@ class FAISSDocumentStore(SQLDocumentStore):
         if return_embedding is None:
             return_embedding = self.return_embedding
 
-        query_emb = query_emb.reshape(1, -1).astype(np.float32)
+        if len(query_embs) == 0:
+            return []
+        query_embs = np.array(query_embs, dtype=np.float32).reshape(len(query_embs), -1)
         if self.similarity == "cosine":
-            self.normalize_embedding(query_emb)
+            norms = np.linalg.norm(query_embs, axis=1, keepdims=True)
+            np.divide(query_embs, norms, out=query_embs, where=norms != 0)
 
-        score_matrix, vector_id_matrix = self.faiss_indexes[index].search(query_emb, top_k)
-        vector_ids_for_query = [str(vector_id) + "_" + index for vector_id in vector_id_matrix[0] if vector_id != -1]
-        documents = self.get_documents_by_vector_ids(vector_ids_for_query, index=index)
+        score_matrix, vector_id_matrix = self._search(query_embs, filters=filters, top_k=top_k, index=index)
+        if self.similarity == "cosine":
+            score_matrix = (score_matrix + 1) / 2
+        else:
+            score_matrix = 1 / (1 + np.exp(-score_matrix / 100))
+
+        # fetch the documents of all the hits at once
+        hit_vector_ids = np.unique(vector_id_matrix[vector_id_matrix != -1]).tolist()
+        hit_vector_ids = [f"{vector_id}_{index}" for vector_id in hit_vector_ids]
+        documents = self.get_documents_by_vector_ids(hit_vector_ids, index=index)
+        documents_by_vector_id = {int(doc.meta["vector_id"].split("_")[0]): doc for doc in documents}
+        embeddings_by_vector_id = {}
+        if return_embedding is True:
+            for vector_id in documents_by_vector_id:
+                embeddings_by_vector_id[vector_id] = self.faiss_indexes[index].reconstruct(vector_id)
+
+        results = []
+        for vector_ids, scores in zip(vector_id_matrix.tolist(), score_matrix.tolist()):
+            query_documents = []
+            for vector_id, score in zip(vector_ids, scores):
+                if vector_id not in documents_by_vector_id:
+                    continue
+                # the queries which hit the same document get their own copies with their own scores
+                doc = copy.copy(documents_by_vector_id[vector_id])
+                doc.ann_score = score
+                if return_embedding is True:
+                    doc.embedding = embeddings_by_vector_id[vector_id]
+                query_documents.append(doc)
+            results.append(query_documents)
+        return results
+
+    def _get_filtered_vector_ids(self, filters: Dict[str, Any], index: str) -> np.ndarray:
+        """
+        Translate `filters` into a SQL query over the metadata table and return the FAISS ids of the matching
+        documents that have an embedding.
+        """
+        document_ids = LogicalFilterClause.parse(filters).convert_to_sql(MetaDocumentORM)
+        rows = self.session.query(DocumentORM.vector_id).filter(
+            DocumentORM.index == index, DocumentORM.vector_id.isnot(None), DocumentORM.id.in_(document_ids)
+        )
+        vector_ids = np.array([int(row.vector_id.split("_")[0]) for row in rows], dtype=np.int64)
+        vector_ids.sort()
+        return vector_ids
 
-        # assign query score to each document
-        scores_for_vector_ids: Dict[str, float] = {
-            str(v_id): s for v_id, s in zip(vector_id_matrix[0], score_matrix[0])
-        }
-        for doc in documents:
-            raw_score = scores_for_vector_ids[doc.meta["vector_id"].split("_")[0]]
-            doc.ann_score = self.finalize_raw_score(raw_score, self.similarity)
+    def _search(
+        self,
+        query_embs: np.ndarray,
+        filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]],
+        top_k: int,
+        index: str,
+    ):
+        """
+        Search the FAISS index of `index` and return the raw score and vector id matrices. The queries sharing a
+        filter are searched together, restricted to the vectors of the documents that match the filter.
+        """
+        faiss_index = self.faiss_indexes[index]
+        if not isinstance(filters, list):
+            filters = [filters] * len(query_embs)
+        elif len(filters) != len(query_embs):
+            raise ValueError("Number of filters does not match number of queries.")
+        if not any(filters):
+            return faiss_index.search(query_embs, top_k)
+
+        groups: Dict[str, List[int]] = {}
+        for i, query_filters in enumerate(filters):
+            key = json.dumps(query_filters, sort_keys=True, default=str) if query_filters else ""
+            groups.setdefault(key, []).append(i)
+
+        score_matrix = np.zeros((len(query_embs), top_k), dtype=np.float32)
+        vector_id_matrix = np.full((len(query_embs), top_k), -1, dtype=np.int64)
+        for key, rows in groups.items():
+            if not key:
+                scores, vector_ids = faiss_index.search(query_embs[rows], top_k)
+            else:
+                candidate_ids = self._get_filtered_vector_ids(filters[rows[0]], index=index)
+                if len(candidate_ids) == 0:
+                    continue
+                if len(candidate_ids) <= self.filter_brute_force_threshold:
+                    search = self._search_candidates
+                else:
+                    search = self._search_with_selector
+                scores, vector_ids = search(faiss_index, query_embs[rows], top_k, candidate_ids)
+            score_matrix[rows] = scores
+            vector_id_matrix[rows] = vector_ids
+        return score_matrix, vector_id_matrix
+
+    def _search_with_selector(self, faiss_index, query_embs: np.ndarray, top_k: int, candidate_ids: np.ndarray):
+        """
+        Search only the `candidate_ids` of `faiss_index` by passing an id selector to the search. FAISS versions
+        without search parameters (< 1.7.3) fall back to exact search over the candidates.
+        """
+        if not hasattr(faiss, "SearchParameters"):
+            return self._search_candidates(faiss_index, query_embs, top_k, candidate_ids)
+
+        selector = faiss.IDSelectorBatch(candidate_ids)
+        if isinstance(faiss_index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(faiss_index.hnsw.efSearch, top_k))
+        elif isinstance(faiss_index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss_index.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return faiss_index.search(query_embs, top_k, params=params)
 
-            if return_embedding is True:
-                doc.embedding = self.faiss_indexes[index].reconstruct(int(doc.meta["vector_id"].split("_")[0]))
-        return documents
+    def _search_candidates(self, faiss_index, query_embs: np.ndarray, top_k: int, candidate_ids: np.ndarray):
+        """
+        Exact search over the vectors `candidate_ids` of `faiss_index`, scored like the FAISS index would score them.
+        """
+        ivf_index = faiss.try_extract_index_ivf(faiss_index)
+        if ivf_index is not None and ivf_index.direct_map.no():
+            # IVF indexes can only reconstruct vectors by id with a direct map, which is then kept up to date. The
+            # hashtable one also supports removing ids, unlike the array one.
+            ivf_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if hasattr(faiss_index, "reconstruct_batch"):
+            vectors = faiss_index.reconstruct_batch(candidate_ids)
+        else:
+            vectors = np.vstack([faiss_index.reconstruct(int(vector_id)) for vector_id in candidate_ids])
+        scores = query_embs @ vectors.T
+        if self.metric_type == faiss.METRIC_L2:
+            # squared distances, the same as IndexFlatL2 returns
+            scores = (query_embs**2).sum(axis=1, keepdims=True) - 2 * scores + (vectors**2).sum(axis=1)
+            order_scores = scores
+        else:
+            order_scores = -scores
+
+        k = min(top_k, len(candidate_ids))
+        top = np.argpartition(order_scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(order_scores, top, axis=1), axis=1), axis=1)
+
+        score_matrix = np.zeros((len(query_embs), top_k), dtype=np.float32)
+        vector_id_matrix = np.full((len(query_embs), top_k), -1, dtype=np.int64)
+        score_matrix[:, :k] = np.take_along_axis(scores, top, axis=1)
+        vector_id_matrix[:, :k] = candidate_ids[top]
+        return score_matrix, vector_id_matrix
 
     def save(self, index_path: Union[str, Path], config_path: Optional[Union[str, Path]] = None):
         """
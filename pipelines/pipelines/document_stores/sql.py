@@ -225,7 +225,8 @@ class SQLDocumentStore(BaseDocumentStore):
             for row in query.all():
                 documents.append(self._convert_sql_row_to_document(row))
 
-        sorted_documents = sorted(documents, key=lambda doc: vector_ids.index(doc.meta["vector_id"]))
+        positions = {vector_id: position for position, vector_id in enumerate(vector_ids)}
+        sorted_documents = sorted(documents, key=lambda doc: positions[doc.meta["vector_id"]])
         return sorted_documents
 
     def get_all_documents(
@@ -15,13 +15,13 @@
 
 import logging
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
-from functools import partial, reduce
-from itertools import chain
-from typing import Generator, List, Optional, Set, Union
+from typing import Generator, Iterable, List, Optional, Set, Union
 
 import nltk
-from more_itertools import windowed
+from more_itertools import chunked, windowed
 from tqdm import tqdm
 
 from pipelines.nodes.preprocessor import BasePreProcessor
@@ -49,6 +49,18 @@ iso639_to_nltk = {
     "pt": "portuguese",
 }
 
+# the PreProcessor of the current worker process, see PreProcessor._iter_process()
+_worker_preprocessor = None
+
+
+def _init_worker(preprocessor: "PreProcessor"):
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+
+def _process_chunk(documents: List[dict], kwargs: dict) -> List[dict]:
+    return [doc for document in documents for doc in _worker_preprocessor._process_single(document, **kwargs)]
+
 
 class PreProcessor(BasePreProcessor):
     def __init__(
@@ -62,6 +74,8 @@ class PreProcessor(BasePreProcessor):
         split_answers: bool = False,
         split_respect_sentence_boundary: bool = True,
         language: str = "en",
+        num_processes: int = 1,
+        chunk_size: int = 16,
     ):
         """
         :param clean_header_footer: Use heuristic to remove footers and headers across different pages by searching
@@ -83,6 +97,9 @@ class PreProcessor(BasePreProcessor):
                                                 to True, the individual split will always have complete sentences &
                                                 the number of words will be <= split_length.
         :param language: The language used by "nltk.tokenize.sent_tokenize" in iso639 format. Available options: "en", "es", "de", "fr" & many more.
+        :param num_processes: Number of worker processes which clean and split the documents. With 1, the documents
+                              are processed in the current process.
+        :param chunk_size: Number of documents sent to a worker process at once.
         """
 
         # save init parameters to enable export of component config as YAML
@@ -95,6 +112,8 @@ class PreProcessor(BasePreProcessor):
             split_overlap=split_overlap,
             split_answers=split_answers,
             split_respect_sentence_boundary=split_respect_sentence_boundary,
+            num_processes=num_processes,
+            chunk_size=chunk_size,
         )
 
         try:
@@ -118,10 +137,12 @@ class PreProcessor(BasePreProcessor):
         self.language = language
         self.print_log: Set[str] = set()
         self.split_answers = split_answers
+        self.num_processes = num_processes
+        self.chunk_size = chunk_size
 
     def process(
         self,
-        documents: Union[dict, List[dict]],
+        documents: Union[dict, List[dict], Iterable[dict]],
         clean_whitespace: Optional[bool] = None,
         clean_header_footer: Optional[bool] = None,
         clean_empty_lines: Optional[bool] = None,
@@ -129,10 +150,18 @@ class PreProcessor(BasePreProcessor):
         split_length: Optional[int] = None,
         split_overlap: Optional[int] = None,
         split_respect_sentence_boundary: Optional[bool] = None,
-    ) -> List[dict]:
+        num_processes: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Union[List[dict], Generator[dict, None, None]]:
         """
         Perform document cleaning and splitting. Can take a single document or a list of documents as input and returns a list of documents.
+        Any other iterable of documents, e.g. a generator, is processed lazily: a generator of the split documents is
+        returned, which only reads the input as the output is consumed.
         """
+        if num_processes is None:
+            num_processes = self.num_processes
+        if chunk_size is None:
+            chunk_size = self.chunk_size
 
         kwargs = {
             "clean_whitespace": clean_whitespace,
@@ -149,8 +178,11 @@ class PreProcessor(BasePreProcessor):
         if type(documents) == dict:
             ret = self._process_single(document=documents, **kwargs)  # type: ignore
         elif type(documents) == list:
-            ret = self._process_batch(documents=list(documents), **kwargs)
-
+            ret = self._process_batch(
+                documents=list(documents), num_processes=num_processes, chunk_size=chunk_size, **kwargs
+            )
+        elif isinstance(documents, Iterable) and not isinstance(documents, str):
+            ret = self._iter_process(documents, num_processes=num_processes, chunk_size=chunk_size, **kwargs)
         else:
             raise Exception("documents provided to PreProcessor.prepreprocess() is not of type list nor Document")
 
@@ -202,9 +234,36 @@ class PreProcessor(BasePreProcessor):
         )
         return split_documents
 
-    def _process_batch(self, documents: List[dict], **kwargs) -> List[dict]:
-        nested_docs = [self._process_single(d, **kwargs) for d in tqdm(documents, unit="docs")]
-        return [d for x in nested_docs for d in x]
+    def _process_batch(
+        self, documents: List[dict], num_processes: int = 1, chunk_size: int = 16, **kwargs
+    ) -> List[dict]:
+        return list(
+            self._iter_process(
+                tqdm(documents, unit="docs"), num_processes=num_processes, chunk_size=chunk_size, **kwargs
+            )
+        )
+
+    def _iter_process(
+        self, documents: Iterable[dict], num_processes: int = 1, chunk_size: int = 16, **kwargs
+    ) -> Generator[dict, None, None]:
+        """
+        Clean and split `documents` and yield the split documents in order. With several processes, the documents are
+        sent to the workers in chunks of `chunk_size`, and at most two chunks per worker are in flight, so the input is
+        consumed only as fast as the output.
+        """
+        if num_processes <= 1:
+            for document in documents:
+                yield from self._process_single(document, **kwargs)
+            return
+
+        with ProcessPoolExecutor(max_workers=num_processes, initializer=_init_worker, initargs=(self,)) as executor:
+            futures: deque = deque()
+            for chunk in chunked(documents, chunk_size):
+                futures.append(executor.submit(_process_chunk, chunk, kwargs))
+                if len(futures) >= 2 * num_processes:
+                    yield from futures.popleft().result()
+            while futures:
+                yield from futures.popleft().result()
 
     def clean(
         self,
@@ -406,31 +465,16 @@ class PreProcessor(BasePreProcessor):
         text = "\f".join(pages)
         return text
 
-    def _ngram(self, seq: str, n: int) -> Generator[str, None, None]:
+    def _split_words(self, seq: str) -> List[str]:
         """
-        Return ngram (of tokens - currently split by whitespace)
-        :param seq: str, string from which the ngram shall be created
-        :param n: int, n of ngram
-        :return: str, ngram as string
+        Split `seq` into the words the header/footer ngrams consist of. The words are separated by spaces, and
+        newlines and tabs start a new word.
         """
-
         # In order to maintain the original whitespace, but still consider \n and \t for n-gram tokenization,
-        # we add a space here and remove it after creation of the ngrams again (see below)
+        # we add a space here and remove it when joining the words again (see below)
         seq = seq.replace("\n", " \n")
         seq = seq.replace("\t", " \t")
-
-        words = seq.split(" ")
-        ngrams = (
-            " ".join(words[i : i + n]).replace(" \n", "\n").replace(" \t", "\t") for i in range(0, len(words) - n + 1)
-        )
-
-        return ngrams
-
-    def _allngram(self, seq: str, min_ngram: int, max_ngram: int) -> Set[str]:
-        lengths = range(min_ngram, max_ngram) if max_ngram else range(min_ngram, len(seq))
-        ngrams = map(partial(self._ngram, seq), lengths)
-        res = set(chain.from_iterable(ngrams))
-        return res
+        return seq.split(" ")
 
     def _find_longest_common_ngram(
         self, sequences: List[str], max_ngram: int = 30, min_ngram: int = 3
@@ -439,6 +483,9 @@ class PreProcessor(BasePreProcessor):
         Find the longest common ngram across different text sequences (e.g. start of pages).
         Considering all ngrams between the specified range. Helpful for finding footers, headers etc.
 
+        A suffix automaton of the words of the first sequence is matched against the other sequences, which takes
+        linear time in the total number of words.
+
         :param sequences: list[str], list of strings that shall be searched for common n_grams
         :param max_ngram: int, maximum length of ngram to consider
         :param min_ngram: minimum length of ngram to consider
@@ -447,12 +494,78 @@ class PreProcessor(BasePreProcessor):
         sequences = [s for s in sequences if s]  # filter empty sequences
         if not sequences:
             return None
-        seqs_ngrams = map(partial(self._allngram, min_ngram=min_ngram, max_ngram=max_ngram), sequences)
-        intersection = reduce(set.intersection, seqs_ngrams)
 
-        try:
-            longest = max(intersection, key=len)
-        except ValueError:
-            # no common sequence found
-            longest = ""
+        # suffix automaton of the words of the first sequence
+        words = self._split_words(sequences[0])
+        lengths, links, transitions, end_positions = [0], [-1], [{}], [-1]
+        last = 0
+        for position, word in enumerate(words):
+            state = len(lengths)
+            lengths.append(lengths[last] + 1)
+            links.append(0)
+            transitions.append({})
+            end_positions.append(position)
+            p = last
+            while p != -1 and word not in transitions[p]:
+                transitions[p][word] = state
+                p = links[p]
+            if p != -1:
+                q = transitions[p][word]
+                if lengths[p] + 1 == lengths[q]:
+                    links[state] = q
+                else:
+                    clone = len(lengths)
+                    lengths.append(lengths[p] + 1)
+                    links.append(links[q])
+                    transitions.append(dict(transitions[q]))
+                    end_positions.append(end_positions[q])
+                    while p != -1 and transitions[p].get(word) == q:
+                        transitions[p][word] = clone
+                        p = links[p]
+                    links[q] = clone
+                    links[state] = clone
+            last = state
+
+        # states by decreasing length, so that matches propagate from a state to its suffix link
+        by_length: List[List[int]] = [[] for _ in range(len(words) + 1)]
+        for state, length in enumerate(lengths):
+            by_length[length].append(state)
+        states_by_length = [state for states in reversed(by_length) for state in states]
+
+        # the longest suffix of each state which occurs in all the sequences
+        common = list(lengths)
+        for sequence in sequences[1:]:
+            matched = [0] * len(lengths)
+            state, length = 0, 0
+            for word in self._split_words(sequence):
+                while state and word not in transitions[state]:
+                    state = links[state]
+                    length = lengths[state]
+                if word in transitions[state]:
+                    state = transitions[state][word]
+                    length += 1
+                matched[state] = max(matched[state], length)
+            for state in states_by_length:
+                if matched[state] and links[state] > 0:
+                    matched[links[state]] = lengths[links[state]]
+            common = [min(c, m) for c, m in zip(common, matched)]
+
+        # pick the common ngram with the most characters, the inserted spaces before newlines and tabs don't count
+        char_offsets = [0]
+        breaks = [0]
+        for word in words:
+            char_offsets.append(char_offsets[-1] + len(word))
+            breaks.append(breaks[-1] + (word[:1] in ("\n", "\t")))
+        max_n = max_ngram - 1 if max_ngram else len(words)
+        longest, longest_chars = "", -1
+        for state in range(1, len(lengths)):
+            n = min(common[state], max_n)
+            if n < min_ngram or n <= lengths[links[state]]:
+                continue
+            end = end_positions[state] + 1
+            start = end - n
+            chars = char_offsets[end] - char_offsets[start] + n - 1 - (breaks[end] - breaks[start + 1])
+            if chars > longest_chars:
+                longest = " ".join(words[start:end]).replace(" \n", "\n").replace(" \t", "\t")
+                longest_chars = chars
         return longest if longest.strip() else None
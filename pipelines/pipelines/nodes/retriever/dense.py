@@ -256,22 +256,17 @@ class DensePassageRetriever(BaseRetriever):
                 "Cannot perform retrieve_batch() since DensePassageRetriever initialized with document_store=None"
             )
             return [[] * len(queries)]  # type: ignore
-        documents = []
         query_embs: List[np.ndarray] = []
         for batch in self._get_batches(queries=queries, batch_size=batch_size):
             query_embs.extend(self.embed_queries(texts=batch, **kwargs))
-        for query_emb, cur_filters in tqdm(
-            zip(query_embs, filters), total=len(query_embs), disable=not self.progress_bar, desc="Querying"
-        ):
-            cur_docs = self.document_store.query_by_embedding(
-                query_emb=query_emb,
-                top_k=top_k,
-                filters=cur_filters,
-                index=index,
-                headers=headers,
-                return_embedding=False,
-            )
-            documents.append(cur_docs)
+        documents = self.document_store.query_by_embedding_batch(
+            query_embs=query_embs,
+            top_k=top_k,
+            filters=filters,
+            index=index,
+            headers=headers,
+            return_embedding=False,
+        )
         return documents
 
     def _get_predictions(self, dicts, **kwargs):
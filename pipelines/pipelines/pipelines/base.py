@@ -17,7 +17,9 @@ from __future__ import annotations
 
 import inspect
 import logging
+import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
@@ -371,9 +373,11 @@ class Pipeline(BasePipeline):
         meta: Optional[dict] = None,
         params: Optional[dict] = None,
         debug: Optional[bool] = None,
+        max_workers: Optional[int] = None,
     ):
         """
-        Runs the pipeline, one node at a time.
+        Runs the pipeline. A node runs once all of its predecessors have finished, and the nodes which don't depend on
+        each other (e.g. the retrievers before a `JoinDocuments` node) run concurrently in a thread pool.
 
         :param query: The search query (for query pipelines only)
         :param file_paths: The files to index (for indexing pipelines only)
@@ -387,7 +391,10 @@ class Pipeline(BasePipeline):
         :param debug: Whether the pipeline should instruct nodes to collect debug information
                       about their execution. By default these include the input parameters
                       they received and the output they generated. All debug information can
-                      then be found in the dict returned by this method under the key "_debug"
+                      then be found in the dict returned by this method under the key "_debug", together with
+                      the wall time of every node in milliseconds under "exec_time_ms".
+        :param max_workers: The maximum number of nodes running concurrently, defaults to the default of
+                            `concurrent.futures.ThreadPoolExecutor`.
         """
         # validate the node names
         if params:
@@ -424,69 +431,97 @@ class Pipeline(BasePipeline):
             queue[self.root_node]["documents"] = documents
         if meta:
             queue[self.root_node]["meta"] = meta
-        i = 0  # the first item is popped off the queue unless it is a "join" node with unprocessed predecessors
-        while queue:
-            node_id = list(queue.keys())[i]
-            node_input = queue[node_id]
-            node_input["node_id"] = node_id
-
-            # Apply debug attributes to the node input params
-            # NOTE: global debug attributes will override the value specified
-            # in each node's params dictionary.
-            if debug is not None:
-                if node_id not in node_input["params"].keys():
-                    node_input["params"][node_id] = {}
-                node_input["params"][node_id]["debug"] = debug
-
-            predecessors = set(nx.ancestors(self.graph, node_id))
-            if predecessors.isdisjoint(set(queue.keys())):  # only execute if predecessor nodes are executed
-                try:
+        node_order = {node_id: index for index, node_id in enumerate(self.graph.nodes)}
+        join_senders: Dict[str, List[str]] = {}  # the predecessors which sent the "inputs" of the join nodes
+        running: Dict[Future, tuple] = {}  # future -> (node_id, node_input, start time)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+            while queue:
+                # the nodes in the queue are executed once their predecessors are executed, and the independent
+                # nodes are executed concurrently. The running nodes stay in the queue until they finish.
+                running_nodes = {node_id for node_id, _, _ in running.values()}
+                for node_id, node_input in list(queue.items()):
+                    if node_id in running_nodes or not set(nx.ancestors(self.graph, node_id)).isdisjoint(queue):
+                        continue
+                    # the successors of a node share its output, which is copied before it is updated for this node
+                    node_input = queue[node_id] = {**node_input, "node_id": node_id}
+                    senders = join_senders.pop(node_id, [])
+                    if "inputs" in node_input and len(senders) == len(node_input["inputs"]):
+                        # the inputs of a join node keep the order of the nodes in the pipeline, however the
+                        # predecessors finish
+                        order = sorted(range(len(senders)), key=lambda index: node_order[senders[index]])
+                        node_input["inputs"] = [node_input["inputs"][index] for index in order]
+
+                    # Apply debug attributes to the node input params
+                    # NOTE: global debug attributes will override the value specified
+                    # in each node's params dictionary.
+                    if debug is not None:
+                        node_params = dict(node_input["params"])
+                        node_params[node_id] = {**node_params.get(node_id, {}), "debug": debug}
+                        node_input["params"] = node_params
                     if debug:
                         logger.debug(f"Running node `{node_id}` with input `{node_input}`")
-                    node_output, stream_id = self.graph.nodes[node_id]["component"]._dispatch_run(**node_input)
-                except Exception as e:
-                    tb = traceback.format_exc()
-                    raise Exception(
-                        f"Exception while running node `{node_id}` with input `{node_input}`: {e}, full stack trace: {tb}"
-                    )
-                queue.pop(node_id)
-                #
-                if stream_id == "split_documents":
-                    for stream_id in [key for key in node_output.keys() if key.startswith("output_")]:
-                        current_node_output = {k: v for k, v in node_output.items() if not k.startswith("output_")}
-                        current_docs = node_output.pop(stream_id)
-                        current_node_output["documents"] = current_docs
+                    component = self.graph.nodes[node_id]["component"]
+                    future = executor.submit(component._dispatch_run, **node_input)
+                    running[future] = (node_id, node_input, time.perf_counter())
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                # handle the finished nodes in the order of the queue, so that the routing is deterministic
+                queue_order = {node_id: index for index, node_id in enumerate(queue)}
+                for future in sorted(done, key=lambda future: queue_order[running[future][0]]):
+                    node_id, node_input, start_time = running.pop(future)
+                    try:
+                        node_output, stream_id = future.result()
+                    except Exception as e:
+                        tb = traceback.format_exc()
+                        raise Exception(
+                            f"Exception while running node `{node_id}` with input `{node_input}`: {e}, "
+                            f"full stack trace: {tb}"
+                        )
+                    if debug:
+                        # record the wall time of the node
+                        node_debug = node_output.setdefault("_debug", {}).setdefault(node_id, {})
+                        node_debug["exec_time_ms"] = (time.perf_counter() - start_time) * 1000
+                    queue.pop(node_id)
+                    #
+                    if stream_id == "split_documents":
+                        for stream_id in [key for key in node_output.keys() if key.startswith("output_")]:
+                            current_node_output = {
+                                k: v for k, v in node_output.items() if not k.startswith("output_")
+                            }
+                            current_docs = node_output.pop(stream_id)
+                            current_node_output["documents"] = current_docs
+                            next_nodes = self.get_next_nodes(node_id, stream_id)
+                            for n in next_nodes:
+                                queue[n] = current_node_output
+                                join_senders[n] = [node_id]
+                    else:
                         next_nodes = self.get_next_nodes(node_id, stream_id)
-                        for n in next_nodes:
-                            queue[n] = current_node_output
-                else:
-                    next_nodes = self.get_next_nodes(node_id, stream_id)
-                    for n in next_nodes:  # add successor nodes with corresponding inputs to the queue
-                        if queue.get(n):  # concatenate inputs if it's a join node
-                            existing_input = queue[n]
-                            if "inputs" not in existing_input.keys():
-                                updated_input: dict = {"inputs": [existing_input, node_output], "params": params}
-                                if query:
-                                    updated_input["query"] = query
-                                if file_paths:
-                                    updated_input["file_paths"] = file_paths
-                                if labels:
-                                    updated_input["labels"] = labels
-                                if documents:
-                                    updated_input["documents"] = documents
-                                if meta:
-                                    updated_input["meta"] = meta
-                                if history:
-                                    updated_input["history"] = history
+                        for n in next_nodes:  # add successor nodes with corresponding inputs to the queue
+                            if queue.get(n):  # concatenate inputs if it's a join node
+                                existing_input = queue[n]
+                                if "inputs" not in existing_input.keys():
+                                    updated_input: dict = {"inputs": [existing_input, node_output], "params": params}
+                                    if query:
+                                        updated_input["query"] = query
+                                    if file_paths:
+                                        updated_input["file_paths"] = file_paths
+                                    if labels:
+                                        updated_input["labels"] = labels
+                                    if documents:
+                                        updated_input["documents"] = documents
+                                    if meta:
+                                        updated_input["meta"] = meta
+                                    if history:
+                                        updated_input["history"] = history
+                                    join_senders.setdefault(n, []).append(node_id)
+                                else:
+                                    existing_input["inputs"].append(node_output)
+                                    updated_input = existing_input
+                                    join_senders.setdefault(n, []).append(node_id)
+                                queue[n] = updated_input
                             else:
-                                existing_input["inputs"].append(node_output)
-                                updated_input = existing_input
-                            queue[n] = updated_input
-                        else:
-                            queue[n] = node_output
-                i = 0
-            else:
-                i += 1  # attempt executing next node in the queue as current `node_id` has unprocessed predecessors
+                                queue[n] = node_output
+                                join_senders[n] = [node_id]
         return node_output
 
     def run_batch(  # type: ignore
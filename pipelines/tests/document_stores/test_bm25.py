@@ -0,0 +1,130 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from pipelines.document_stores.bm25 import BM25DocumentStore, BM25Index
+from pipelines.schema import Document
+
+
+def exhaustive_bm25(corpus, query, k1=1.2, b=0.75):
+    avg_doc_len = max(np.mean([len(tokens) for tokens in corpus]), 1.0)
+    scores = np.zeros(len(corpus))
+    for term in set(query):
+        df = sum(term in tokens for tokens in corpus)
+        if df == 0:
+            continue
+        idf = np.log(1 + (len(corpus) - df + 0.5) / (df + 0.5))
+        for i, tokens in enumerate(corpus):
+            tf = tokens.count(term)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_doc_len))
+    return scores
+
+
+class BM25IndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        vocab = [f"w{i}" for i in range(50)]
+        # zipfian term distribution, so that posting lists span several blocks and pruning kicks in
+        probs = 1.0 / np.arange(1, len(vocab) + 1)
+        probs /= probs.sum()
+        self.corpus = [list(rng.choice(vocab, size=rng.randint(1, 30), p=probs)) for _ in range(2000)]
+        self.bm25_index = BM25Index()
+        for i, tokens in enumerate(self.corpus):
+            self.bm25_index.add(str(i), tokens)
+
+    def check_top_k(self, query, top_k, **kwargs):
+        scores = exhaustive_bm25(self.corpus, query)
+        expected = np.sort(scores)[::-1][:top_k]
+        hits = self.bm25_index.search(query, top_k=top_k, **kwargs)
+        np.testing.assert_allclose([score for _, score in hits], expected[expected > 0], rtol=1e-6)
+        for doc_id, score in hits:
+            self.assertAlmostEqual(scores[int(doc_id)], score)
+
+    def test_search(self):
+        for query in [["w0"], ["w0", "w1", "w30"], ["w2", "w45", "w46", "w49"], ["w3", "unknown"]]:
+            for top_k in [1, 10, 100]:
+                self.check_top_k(query, top_k)
+
+    def test_all_terms_must_match(self):
+        hits = self.bm25_index.search(["w0", "w40"], top_k=10000, all_terms_must_match=True)
+        expected = {str(i) for i, tokens in enumerate(self.corpus) if "w0" in tokens and "w40" in tokens}
+        self.assertEqual({doc_id for doc_id, _ in hits}, expected)
+        self.assertEqual(self.bm25_index.search(["w0", "unknown"], all_terms_must_match=True), [])
+
+    def test_restrict_doc_ids(self):
+        doc_ids = [str(i) for i in range(0, 2000, 3)]
+        hits = self.bm25_index.search(["w1", "w20"], top_k=20, doc_ids=doc_ids)
+        self.assertEqual(len(hits), 20)
+        self.assertTrue(all(int(doc_id) % 3 == 0 for doc_id, _ in hits))
+
+    def test_incremental_updates(self):
+        self.bm25_index.search(["w0"])
+        self.bm25_index.remove([str(i) for i in range(1000)])
+        self.bm25_index.add("1999", ["w49"] * 3)
+        self.bm25_index.add("new", ["w48", "w49"])
+        hits = self.bm25_index.search(["w0", "w49"], top_k=10000)
+        doc_ids = {doc_id for doc_id, _ in hits}
+        self.assertFalse(doc_ids & {str(i) for i in range(1000)})
+        self.assertIn("new", doc_ids)
+        self.assertEqual(len(self.bm25_index), 1001)
+        self.assertEqual(hits[0][0], "1999")
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.bm25_index.save(path)
+            loaded = BM25Index.load(path)
+            query = ["w0", "w5", "w33"]
+            self.assertEqual(loaded.search(query, top_k=50), self.bm25_index.search(query, top_k=50))
+            loaded.add("new", ["w33"] * 5)
+            self.assertEqual(loaded.search(["w33"], top_k=1)[0][0], "new")
+
+
+class BM25DocumentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.document_store = BM25DocumentStore(sql_url="sqlite://", tokenizer="whitespace")
+        self.document_store.write_documents(
+            [
+                Document(content="paddle pipelines keyword search", id="1", meta={"tenant": "a"}),
+                Document(content="keyword search without elasticsearch", id="2", meta={"tenant": "b"}),
+                Document(content="semantic search with dense vectors", id="3", meta={"tenant": "a"}),
+            ]
+        )
+
+    def test_query(self):
+        documents = self.document_store.query("keyword search", top_k=2)
+        self.assertEqual({doc.id for doc in documents}, {"1", "2"})
+        self.assertTrue(all(0 < doc.score < 1 for doc in documents))
+
+        documents = self.document_store.query("keyword search", filters={"tenant": "a"})
+        self.assertEqual([doc.id for doc in documents], ["1", "3"])
+
+        documents = self.document_store.query_batch(["dense", "elasticsearch"])
+        self.assertEqual([[doc.id for doc in docs] for docs in documents], [["3"], ["2"]])
+
+    def test_write_and_delete(self):
+        self.document_store.write_documents([Document(content="dense retrieval", id="2", meta={"tenant": "b"})])
+        self.assertEqual(self.document_store.query("elasticsearch"), [])
+        self.assertEqual([doc.id for doc in self.document_store.query("dense")], ["2", "3"])
+
+        self.document_store.delete_documents(filters={"tenant": "a"})
+        self.assertEqual([doc.id for doc in self.document_store.query("search dense")], ["2"])
+        self.assertEqual(self.document_store.get_document_count(), 1)
+
+        self.document_store.delete_documents()
+        self.assertEqual(self.document_store.query("dense"), [])
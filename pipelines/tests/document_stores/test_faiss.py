@@ -0,0 +1,82 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+
+from pipelines.document_stores import FAISSDocumentStore
+from pipelines.schema import Document
+
+GROUPS = ["a", "b", "b", "c", "c", "c", "c", "c"]
+
+
+class FAISSDocumentStoreTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.embeddings = rng.rand(64, 8).astype(np.float32)
+        self.queries = rng.rand(5, 8).astype(np.float32)
+        self.documents = [
+            Document(content=f"doc {i}", id=str(i), embedding=embedding, meta={"group": GROUPS[i % len(GROUPS)]})
+            for i, embedding in enumerate(self.embeddings)
+        ]
+
+    def create_document_store(self, faiss_index_factory_str="Flat", **kwargs):
+        document_store = FAISSDocumentStore(
+            sql_url="sqlite://", embedding_dim=8, faiss_index_factory_str=faiss_index_factory_str, **kwargs
+        )
+        if "IVF" in faiss_index_factory_str:
+            document_store.train_index(self.documents)
+        document_store.write_documents(self.documents)
+        return document_store
+
+    def expected_ids(self, query, top_k, group=None):
+        scores = self.embeddings @ query
+        ids = [i for i in np.argsort(-scores) if group is None or GROUPS[i % len(GROUPS)] == group]
+        return [str(i) for i in ids[:top_k]]
+
+    def test_batch_matches_single_queries(self):
+        document_store = self.create_document_store()
+        filters = [None, {"group": ["a"]}, {"group": ["c"]}, {"group": ["a"]}, None]
+        results = document_store.query_by_embedding_batch(self.queries, filters=filters, top_k=4)
+        self.assertEqual(len(results), len(self.queries))
+        for query, query_filters, documents in zip(self.queries, filters, results):
+            expected = document_store.query_by_embedding(query, filters=query_filters, top_k=4)
+            self.assertEqual([doc.id for doc in documents], [doc.id for doc in expected])
+            np.testing.assert_allclose([doc.ann_score for doc in documents], [doc.ann_score for doc in expected])
+
+        results = document_store.query_by_embedding_batch(self.queries, top_k=3)
+        for query, documents in zip(self.queries, results):
+            self.assertEqual([doc.id for doc in documents], self.expected_ids(query, top_k=3))
+
+    def check_filtered_top_k(self, document_store):
+        for group, top_k in [("a", 3), ("a", 20), ("c", 10)]:
+            results = document_store.query_by_embedding_batch(self.queries, filters={"group": [group]}, top_k=top_k)
+            for query, documents in zip(self.queries, results):
+                self.assertTrue(all(doc.meta["group"] == group for doc in documents))
+                self.assertEqual([doc.id for doc in documents], self.expected_ids(query, top_k, group=group))
+
+    def test_filtered_top_k_with_few_candidates(self):
+        # the candidates are searched exhaustively
+        self.check_filtered_top_k(self.create_document_store())
+
+    def test_filtered_top_k_with_many_candidates(self):
+        # the candidates are searched by the FAISS index with an id selector
+        self.check_filtered_top_k(self.create_document_store(filter_brute_force_threshold=1))
+
+    def test_filtered_ivf(self):
+        # IVF indexes reconstruct the candidates with a direct map
+        document_store = self.create_document_store("IVF2,Flat")
+        self.check_filtered_top_k(document_store)
+        self.assertEqual(document_store.get_embedding_count(filters={"group": ["a"]}), 8)
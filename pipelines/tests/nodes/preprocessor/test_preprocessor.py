@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import unittest
+from copy import deepcopy
+from types import GeneratorType
 
 from pipelines.nodes.preprocessor.preprocessor import PreProcessor
 
@@ -81,3 +83,30 @@ class TestPreProcessor(unittest.TestCase):
             )
             documents = preprocessor.process(document)
             assert len(documents) == expected_documents_count
+
+    def test_clean_header_footer(self):
+        pages = [
+            f"ACME Corp Annual Report\nThis is page {i} with content {i * 7}.\nCopyright 2019 by ACME"
+            for i in range(6)
+        ]
+        document = {"content": "\f".join(pages)}
+        preprocessor = PreProcessor(clean_header_footer=True, split_by=None)
+        documents = preprocessor.process(document)
+        assert len(documents) == 1
+        assert "ACME Corp Annual Report" not in documents[0]["content"]
+        assert "Copyright 2019 by ACME" not in documents[0]["content"]
+        assert "with content 21." in documents[0]["content"]
+
+    def test_preprocess_stream(self):
+        documents = [{"content": TEXT, "meta": {"doc_id": i}} for i in range(5)]
+        preprocessor = PreProcessor(
+            split_length=10, split_overlap=0, split_by="word", split_respect_sentence_boundary=False
+        )
+        expected = preprocessor.process(deepcopy(documents))
+
+        stream = preprocessor.process(iter(deepcopy(documents)))
+        assert isinstance(stream, GeneratorType)
+        assert list(stream) == expected
+
+        parallel = preprocessor.process(deepcopy(documents), num_processes=2, chunk_size=2)
+        assert parallel == expected
@@ -0,0 +1,70 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+from pipelines.nodes.base import BaseComponent
+from pipelines.pipelines import Pipeline
+
+
+class ConcurrentNode(BaseComponent):
+    outgoing_edges = 1
+
+    def __init__(self, barrier, wait_for=None, done=None):
+        self.barrier = barrier
+        self.wait_for = wait_for
+        self.done = done
+
+    def run(self, query):
+        # the barrier is only passed if the other node runs at the same time, otherwise it is broken by the timeout
+        self.barrier.wait()
+        if self.wait_for is not None:
+            self.wait_for.wait(timeout=10)
+        if self.done is not None:
+            self.done.set()
+        return {"answer": self.name}, "output_1"
+
+    def run_batch(self):
+        raise NotImplementedError
+
+
+class JoinNode(BaseComponent):
+    outgoing_edges = 1
+
+    def run(self, inputs):
+        return {"answers": [node_input["answer"] for node_input in inputs]}, "output_1"
+
+    def run_batch(self):
+        raise NotImplementedError
+
+
+class PipelineTest(unittest.TestCase):
+    def test_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=10)
+        fast_done = threading.Event()
+        pipeline = Pipeline()
+        pipeline.add_node(component=ConcurrentNode(barrier, wait_for=fast_done), name="Slow", inputs=["Query"])
+        pipeline.add_node(component=ConcurrentNode(barrier, done=fast_done), name="Fast", inputs=["Query"])
+        pipeline.add_node(component=JoinNode(), name="Join", inputs=["Slow", "Fast"])
+
+        # the independent nodes run concurrently, so both of them pass the barrier
+        output = pipeline.run(query="query", debug=True)
+        self.assertFalse(barrier.broken)
+        # the inputs of the join node keep the order of the nodes, though "Slow" waits for "Fast" to finish
+        self.assertEqual(output["answers"], ["Slow", "Fast"])
+        # the wall time of every node is in the debug output
+        self.assertIn("exec_time_ms", output["_debug"]["Join"])
+        slow_output = output["_debug"]["Join"]["input"]["inputs"][0]
+        self.assertGreaterEqual(slow_output["_debug"]["Slow"]["exec_time_ms"], 0)
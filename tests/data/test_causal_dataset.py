@@ -0,0 +1,139 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import mock
+
+import numpy as np
+import paddle
+
+from paddlenlp.data import BatchFetchDataLoader, Stack
+from paddlenlp.data.blendable_dataset import _build_blending_indices
+from paddlenlp.data.causal_dataset import GPTDataset, _build_sample_idx
+from paddlenlp.utils.batch_sampler import DistributedBatchSampler
+
+
+def build_sample_idx_by_loop(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch):
+    num_samples = (num_epochs * tokens_per_epoch - 1) // seq_length
+    sample_idx = np.zeros([num_samples + 1, 2], dtype=np.int32)
+    doc_idx_index, doc_offset = 0, 0
+    for sample_index in range(1, num_samples + 1):
+        remaining_seq_length = seq_length + 1
+        while remaining_seq_length != 0:
+            doc_length = sizes[doc_idx[doc_idx_index]] - doc_offset
+            remaining_seq_length -= doc_length
+            if remaining_seq_length <= 0:
+                doc_offset += remaining_seq_length + doc_length - 1
+                remaining_seq_length = 0
+            else:
+                doc_idx_index += 1
+                doc_offset = 0
+        sample_idx[sample_index] = doc_idx_index, doc_offset
+    return sample_idx
+
+
+class ListIndexedDataset:
+    def __init__(self, docs):
+        self.docs = docs
+        self.sizes = np.array([len(doc) for doc in docs], dtype=np.int32)
+
+    def get(self, idx, offset=0, length=None):
+        doc = self.docs[idx]
+        return doc[offset:] if length is None else doc[offset : offset + length]
+
+
+class IndexMappingsTest(unittest.TestCase):
+    def test_build_sample_idx(self):
+        np_rng = np.random.RandomState(seed=1234)
+        sizes = np_rng.randint(0, 20, size=50).astype(np.int32)
+        num_epochs = 3
+        doc_idx = np.tile(np.arange(50, dtype=np.int32), num_epochs)
+        np_rng.shuffle(doc_idx)
+        tokens_per_epoch = int(sizes.sum())
+        for seq_length in [1, 7, 64]:
+            expected = build_sample_idx_by_loop(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch)
+            sample_idx = _build_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch, num_threads=4)
+            np.testing.assert_array_equal(sample_idx, expected)
+
+    def test_build_blending_indices(self):
+        weights = np.array([0.5, 0.3, 0.2])
+        size = 1000
+        dataset_index = np.zeros(size, dtype=np.uint8)
+        dataset_sample_index = np.zeros(size, dtype=np.int64)
+        _build_blending_indices(dataset_index, dataset_sample_index, weights, len(weights), size)
+
+        for i, weight in enumerate(weights):
+            # the samples of every dataset are taken in order
+            samples = dataset_sample_index[dataset_index == i]
+            np.testing.assert_array_equal(samples, np.arange(len(samples)))
+            # and the datasets are sampled by their weights in every prefix of the blended dataset
+            for prefix in [10, 100, size]:
+                self.assertLessEqual(abs(np.sum(dataset_index[:prefix] == i) - weight * prefix), 1)
+
+
+class GPTDatasetTest(unittest.TestCase):
+    def setUp(self):
+        np_rng = np.random.RandomState(seed=1234)
+        docs = [np.arange(size, dtype=np.int32) + 100 * i for i, size in enumerate(np_rng.randint(1, 20, size=30))]
+        indexed_dataset = ListIndexedDataset(docs)
+        self.dataset = GPTDataset("train", None, None, indexed_dataset, None, None, None, None, need_data=False)
+        num_epochs = 2
+        self.dataset.doc_idx = np.tile(np.arange(len(docs), dtype=np.int32), num_epochs)
+        np_rng.shuffle(self.dataset.doc_idx)
+        tokens_per_epoch = int(self.dataset.indexed_dataset.sizes.sum())
+        self.dataset.sample_idx = _build_sample_idx(
+            self.dataset.indexed_dataset.sizes, self.dataset.doc_idx, 16, num_epochs, tokens_per_epoch
+        )
+        self.dataset.shuffle_idx = np_rng.permutation(len(self.dataset.sample_idx) - 1)
+
+    def test_getitems(self):
+        indices = [3, 0, len(self.dataset) - 1, 3, 7]
+        for return_doc_ids in [False, True]:
+            self.dataset.return_doc_ids = return_doc_ids
+            samples = self.dataset.__getitems__(indices)
+            self.assertEqual(len(samples), len(indices))
+            for idx, sample in zip(indices, samples):
+                expected = self.dataset[idx]
+                self.assertEqual(sample.keys(), expected.keys())
+                for key in expected:
+                    self.assertEqual(sample[key].dtype, np.int64)
+                    np.testing.assert_array_equal(sample[key], expected[key])
+        self.assertEqual(self.dataset.__getitems__([]), [])
+
+    def test_batch_fetch_dataloader(self):
+        def collate_fn(samples, stack_fn=Stack()):
+            return {"input_ids": stack_fn([sample["text"] for sample in samples])}
+
+        batch_sampler = DistributedBatchSampler(self.dataset, batch_size=4, num_replicas=1, rank=0)
+        expected = [
+            batch["input_ids"].numpy()
+            for batch in paddle.io.DataLoader(self.dataset, batch_sampler=batch_sampler, collate_fn=collate_fn)
+        ]
+        dataloader = BatchFetchDataLoader(self.dataset, batch_sampler=batch_sampler, collate_fn=collate_fn)
+        self.assertIs(dataloader.batch_sampler, batch_sampler)
+        self.assertEqual(len(dataloader), len(expected))
+        getitems = GPTDataset.__getitems__
+        with mock.patch.object(GPTDataset, "__getitems__", autospec=True, side_effect=getitems) as fetch:
+            batches = [batch["input_ids"].numpy() for batch in dataloader]
+        # every batch is fetched with one call
+        self.assertEqual(fetch.call_count, len(expected))
+        self.assertEqual(len(batches), len(expected))
+        for batch, expected_batch in zip(batches, expected):
+            np.testing.assert_array_equal(batch, expected_batch)
+
+        # the data loader follows the position of the sampler
+        batch_sampler.set_epoch(0, consumed_samples=8)
+        batches = [batch["input_ids"].numpy() for batch in dataloader]
+        self.assertEqual(len(batches), len(expected) - 2)
+        np.testing.assert_array_equal(batches[0], expected[2])
@@ -0,0 +1,57 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from paddlenlp.data.indexed_dataset import (
+    CompressedIndexedDataset,
+    CompressedIndexedDatasetBuilder,
+    make_dataset,
+)
+
+
+class CompressedIndexedDatasetTest(unittest.TestCase):
+    def test_random_access(self):
+        rng = np.random.RandomState(0)
+        sentences = [rng.randint(0, 30000, size=rng.randint(1, 40)).tolist() for _ in range(100)]
+        with tempfile.TemporaryDirectory() as tempdir:
+            prefix = os.path.join(tempdir, "corpus")
+            builder = CompressedIndexedDatasetBuilder(prefix + ".bin", dtype=np.uint16, block_size=16, codec="zlib")
+            for i, sentence in enumerate(sentences):
+                builder.add_item(sentence)
+                if i % 3 == 2:
+                    builder.end_document()
+            builder.end_document()
+            builder.finalize(prefix + ".idx")
+
+            dataset = make_dataset(prefix, "compressed", skip_warmup=True)
+            self.assertIsInstance(dataset, CompressedIndexedDataset)
+            self.assertEqual(len(dataset), len(sentences))
+            self.assertEqual(dataset.sizes.tolist(), [len(sentence) for sentence in sentences])
+            self.assertEqual(dataset.doc_idx.tolist(), list(range(0, 100, 3)) + [100])
+            for i, sentence in enumerate(sentences):
+                self.assertEqual(dataset[i].tolist(), sentence)
+            self.assertEqual(dataset.get(5, offset=1).tolist(), sentences[5][1:])
+            self.assertEqual(dataset.get(7, offset=0, length=1).tolist(), sentences[7][:1])
+            self.assertEqual([s.tolist() for s in dataset[10:13]], sentences[10:13])
+
+            # the dataset is reopened in the dataloader workers
+            dataset = pickle.loads(pickle.dumps(dataset))
+            self.assertEqual(dataset[99].tolist(), sentences[99])
+            del dataset
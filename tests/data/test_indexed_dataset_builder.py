@@ -0,0 +1,107 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from paddlenlp.data.indexed_dataset import (
+    MMapIndexedDataset,
+    MMapIndexedDatasetBuilder,
+    index_file_path,
+)
+from paddlenlp.data.indexed_dataset_builder import ParallelMMapIndexedDatasetBuilder
+
+
+def encode(line):
+    text = json.loads(line)["text"]
+    doc = [[int(token) for token in sentence.split()] for sentence in text.split("|")]
+    return doc, len(text)
+
+
+def write_jsonl(path, docs):
+    with open(path, "w") as f:
+        for doc in docs:
+            text = "|".join(" ".join(str(token) for token in sentence) for sentence in doc)
+            f.write(json.dumps({"text": text}) + "\n")
+
+
+def build(output_prefix, paths, max_doc_num=sys.maxsize):
+    builder = ParallelMMapIndexedDatasetBuilder(
+        output_prefix, np.uint16, encode, num_workers=2, chunk_bytes=64, write_buffer_tokens=8
+    )
+    builder.build(paths, max_doc_num=max_doc_num)
+
+
+class ParallelMMapIndexedDatasetBuilderTest(unittest.TestCase):
+    def test_build(self):
+        docs = [[list(range(i, i + 1 + i % 3)) for _ in range(1 + i % 2)] for i in range(50)]
+        with tempfile.TemporaryDirectory() as tempdir:
+            for part in range(2):
+                write_jsonl(os.path.join(tempdir, f"part_{part}.jsonl"), docs[part * 25 : (part + 1) * 25])
+
+            output_prefix = os.path.join(tempdir, "output")
+            build(output_prefix, [os.path.join(tempdir, f"part_{part}.jsonl") for part in range(2)])
+
+            dataset = MMapIndexedDataset(output_prefix, skip_warmup=True)
+            sentences = [sentence for doc in docs for sentence in doc]
+            self.assertEqual(len(dataset), len(sentences))
+            self.assertEqual(len(dataset.doc_idx), len(docs) + 1)
+            for i, sentence in enumerate(sentences):
+                self.assertEqual(dataset[i].tolist(), sentence)
+            self.assertEqual([s.tolist() for s in dataset[3:9]], sentences[3:9])
+            del dataset
+
+    def test_max_doc_num(self):
+        # the empty documents count towards max_doc_num like the others, but are not indexed
+        docs = [[[i, i + 1]] if i % 4 else [[]] for i in range(40)]
+        with tempfile.TemporaryDirectory() as tempdir:
+            write_jsonl(os.path.join(tempdir, "part.jsonl"), docs)
+            output_prefix = os.path.join(tempdir, "output")
+            build(output_prefix, [os.path.join(tempdir, "part.jsonl")], max_doc_num=10)
+
+            dataset = MMapIndexedDataset(output_prefix, skip_warmup=True)
+            sentences = [sentence for doc in docs[:10] for sentence in doc if len(sentence) > 0]
+            self.assertEqual([s.tolist() for s in dataset[0 : len(dataset)]], sentences)
+            self.assertEqual(len(dataset.doc_idx), len(sentences) + 1)
+            del dataset
+
+    def test_merge(self):
+        docs = [[list(range(i, i + 1 + i % 3)) for _ in range(1 + i % 2)] for i in range(60)]
+        with tempfile.TemporaryDirectory() as tempdir:
+            prefixes = []
+            for part, max_doc_num in enumerate([sys.maxsize, 20]):
+                write_jsonl(os.path.join(tempdir, f"part_{part}.jsonl"), docs[part * 30 : (part + 1) * 30])
+                prefixes.append(os.path.join(tempdir, f"output_{part}"))
+                # the cut-off leaves unindexed tokens in the data file
+                build(prefixes[-1], [os.path.join(tempdir, f"part_{part}.jsonl")], max_doc_num=max_doc_num)
+
+            merged_prefix = os.path.join(tempdir, "merged")
+            builder = MMapIndexedDatasetBuilder(merged_prefix + ".bin", np.uint16)
+            for prefix in prefixes:
+                builder.merge_file_(prefix)
+            builder.finalize(index_file_path(merged_prefix))
+
+            dataset = MMapIndexedDataset(merged_prefix, skip_warmup=True)
+            merged_docs = docs[:30] + docs[30:50]
+            sentences = [sentence for doc in merged_docs for sentence in doc]
+            self.assertEqual(len(dataset), len(sentences))
+            self.assertEqual(len(dataset.doc_idx), len(merged_docs) + 1)
+            for i, sentence in enumerate(sentences):
+                self.assertEqual(dataset[i].tolist(), sentence)
+            del dataset
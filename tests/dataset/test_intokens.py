@@ -19,7 +19,12 @@ import unittest
 
 import numpy as np
 
-from paddlenlp.datasets import InTokensIterableDataset, InTokensMapDataset, load_dataset
+from paddlenlp.datasets import (
+    InTokensIterableDataset,
+    InTokensMapDataset,
+    MapDataset,
+    load_dataset,
+)
 from paddlenlp.transformers import AutoTokenizer
 from tests.testing_utils import get_tests_dir
 
@@ -149,6 +154,33 @@ class TestInTokensMapDataset(InTokensTestCommon, unittest.TestCase):
         tgt_input_ids = [sum(tgt_input_ids, [])]
         self.assertEqual(orginal_input_ids, tgt_input_ids)
 
+    def test_best_fit(self):
+        greedy = InTokensMapDataset(self.dataset, self.tokenizer, max_length=16)
+        inData = InTokensMapDataset(self.dataset, self.tokenizer, max_length=16, packing_strategy="best_fit")
+        self.assertLessEqual(len(inData), len(greedy))
+        for item in inData:
+            self.assertLessEqual(len(item["input_ids"]), 16)
+            self.assertEqual(item["attention_mask"].shape, (1, len(item["input_ids"]), len(item["input_ids"])))
+        # every record is packed once
+        self.assertEqual(sorted(sum(inData.new_data, [])), list(range(len(self.dataset))))
+
+        with self.assertRaises(ValueError):
+            InTokensMapDataset(self.dataset, self.tokenizer, max_length=16, packing_strategy="first_fit")
+
+    def test_transform_once(self):
+        transformed = []
+
+        def transform(record):
+            transformed.append(record)
+            return record
+
+        dataset = MapDataset([self.dataset[i] for i in range(len(self.dataset))]).map(transform)
+        for packing_strategy in ["greedy", "best_fit"]:
+            transformed.clear()
+            inData = InTokensMapDataset(dataset, self.tokenizer, max_length=16, packing_strategy=packing_strategy)
+            list(inData)
+            self.assertEqual(len(transformed), len(dataset))
+
 
 class TestInTokensIterableDataset(InTokensTestCommon, unittest.TestCase):
     @classmethod
@@ -209,3 +241,13 @@ class TestInTokensIterableDataset(InTokensTestCommon, unittest.TestCase):
         inData = InTokensIterableDataset(self.dataset, self.tokenizer, max_length=128)
         tgt_input_ids = [item["input_ids"] for item in inData]
         self.assertEqual(orginal_input_ids, tgt_input_ids)
+
+    def test_best_fit_global_step(self):
+        num_records = len(list(self.dataset))
+        inData = InTokensIterableDataset(
+            self.dataset, self.tokenizer, max_length=16, packing_strategy="best_fit", packing_buffer_size=4
+        )
+        global_steps = [inData.intokens_global_step for _ in inData]
+        # the records of a buffer are only counted with its last packed sample
+        self.assertTrue(all(step % 4 == 0 for step in global_steps[:-1]))
+        self.assertEqual(global_steps[-1], num_records)
@@ -0,0 +1,51 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from paddlenlp.datasets import MapDataset
+
+
+def double(example):
+    return {"id": example["id"], "value": example["value"] * 2}
+
+
+def is_even(example):
+    return example["id"] % 2 == 0
+
+
+class MapDatasetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.data = [{"id": i, "value": [i] * (i % 3 + 1)} for i in range(20)]
+
+    def test_map_with_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for num_workers in [0, 2]:
+                ds = MapDataset(list(self.data)).map(double, num_workers=num_workers, cache_dir=cache_dir)
+                self.assertEqual([ds[i] for i in range(len(ds))], [double(example) for example in self.data])
+            # both runs share the same cache
+            self.assertEqual(len([name for name in os.listdir(cache_dir) if name.startswith("map-")]), 1)
+
+            # the cache depends on the data
+            ds = MapDataset(self.data[:10]).map(double, cache_dir=cache_dir)
+            self.assertEqual(len(ds), 10)
+
+    def test_filter_with_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for num_workers in [0, 2]:
+                ds = MapDataset(list(self.data)).filter(is_even, num_workers=num_workers, cache_dir=cache_dir)
+                self.assertEqual(list(ds), [example for example in self.data if is_even(example)])
+            self.assertEqual(len([name for name in os.listdir(cache_dir) if name.startswith("filter-")]), 1)
@@ -208,6 +208,27 @@ class LogitsProcessorTest(unittest.TestCase):
             [[False, False, False], [True, False, False]],
         )
 
+    def test_no_repeat_ngram_incremental(self):
+        vocab_size = 5
+        no_repeat_proc = NoRepeatNGramLogitsProcessor(2)
+
+        input_ids = paddle.to_tensor([[1, 2, 1], [3, 4, 3]])
+        scores = no_repeat_proc(input_ids, self._get_uniform_logits(2, vocab_size))
+        self.assertListEqual(
+            (scores == paddle.finfo(scores.dtype).min).tolist(),
+            [[False, False, True, False, False], [False, False, False, False, True]],
+        )
+
+        # the hypotheses are reordered and extended like beam search, the result should be the same as a new processor
+        for input_ids in [
+            paddle.to_tensor([[3, 4, 3, 2], [3, 4, 3, 4]]),
+            paddle.to_tensor([[3, 4, 3, 4, 3], [3, 4, 3, 2, 3]]),
+            paddle.to_tensor([[1, 2, 3, 0, 1, 2]] * 2),
+        ]:
+            scores = no_repeat_proc(input_ids, self._get_uniform_logits(2, vocab_size))
+            expected_scores = NoRepeatNGramLogitsProcessor(2)(input_ids, self._get_uniform_logits(2, vocab_size))
+            self.assertListEqual(scores.tolist(), expected_scores.tolist())
+
     def test_processor_list(self):
         batch_size = 4
         sequence_length = 10
@@ -0,0 +1,68 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import paddle
+
+from paddlenlp.generation import PromptLookupProposer
+from paddlenlp.transformers import AutoModelForCausalLM
+from tests.transformers.test_modeling_common import ids_tensor
+
+
+class PromptLookupProposerTest(unittest.TestCase):
+    def test_propose(self):
+        proposer = PromptLookupProposer(max_ngram_size=2)
+        input_ids = paddle.to_tensor([[1, 2, 3, 4, 5, 1, 2], [7, 8, 9, 7, 8, 9, 6]], dtype="int64")
+        draft_tokens, draft_probs = proposer.propose(input_ids, num_tokens=3)
+
+        self.assertIsNone(draft_probs)
+        # the second sequence has no match and is padded with its last token
+        self.assertEqual(draft_tokens.tolist(), [[3, 4, 5], [6, 6, 6]])
+
+
+class SpeculativeDecodingTest(unittest.TestCase):
+    def setUp(self):
+        self.model = AutoModelForCausalLM.from_pretrained("__internal_testing__/tiny-random-llama")
+        self.model.config.eos_token_id = -1
+        self.model.eval()
+        input_ids = ids_tensor([2, 4], vocab_size=self.model.config.vocab_size, dtype="int64")
+        # repeat the prompt so that the prompt lookup can propose something
+        input_ids = paddle.concat([input_ids, input_ids], axis=-1)
+        self.kwargs = {"input_ids": input_ids, "attention_mask": paddle.ones_like(input_ids), "max_length": 12}
+
+    def test_prompt_lookup_matches_greedy_search(self):
+        expected_ids, expected_scores = self.model.generate(**self.kwargs, decode_strategy="greedy_search")
+        ids, scores = self.model.generate(**self.kwargs, decode_strategy="speculative", num_speculative_tokens=3)
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
+        self.assertTrue(paddle.allclose(scores, expected_scores, atol=1e-5).item())
+
+    def test_draft_model_matches_greedy_search(self):
+        expected_ids, _ = self.model.generate(**self.kwargs, decode_strategy="greedy_search")
+        draft_model = AutoModelForCausalLM.from_pretrained("__internal_testing__/tiny-random-llama")
+        draft_model.eval()
+        ids, _ = self.model.generate(
+            **self.kwargs, decode_strategy="speculative", draft_model=draft_model, num_speculative_tokens=3
+        )
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
+
+    def test_sampling_with_top_k_1_matches_greedy_search(self):
+        expected_ids, _ = self.model.generate(**self.kwargs, decode_strategy="greedy_search")
+        ids, _ = self.model.generate(
+            **self.kwargs, decode_strategy="speculative", do_sample=True, top_k=1, num_speculative_tokens=3
+        )
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
@@ -0,0 +1,90 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import paddle
+
+from paddlenlp.generation import StaticKVCacheLayer
+from paddlenlp.transformers import AutoModelForCausalLM
+from tests.transformers.test_modeling_common import ids_tensor
+
+
+class StaticKVCacheLayerTest(unittest.TestCase):
+    def test_update_in_place(self):
+        key = paddle.rand([2, 3, 4, 8])
+        value = paddle.rand([2, 3, 4, 8])
+        layer = StaticKVCacheLayer(key, value, max_length=5)
+
+        new_key, new_value = paddle.rand([2, 1, 4, 8]), paddle.rand([2, 1, 4, 8])
+        key_states, value_states = layer.update(new_key, new_value)
+
+        self.assertEqual(layer.seq_length, 4)
+        # the whole buffer is returned, the positions not written yet are masked by the attention mask
+        self.assertEqual(key_states.shape, [2, 5, 4, 8])
+        self.assertTrue(paddle.allclose(key_states[:, :4], paddle.concat([key, new_key], axis=1)).item())
+        self.assertTrue(paddle.allclose(layer[1], paddle.concat([value, new_value], axis=1)).item())
+
+        layer.update(new_key, new_value)
+        with self.assertRaises(ValueError):
+            layer.update(new_key, new_value)
+
+
+class StaticCacheGenerationTest(unittest.TestCase):
+    def setUp(self):
+        self.model = AutoModelForCausalLM.from_pretrained("__internal_testing__/tiny-random-llama")
+        self.model.config.eos_token_id = -1
+        self.model.eval()
+        self.input_ids = ids_tensor([2, 5], vocab_size=self.model.config.vocab_size, dtype="int64")
+
+    def test_greedy_search_matches_dynamic_cache(self):
+        kwargs = {
+            "input_ids": self.input_ids,
+            "attention_mask": paddle.ones_like(self.input_ids),
+            "decode_strategy": "greedy_search",
+            "max_length": 10,
+        }
+        expected_ids, expected_scores = self.model.generate(**kwargs)
+        ids, scores = self.model.generate(**kwargs, use_static_cache=True)
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
+        self.assertTrue(paddle.allclose(scores, expected_scores, atol=1e-5).item())
+
+    def test_greedy_search_with_padding(self):
+        attention_mask = paddle.ones_like(self.input_ids)
+        attention_mask[0, :2] = 0
+        kwargs = {
+            "input_ids": self.input_ids,
+            "attention_mask": attention_mask,
+            "decode_strategy": "greedy_search",
+            "max_length": 10,
+        }
+        expected_ids, expected_scores = self.model.generate(**kwargs)
+        ids, scores = self.model.generate(**kwargs, use_static_cache=True)
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
+        self.assertTrue(paddle.allclose(scores, expected_scores, atol=1e-5).item())
+
+    def test_sample_matches_dynamic_cache(self):
+        kwargs = {
+            "input_ids": self.input_ids,
+            "attention_mask": paddle.ones_like(self.input_ids),
+            "decode_strategy": "sampling",
+            "top_k": 1,
+            "max_length": 10,
+        }
+        expected_ids, _ = self.model.generate(**kwargs)
+        ids, _ = self.model.generate(**kwargs, use_static_cache=True)
+
+        self.assertEqual(ids.tolist(), expected_ids.tolist())
@@ -18,7 +18,11 @@ from threading import Thread
 
 import paddle
 
-from paddlenlp.generation import TextIteratorStreamer, TextStreamer
+from paddlenlp.generation import (
+    TextIteratorStreamer,
+    TextStreamer,
+    TokenIteratorStreamer,
+)
 from paddlenlp.transformers import AutoModelForCausalLM, AutoTokenizer
 from paddlenlp.transformers.utils import CaptureStd
 from tests.testing_utils import slow
@@ -110,3 +114,17 @@ class StreamerTester(unittest.TestCase):
             streamer_text = ""
             for new_text in streamer:
                 streamer_text += new_text
+
+    def test_token_iterator_streamer_matches_non_streaming(self):
+        model = AutoModelForCausalLM.from_pretrained("__internal_testing__/tiny-random-llama")
+        model.config.eos_token_id = -1
+
+        input_kwargs = self.get_inputs(model)
+        greedy_ids = model.generate(**input_kwargs)[0]
+
+        streamer = TokenIteratorStreamer(skip_prompt=True)
+        model.generate(**input_kwargs, streamer=streamer)
+        tokens = streamer.tokens()
+
+        self.assertEqual(tokens.shape, greedy_ids.shape)
+        self.assertEqual(tokens.tolist(), greedy_ids.tolist())
@@ -0,0 +1,51 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import sys
+import unittest
+
+
+class SummarizeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        sys.path.insert(0, "./llm")
+
+    def tearDown(self) -> None:
+        sys.path.remove("./llm")
+
+    def test_latency_metrics(self):
+        from benchmark_serving import summarize
+        from scheduler import GenerationRequest
+
+        request = GenerationRequest(prompt="a", arrival_time=0.0)
+        request.put("x", num_tokens=1)
+        request.put("yz", finished=True, num_tokens=2)
+        request.token_times = [1.0, 1.5, 2.0]
+        request.finish_time = 2.0
+
+        failed = GenerationRequest(prompt="b", arrival_time=0.0)
+        failed.fail(RuntimeError("oom"))
+
+        metrics = summarize([request, failed], num_input_tokens=[4, 4], duration=2.0, tokenizer=None)
+        self.assertEqual(metrics["num_completed"], 1)
+        self.assertEqual(metrics["output_token_throughput"], 1.5)
+        self.assertEqual(metrics["total_token_throughput"], 5.5)
+        self.assertAlmostEqual(metrics["mean_ttft_ms"], 1000.0)
+        self.assertAlmostEqual(metrics["p50_itl_ms"], 500.0)
+        self.assertAlmostEqual(metrics["mean_tpot_ms"], 500.0)
+        self.assertAlmostEqual(metrics["mean_e2e_latency_ms"], 2000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import sys
+import unittest
+
+
+class PrefixCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        sys.path.insert(0, "./llm")
+
+    def tearDown(self) -> None:
+        sys.path.remove("./llm")
+
+    def test_match_longest_prefix(self):
+        from prefix_cache import PrefixCache
+
+        cache = PrefixCache(block_size=2, max_num_blocks=8)
+        calls = []
+
+        def get_value(start, end):
+            calls.append((start, end))
+            return (start, end)
+
+        self.assertEqual(cache.insert([1, 2, 3, 4, 5], get_value), 2)
+        self.assertEqual(calls, [(0, 2), (2, 4)])
+
+        # the cached blocks are shared, only the new block is computed
+        self.assertEqual(cache.insert([1, 2, 3, 4, 6, 7], get_value), 1)
+        self.assertEqual(calls[-1], (4, 6))
+        self.assertEqual(len(cache), 3)
+
+        self.assertEqual(cache.match([1, 2, 3, 4, 6, 7, 8]), [(0, 2), (2, 4), (4, 6)])
+        self.assertEqual(cache.match([1, 2, 3, 9]), [(0, 2)])
+        self.assertEqual(cache.match([2, 1]), [])
+        self.assertEqual(cache.hit_rate, 8 / 13)
+
+    def test_evict_least_recently_used_leaf(self):
+        from prefix_cache import PrefixCache
+
+        cache = PrefixCache(block_size=1, max_num_blocks=3)
+        cache.insert([1, 2], lambda start, end: "a")
+        cache.insert([1, 3], lambda start, end: "b")
+        cache.match([1, 2])
+
+        # the leaf `[1, 3]` is the least recently used one, the shared block `[1]` is kept with its children
+        self.assertEqual(cache.insert([4], lambda start, end: "c"), 1)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(len(cache.match([1, 3])), 1)
+        self.assertEqual(len(cache.match([1, 2])), 2)
+
+        # the blocks of the prefix being inserted are never evicted
+        self.assertEqual(cache.insert([5, 6, 7, 8], lambda start, end: "d"), 3)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(len(cache.match([5, 6, 7])), 3)
+        self.assertEqual(cache.match([1]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class FakePredictor:
+    def __init__(self, batch_size):
+        self.config = SimpleNamespace(
+            batch_size=batch_size, max_length=16, top_k=0, top_p=0.7, temperature=0.95, repetition_penalty=1.0
+        )
+        self.tokenizer = None
+        self.tensor_parallel_rank = 0
+        self.tensor_parallel_degree = 1
+        self.batches = []
+
+    def predict(self, input_texts):
+        self.batches.append((list(input_texts), self.config.top_p))
+        return [text.upper() for text in input_texts]
+
+
+class FakeTokenizer:
+    eos_token_id = 2
+    pad_token_id = 0
+
+    def __call__(self, text, **kwargs):
+        return {"input_ids": [ord(char) for char in text]}
+
+    def decode(self, token_ids, **kwargs):
+        return "".join(chr(token_id) for token_id in token_ids)
+
+
+class FakeInferencePredictor:
+    def __init__(self, batch_size):
+        self.config = SimpleNamespace(
+            batch_size=batch_size,
+            max_length=16,
+            src_length=8,
+            total_max_length=24,
+            export_precache=False,
+            mode="dynamic",
+        )
+        self.architectures = "llamaforcausallm"
+        self.tokenizer = FakeTokenizer()
+        self.tensor_parallel_rank = 0
+        self.tensor_parallel_degree = 1
+        self.pre_ids = np.zeros([batch_size, 16], dtype="int64")
+        self.attention_mask = np.zeros([batch_size, 1, 24, 24], dtype="float32")
+        self.tgt_generation_mask = np.zeros([batch_size, 1, 1, 24], dtype="float32")
+        self.masked_rows = []
+
+    def _init_row_masks(self, row, length, pre_caches_length=0):
+        self.masked_rows.append((row, length))
+
+
+class StaticBatchSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        sys.path.insert(0, "./llm")
+
+    def tearDown(self) -> None:
+        sys.path.remove("./llm")
+
+    def test_group_by_generation_params(self):
+        from scheduler import StaticBatchScheduler
+
+        predictor = FakePredictor(batch_size=2)
+        scheduler = StaticBatchScheduler(predictor, max_wait_time=0.0)
+
+        requests = [
+            scheduler.submit("a", top_p=0.5),
+            scheduler.submit("b", top_p=0.1),
+            scheduler.submit("c", top_p=0.5),
+        ]
+
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        results = [request.result(timeout=10) for request in requests]
+        scheduler.shutdown()
+        thread.join(timeout=10)
+
+        self.assertEqual(results, ["A", "B", "C"])
+        self.assertEqual(predictor.batches, [(["a", "c"], 0.5), (["b"], 0.1)])
+
+
+class ContinuousBatchSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        sys.path.insert(0, "./llm")
+        from scheduler import ContinuousBatchScheduler
+
+        self.predictor = FakeInferencePredictor(batch_size=2)
+        self.scheduler = ContinuousBatchScheduler(self.predictor, max_wait_time=0.0)
+
+    def tearDown(self) -> None:
+        sys.path.remove("./llm")
+
+    def step(self, stop_flags):
+        """fake the outputs of `generate` which stops the rows with `stop_flags`"""
+        batch_size = self.scheduler.batch_size
+        stop_flags = np.array(stop_flags, dtype="bool").reshape([-1, 1])
+        outputs = (
+            np.full([batch_size, 1], 1, dtype="int64"),
+            self.scheduler.state["step_idx"] + 1,
+            stop_flags,
+            self.scheduler.state["seq_len_decoder"] + 1,
+            self.scheduler.state["tgt_pos"] + 1,
+        )
+        self.scheduler._update(outputs)
+
+    def test_admit_into_freed_slots(self):
+        requests = [self.scheduler.submit(prompt) for prompt in ["ab", "cde", "f"]]
+        input_ids = self.scheduler._admit(self.scheduler._next_admissions())
+        self.assertEqual(input_ids.tolist(), [[97, 98, 0], [99, 100, 101]])
+        self.assertEqual([slot.request for slot in self.scheduler.slots], requests[:2])
+        self.assertEqual(self.scheduler.num_running, 2)
+
+        # the second row is stopped, and the waiting request takes its slot
+        self.step([False, True])
+        self.assertTrue(requests[1].finished)
+        self.assertIsNone(self.scheduler.slots[1])
+        self.assertEqual(self.scheduler.num_running, 1)
+
+        input_ids = self.scheduler._admit(self.scheduler._next_admissions())
+        self.assertEqual(input_ids.tolist(), [[0], [102]])
+        self.assertEqual(self.scheduler.slots[1].request, requests[2])
+        self.assertEqual(self.scheduler.state["seq_len_encoder"].ravel().tolist(), [0, 1])
+        self.assertEqual(self.scheduler.state["stop_flags"].ravel().tolist(), [False, False])
+        self.assertEqual(self.predictor.masked_rows, [(0, 2), (1, 3), (1, 1)])
+
+    def test_stop_flags(self):
+        request = self.scheduler.submit("ab")
+        self.scheduler._admit(self.scheduler._next_admissions())
+
+        # the idle row is stopped all along, which releases no slot
+        self.step([False, True])
+        self.assertFalse(request.finished)
+        self.assertEqual(self.scheduler.num_running, 1)
+
+        self.step([True, True])
+        self.assertTrue(request.finished)
+        self.assertEqual(self.scheduler.num_running, 0)
+        self.assertEqual(self.scheduler.slots, [None, None])
+
+        # no request is waiting: a dummy row runs the encoder in a free slot and the slot stays free
+        input_ids = self.scheduler._admit([])
+        self.assertEqual(input_ids.tolist(), [[0], [0]])
+        self.assertEqual(self.scheduler.state["seq_len_encoder"].ravel().tolist(), [1, 0])
+        self.assertEqual(self.scheduler.num_running, 0)
+
+    def test_full_batch(self):
+        requests = [self.scheduler.submit(prompt) for prompt in ["ab", "c", "d"]]
+        self.scheduler._admit(self.scheduler._next_admissions())
+        self.assertEqual(self.scheduler.num_running, 2)
+
+        # no slot is free, the waiting request stays in the queue and every row continues decoding
+        admissions = self.scheduler._next_admissions()
+        self.assertEqual(admissions, [])
+        input_ids = self.scheduler._admit(admissions)
+        self.assertEqual(input_ids.tolist(), [[0], [0]])
+        self.assertEqual(self.scheduler.state["seq_len_encoder"].ravel().tolist(), [0, 0])
+        self.assertEqual(self.scheduler.waiting.qsize(), 1)
+
+        self.step([True, False])
+        self.scheduler._admit(self.scheduler._next_admissions())
+        self.assertEqual([slot.request for slot in self.scheduler.slots], [requests[2], requests[1]])
+
+        self.scheduler._fail_all(RuntimeError("inference failed"))
+        self.assertEqual(self.scheduler.num_running, 0)
+        self.assertIsInstance(requests[2].error, RuntimeError)
@@ -0,0 +1,80 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+
+from paddlenlp.server.batcher import DynamicBatcher
+
+
+class DynamicBatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def run_batcher(self, run_fn, requests, coalesce=True):
+        def record(worker, data, parameters):
+            with self.lock:
+                self.calls.append(data)
+            return run_fn(data)
+
+        # the worker waits long enough for all the requests to arrive before it runs the first batch
+        self.batcher = DynamicBatcher([None], record, max_batch_size=32, max_wait_time=0.5, coalesce=coalesce)
+        futures = [self.batcher.submit(data, {}) for data in requests]
+        return [future.result(timeout=10) for future in futures]
+
+    def test_str_and_list_requests(self):
+        def taskflow(data):
+            # taskflows unwrap the result of a single text
+            if isinstance(data["text"], str):
+                return data["text"].upper()
+            return [text.upper() for text in data["text"]]
+
+        results = self.run_batcher(taskflow, [{"text": ["a", "b"]}, {"text": "c"}, {"text": ["d"]}])
+        self.assertEqual(results, [["A", "B"], "C", ["D"]])
+        self.assertIn({"text": "c"}, self.calls)
+        self.assertIn({"text": ["a", "b", "d"]}, self.calls)
+
+    def test_dict_outputs(self):
+        def classify(data):
+            return {"label": [len(text) for text in data["text"]], "score": [1.0 for _ in data["text"]]}
+
+        results = self.run_batcher(classify, [{"text": ["a", "bb"]}, {"text": ["ccc"]}])
+        self.assertEqual(results, [{"label": [1, 2], "score": [1.0, 1.0]}, {"label": [3], "score": [1.0]}])
+        self.assertEqual(self.calls, [{"text": ["a", "bb", "ccc"]}])
+
+    def test_dict_outputs_not_split(self):
+        def custom_model(data):
+            # like CustomModelHandler, which returns the last text next to the per-text results
+            return {"label": [len(text) for text in data["text"]], "data": data["text"][-1]}
+
+        results = self.run_batcher(custom_model, [{"text": ["a", "bb"]}, {"text": ["ccc"]}])
+        self.assertEqual(results, [{"label": [1, 2], "data": "bb"}, {"label": [3], "data": "ccc"}])
+        self.assertEqual(self.calls, [{"text": ["a", "bb", "ccc"]}, {"text": ["a", "bb"]}, {"text": ["ccc"]}])
+
+        # the batcher stops coalescing after the first output which can not be split
+        self.calls.clear()
+        futures = [self.batcher.submit(data, {}) for data in [{"text": ["d"]}, {"text": ["ee"]}]]
+        results = [future.result(timeout=10) for future in futures]
+        self.assertEqual(results, [{"label": [1], "data": "d"}, {"label": [2], "data": "ee"}])
+        self.assertEqual(self.calls, [{"text": ["d"]}, {"text": ["ee"]}])
+
+    def test_no_coalesce(self):
+        def custom_model(data):
+            return {"label": [len(text) for text in data["text"]], "data": data["text"][-1]}
+
+        results = self.run_batcher(custom_model, [{"text": ["a", "bb"]}, {"text": ["ccc"]}], coalesce=False)
+        self.assertEqual(results, [{"label": [1, 2], "data": "bb"}, {"label": [3], "data": "ccc"}])
+        # every request runs once, alone
+        self.assertEqual(self.calls, [{"text": ["a", "bb"]}, {"text": ["ccc"]}])
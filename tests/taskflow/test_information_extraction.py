@@ -14,6 +14,8 @@
 
 import unittest
 
+import numpy as np
+
 from paddlenlp import Taskflow
 
 from ..testing_utils import get_tests_dir
@@ -101,6 +103,22 @@ class TestUIETask(unittest.TestCase):
                         self.assertIn("text", relation)
                         self.assertIn("probability", relation)
 
+    def test_encode_pair_matches_tokenizer(self):
+        prompt, text = "选手", "2月8日上午北京冬奥会自由式滑雪女子大跳台决赛中中国选手谷爱凌以188.25分获得金牌！"
+        for task in [self.uie.task_instance, self.uie_m.task_instance]:
+            encoded_inputs = task._tokenizer(
+                text=[prompt],
+                text_pair=[text],
+                truncation=True,
+                max_seq_len=task._max_seq_len,
+                return_token_type_ids=True,
+                return_position_ids=True,
+                return_offsets_mapping=True,
+            )
+            cached_inputs = task._encode_pair(prompt, text)
+            for key in ["input_ids", "token_type_ids", "position_ids", "offset_mapping"]:
+                self.assertEqual(np.array(cached_inputs[key]).tolist(), np.array(encoded_inputs[key][0]).tolist())
+
     def test_doc_entity_extraction(self):
         doc_path = get_tests_dir("fixtures/tests_samples/OCR/custom.jpeg")
 
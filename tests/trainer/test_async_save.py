@@ -0,0 +1,148 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import paddle
+
+from paddlenlp.trainer import Trainer, TrainerState
+from paddlenlp.trainer.trainer_utils import (
+    CHECKPOINT_DONE_MARKER,
+    CHECKPOINT_SAVING_MARKER,
+    get_last_checkpoint,
+    is_checkpoint_complete,
+)
+from paddlenlp.trainer.utils.async_save import (
+    AsyncCheckpointSaver,
+    count_ranks_sharing_dir,
+)
+
+
+class RotatingTrainer:
+    _sorted_checkpoints = Trainer._sorted_checkpoints
+    _rotate_checkpoints = Trainer._rotate_checkpoints
+
+    def __init__(self, save_total_limit):
+        self.args = SimpleNamespace(save_total_limit=save_total_limit, world_size=1)
+        self.state = TrainerState()
+
+
+class AsyncCheckpointSaverTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.output_dir = self.tempdir.name
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def save_checkpoint(self, saver, step, callback=None):
+        checkpoint = os.path.join(self.output_dir, f"checkpoint-{step}")
+        saver.begin(checkpoint)
+        saver.save({"weight": paddle.full([2, 2], step, dtype="float32")}, os.path.join(checkpoint, "model.pdparams"))
+        saver.commit(checkpoint, callback=callback)
+        return checkpoint
+
+    def test_marker_rename(self):
+        savers = [AsyncCheckpointSaver(process_index=rank, world_size=2) for rank in range(2)]
+        checkpoint = self.save_checkpoint(savers[0], 1)
+        savers[0].wait()
+        self.assertEqual(os.listdir(checkpoint).count(f"{CHECKPOINT_DONE_MARKER}_0"), 1)
+        self.assertNotIn(f"{CHECKPOINT_SAVING_MARKER}_0", os.listdir(checkpoint))
+        state_dict = paddle.load(os.path.join(checkpoint, "model.pdparams"))
+        self.assertTrue(paddle.equal_all(state_dict["weight"], paddle.full([2, 2], 1, dtype="float32")).item())
+        # the checkpoint is incomplete until all the ranks are done
+        self.assertFalse(is_checkpoint_complete(checkpoint))
+        self.assertFalse(is_checkpoint_complete(checkpoint, world_size=2))
+        self.assertIsNone(get_last_checkpoint(self.output_dir))
+
+        savers[1].begin(checkpoint)
+        self.assertFalse(is_checkpoint_complete(checkpoint))
+        savers[1].commit(checkpoint)
+        savers[1].wait()
+        self.assertTrue(is_checkpoint_complete(checkpoint))
+        self.assertEqual(get_last_checkpoint(self.output_dir), checkpoint)
+
+    def test_local_disk(self):
+        # the ranks 2 and 3 of a job of 4 ranks, whose node saves to its local disk
+        other_probe = os.path.join(self.output_dir, ".rank_probe_3")
+        # the other rank of the node writes its probe before the first barrier, and removes it after the second one
+        barriers = iter([lambda: open(other_probe, "w").close(), lambda: os.remove(other_probe)])
+        with mock.patch("paddle.distributed.barrier", side_effect=lambda: next(barriers)()):
+            num_ranks = count_ranks_sharing_dir(self.output_dir, 2)
+        self.assertEqual(num_ranks, 2)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+        savers = [AsyncCheckpointSaver(process_index=rank, world_size=num_ranks) for rank in [2, 3]]
+        for saver in savers:
+            checkpoint = self.save_checkpoint(saver, 1)
+            saver.wait()
+        self.assertTrue(is_checkpoint_complete(checkpoint))
+        self.assertEqual(get_last_checkpoint(self.output_dir), checkpoint)
+
+    def test_rotate_with_best_model_snapshot(self):
+        saver = AsyncCheckpointSaver()
+        trainer = RotatingTrainer(save_total_limit=1)
+        checkpoints = [self.save_checkpoint(saver, step) for step in range(1, 4)]
+        saver.wait()
+
+        # the best model checkpoint when checkpoint-3 is committed is kept, even if the state is updated later
+        trainer.state.best_model_checkpoint = checkpoints[2]
+        trainer._rotate_checkpoints(output_dir=self.output_dir, best_model_checkpoint=checkpoints[0])
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ["checkpoint-1", "checkpoint-3"])
+
+    def test_skip_rotation_while_saving(self):
+        saver = AsyncCheckpointSaver()
+        trainer = RotatingTrainer(save_total_limit=1)
+        self.save_checkpoint(saver, 1)
+        saver.wait()
+
+        saving = threading.Event()
+        save = paddle.save
+        with mock.patch("paddle.save", side_effect=lambda obj, path: saving.wait() and save(obj, path)):
+            checkpoint_2 = self.save_checkpoint(saver, 2)
+            # checkpoint-2 is being saved, so it is neither counted nor deleted
+            self.assertFalse(is_checkpoint_complete(checkpoint_2))
+            trainer._rotate_checkpoints(output_dir=self.output_dir)
+            self.assertEqual(sorted(os.listdir(self.output_dir)), ["checkpoint-1", "checkpoint-2"])
+            saving.set()
+            saver.wait()
+
+        # the older checkpoints are deleted once the new one is complete
+        checkpoint_3 = self.save_checkpoint(
+            saver, 3, callback=lambda: trainer._rotate_checkpoints(output_dir=self.output_dir)
+        )
+        saver.wait()
+        self.assertEqual(os.listdir(self.output_dir), ["checkpoint-3"])
+        self.assertTrue(is_checkpoint_complete(checkpoint_3))
+
+    def test_error_propagation(self):
+        saver = AsyncCheckpointSaver()
+        with mock.patch("paddle.save", side_effect=IOError("disk full")):
+            checkpoint = self.save_checkpoint(saver, 1)
+            with self.assertRaises(RuntimeError) as context:
+                saver.wait()
+        self.assertIsInstance(context.exception.__cause__, IOError)
+        # the failed checkpoint is never marked done
+        self.assertFalse(is_checkpoint_complete(checkpoint))
+        self.assertIsNone(get_last_checkpoint(self.output_dir))
+
+        # the error is raised once, and the later checkpoints are saved
+        checkpoint = self.save_checkpoint(saver, 2)
+        saver.wait()
+        self.assertTrue(is_checkpoint_complete(checkpoint))
@@ -0,0 +1,77 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import numpy as np
+import paddle
+
+from paddlenlp.trainer.utils.helper import (
+    EvalLoopContainer,
+    nested_concat,
+    nested_pad_and_concatenate,
+)
+
+
+class NestedPadAndConcatenateTest(unittest.TestCase):
+    def test_same_width(self):
+        chunks = [np.arange(6).reshape([2, 3]), np.arange(3).reshape([1, 3])]
+        np.testing.assert_array_equal(nested_pad_and_concatenate(chunks), np.concatenate(chunks))
+        chunks = [np.arange(2), np.arange(3)]
+        np.testing.assert_array_equal(nested_pad_and_concatenate(chunks), np.concatenate(chunks))
+
+    def test_mixed_width(self):
+        chunks = [np.ones([2, 3, 2]), np.full([1, 5, 2], 2.0), np.full([2, 1, 2], 3.0)]
+        result = nested_pad_and_concatenate(chunks)
+        self.assertEqual(result.shape, (5, 5, 2))
+        self.assertEqual(result.dtype, chunks[0].dtype)
+        np.testing.assert_array_equal(result[:2, :3], chunks[0])
+        np.testing.assert_array_equal(result[:2, 3:], -100)
+        np.testing.assert_array_equal(result[2:3], chunks[1])
+        np.testing.assert_array_equal(result[3:, :1], chunks[2])
+        np.testing.assert_array_equal(result[3:, 1:], -100)
+
+    def test_nested(self):
+        chunks = [(np.zeros([2, 2]), [np.arange(2)]), (np.ones([1, 4]), [np.arange(1)])]
+        preds, (labels,) = nested_pad_and_concatenate(chunks, padding_index=-1)
+        np.testing.assert_array_equal(preds, [[0, 0, -1, -1], [0, 0, -1, -1], [1, 1, 1, 1]])
+        np.testing.assert_array_equal(labels, [0, 1, 0])
+
+
+class EvalLoopContainerTest(unittest.TestCase):
+    def test_get_arrays(self):
+        chunks = [np.random.rand(2, width).astype("float32") for width in [3, 5, 3, 4]]
+        expected = None
+        for chunk in chunks:
+            expected = chunk if expected is None else nested_concat(expected, chunk)
+
+        container = EvalLoopContainer()
+        for step, chunk in enumerate(chunks):
+            container.add(paddle.to_tensor(chunk))
+            if step == 1:
+                container.to_cpu_and_numpy()
+        np.testing.assert_array_equal(container.get_arrays(), expected)
+        # the result is kept
+        np.testing.assert_array_equal(container.get_arrays(), expected)
+
+    def test_nested(self):
+        container = EvalLoopContainer(padding_index=0)
+        container.add((paddle.ones([1, 2]), paddle.to_tensor([1])))
+        container.add((paddle.ones([2, 3]), paddle.to_tensor([2, 3])))
+        preds, labels = container.get_arrays()
+        np.testing.assert_array_equal(preds, [[1, 1, 0], [1, 1, 1], [1, 1, 1]])
+        np.testing.assert_array_equal(labels, [1, 2, 3])
+
+    def test_empty(self):
+        self.assertIsNone(EvalLoopContainer().get_arrays())
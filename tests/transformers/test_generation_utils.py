@@ -1154,6 +1154,27 @@ class GenerationUtilsTestCase(unittest.TestCase):
         )[0].tolist()
         self.assertEqual(expected_output_ids, decoded_ids)
 
+    def test_drop_finished_sequences(self):
+        model = GPTLMHeadModel.from_pretrained("__internal_testing__/tiny-random-gpt")
+        model.eval()
+
+        # the second sequence finishes at the third step
+        input_ids = paddle.to_tensor(np.array([list(range(200, 300)), list(range(100, 200))]))
+        for decode_strategy, num_beams in [("greedy_search", 1), ("sampling", 1), ("beam_search", 2)]:
+            kwargs = {
+                "max_length": 6,
+                "eos_token_id": 23410,
+                "decode_strategy": decode_strategy,
+                "num_beams": num_beams,
+            }
+            if decode_strategy == "sampling":
+                kwargs["top_k"] = 1
+            expected_ids, expected_scores = model.generate(input_ids, **kwargs)
+            ids, scores = model.generate(input_ids, drop_finished_sequences=True, **kwargs)
+
+            self.assertEqual(expected_ids.tolist(), ids.tolist())
+            self.assertTrue(paddle.allclose(expected_scores, scores, atol=1e-5).item())
+
 
 # TODO (wj-Mcat: enable the unit test after fix)
 # class GenerationD2STest(unittest.TestCase):
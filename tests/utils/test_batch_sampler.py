@@ -0,0 +1,102 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from paddlenlp.utils.batch_sampler import DistributedBatchSampler, LengthGroupedBatchSampler
+
+
+class DistributedBatchSamplerTest(unittest.TestCase):
+    def test_resume_from_state_dict(self):
+        dataset = list(range(22))
+        sampler = DistributedBatchSampler(dataset, batch_size=2, num_replicas=2, rank=1, shuffle=True)
+        sampler.set_epoch(3)
+        batches = list(sampler)
+
+        # the replicas take different samples, and the last batch is evenly split
+        other = DistributedBatchSampler(dataset, batch_size=2, num_replicas=2, rank=0, shuffle=True)
+        other.set_epoch(3)
+        other_batches = list(other)
+        self.assertEqual(len(batches), len(other_batches))
+        self.assertEqual(sorted(sum(batches + other_batches, [])), dataset)
+
+        resumed = DistributedBatchSampler(dataset, batch_size=2, num_replicas=2, rank=1, shuffle=True)
+        resumed.load_state_dict({"epoch": 3, "consumed_samples": 8})
+        self.assertEqual(resumed.state_dict(), {"epoch": 3, "consumed_samples": 8})
+        self.assertEqual(list(resumed), batches[2:])
+
+    def test_no_shuffle(self):
+        sampler = DistributedBatchSampler(list(range(5)), batch_size=2, num_replicas=1, rank=0, consumed_samples=2)
+        self.assertEqual(list(sampler), [[2, 3], [4]])
+
+    def test_seed(self):
+        def get_batches(seed, epoch):
+            sampler = DistributedBatchSampler(
+                list(range(32)), batch_size=4, num_replicas=1, rank=0, shuffle=True, seed=seed
+            )
+            sampler.set_epoch(epoch)
+            return list(sampler)
+
+        self.assertEqual(get_batches(seed=42, epoch=1), get_batches(seed=42, epoch=1))
+        self.assertNotEqual(get_batches(seed=42, epoch=1), get_batches(seed=7, epoch=1))
+        self.assertNotEqual(get_batches(seed=42, epoch=1), get_batches(seed=42, epoch=2))
+
+
+class LengthGroupedBatchSamplerTest(unittest.TestCase):
+    def test_token_budget(self):
+        lengths = [(i * 7) % 23 + 1 for i in range(100)]
+        kwargs = dict(max_tokens=40, lengths=lengths, group_size=50, num_replicas=2)
+        samplers = [LengthGroupedBatchSampler(list(range(100)), rank=rank, **kwargs) for rank in range(2)]
+        for sampler in samplers:
+            sampler.set_epoch(1)
+        batches = [list(sampler) for sampler in samplers]
+        self.assertEqual(len(batches[0]), len(batches[1]))
+        self.assertEqual(len(batches[0]), len(samplers[0]))
+        for batch in batches[0] + batches[1]:
+            self.assertTrue(len(batch) == 1 or len(batch) * max(lengths[idx] for idx in batch) <= 40)
+        # every sample is taken, the first batches may be repeated for the last step
+        self.assertEqual(set(sum(batches[0] + batches[1], [])), set(range(100)))
+
+        resumed = LengthGroupedBatchSampler(list(range(100)), rank=1, **kwargs)
+        resumed.load_state_dict({"epoch": 1, "consumed_batches": 3})
+        self.assertEqual(list(resumed), batches[1][3:])
+
+    def test_seed(self):
+        def get_batches(seed):
+            lengths = [i % 10 + 1 for i in range(100)]
+            sampler = LengthGroupedBatchSampler(
+                list(range(100)), max_tokens=40, lengths=lengths, num_replicas=1, rank=0, seed=seed
+            )
+            sampler.set_epoch(1)
+            return list(sampler)
+
+        self.assertEqual(get_batches(seed=42), get_batches(seed=42))
+        self.assertNotEqual(get_batches(seed=42), get_batches(seed=7))
+
+    def test_fixed_steps_per_epoch(self):
+        lengths = [(i * 13) % 31 + 1 for i in range(200)]
+        sampler = LengthGroupedBatchSampler(
+            list(range(200)), max_tokens=50, lengths=lengths, group_size=40, num_replicas=1, rank=0
+        )
+        num_steps = len(sampler)
+        batches = []
+        for epoch in range(3):
+            sampler.set_epoch(epoch)
+            self.assertEqual(len(sampler), num_steps)
+            batches.append(list(sampler))
+            self.assertEqual(len(batches[-1]), num_steps)
+        # only the order of the batches changes across the epochs
+        self.assertNotEqual(batches[0], batches[1])
+        self.assertEqual(sorted(batches[0]), sorted(batches[1]))
+        self.assertEqual(sorted(batches[0]), sorted(batches[2]))